@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, jsonify
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 import json
 import os
 from bson import ObjectId
@@ -33,6 +34,42 @@ class JSONEncoder(json.JSONEncoder):
             return o.isoformat()
         return json.JSONEncoder.default(self, o)
 
+# Collections that own user accounts; the backend logs users in through the
+# identities index, so edits to these must be mirrored there
+USER_COLLECTIONS = {
+    'students': 'student',
+    'instructors': 'instructor'
+}
+
+def sync_identity(collection, user_id):
+    """Bring the user's identities entry in line with the user document"""
+    if collection not in USER_COLLECTIONS:
+        return
+    user = db[collection].find_one({"_id": user_id}, {"email": 1, "password_hash": 1})
+    if not user:
+        db.identities.delete_many({"user_id": user_id})
+        return
+    db.identities.delete_many({"user_id": user_id, "email": {"$ne": user.get("email")}})
+    if not user.get("email"):
+        return
+    try:
+        db.identities.update_one(
+            {"email": user["email"], "user_id": user_id},
+            {
+                "$set": {
+                    "user_type": USER_COLLECTIONS[collection],
+                    "user_id": user_id,
+                    "password_hash": user.get("password_hash"),
+                    "updated_at": datetime.utcnow()
+                },
+                "$setOnInsert": {"created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The email belongs to another account; leave that account's login alone
+        print(f"⚠️ {user['email']} is already registered to another user")
+
 @app.route('/')
 def dashboard():
     if db is None:
@@ -93,6 +130,7 @@ def delete_document(collection, doc_id):
     
     try:
         result = db[collection].delete_one({"_id": ObjectId(doc_id)})
+        sync_identity(collection, ObjectId(doc_id))
         return jsonify({"success": True, "deleted": result.deleted_count})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -116,6 +154,7 @@ def add_record(collection):
                     pass
         
         result = db[collection].insert_one(data)
+        sync_identity(collection, result.inserted_id)
         return jsonify({"success": True, "id": str(result.inserted_id)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -142,6 +181,7 @@ def update_record(collection, doc_id):
                     pass
         
         result = db[collection].update_one({"_id": ObjectId(doc_id)}, {"$set": data})
+        sync_identity(collection, ObjectId(doc_id))
         return jsonify({"success": True, "modified": result.modified_count})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, jsonify
 import json
+import uuid
 from datetime import datetime
 
 app = Flask(__name__)
@@ -29,6 +30,42 @@ mock_data = {
     ]
 }
 
+# Collections that own user accounts; the backend logs users in through the
+# identities index, so edits to these must be mirrored there
+USER_COLLECTIONS = {
+    'students': 'student',
+    'instructors': 'instructor'
+}
+
+mock_data["identities"] = [
+    {"_id": uuid.uuid4().hex[:24], "email": user["email"], "user_type": user_type, "user_id": user["_id"]}
+    for collection, user_type in USER_COLLECTIONS.items()
+    for user in mock_data[collection]
+]
+
+def sync_identity(collection, user_id):
+    """Bring the user's identities entry in line with the user document"""
+    if collection not in USER_COLLECTIONS:
+        return
+    user = next((item for item in mock_data[collection] if item["_id"] == user_id), None)
+    mock_data["identities"] = [
+        identity for identity in mock_data["identities"]
+        if identity["user_id"] != user_id or (user and identity["email"] == user.get("email"))
+    ]
+    if not user or not user.get("email"):
+        return
+    if any(identity["email"] == user["email"] for identity in mock_data["identities"]):
+        if not any(identity["user_id"] == user_id for identity in mock_data["identities"]):
+            # The email belongs to another account; leave that account's login alone
+            print(f"⚠️ {user['email']} is already registered to another user")
+        return
+    mock_data["identities"].append({
+        "_id": uuid.uuid4().hex[:24],
+        "email": user["email"],
+        "user_type": USER_COLLECTIONS[collection],
+        "user_id": user_id
+    })
+
 @app.route('/')
 def dashboard():
     collections = list(mock_data.keys())
@@ -60,6 +97,7 @@ def delete_document(collection, doc_id):
     try:
         if collection in mock_data:
             mock_data[collection] = [item for item in mock_data[collection] if item["_id"] != doc_id]
+            sync_identity(collection, doc_id)
             return jsonify({"success": True, "deleted": 1})
         return jsonify({"success": False, "error": "Collection not found"})
     except Exception as e:
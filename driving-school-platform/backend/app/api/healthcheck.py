@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 from app.db.mongo import get_database
+from app.core.responses import BSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/health")
 async def health_check():
@@ -1,24 +1,92 @@
+import time
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.core.config import settings
 from app.core.security import verify_token
+from app.services.identity_service import IdentityService
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+# Principals reloaded from the database for tokens whose claims are missing or too old
+_principal_cache: "OrderedDict[str, tuple]" = OrderedDict()
+PRINCIPAL_CACHE_SIZE = 10000
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
     payload = verify_token(token)
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    
+    if payload.get("sub") is None or payload.get("user_type") is None:
+        raise _credentials_exception()
+    
+    return payload
+
+async def get_current_user(payload: dict = Depends(get_token_payload)):
+    return {"email": payload["sub"], "user_type": payload["user_type"]}
+
+def principal_from_claims(payload: dict):
+    """Build the principal from token claims if they are present and fresh enough"""
+    issued_at = payload.get("iat")
+    if not payload.get("uid") or not isinstance(issued_at, (int, float)):
+        return None
+    if time.time() - issued_at > settings.principal_claims_max_age_seconds:
+        return None
+    
+    try:
+        user_id = ObjectId(payload["uid"])
+    except (InvalidId, TypeError):
+        return None
+    
+    return {
+        "email": payload["sub"],
+        "user_type": payload["user_type"],
+        "user_id": user_id,
+        "school_id": payload.get("school_id"),
+        "school_status": payload.get("school_status")
+    }
+
+def invalidate_principal(email: str):
+    """Drop a cached principal after its school membership changes"""
+    _principal_cache.pop(email, None)
+
+async def refresh_principal(email: str):
+    """Reload a principal from the database, bypassing cached claims"""
+    principal = await IdentityService.load_principal(email)
+    if principal is not None:
+        _principal_cache[email] = (principal, time.time())
+        _principal_cache.move_to_end(email)
+        while len(_principal_cache) > PRINCIPAL_CACHE_SIZE:
+            _principal_cache.popitem(last=False)
+    else:
+        _principal_cache.pop(email, None)
+    return principal
+
+async def get_current_principal(payload: dict = Depends(get_token_payload)) -> dict:
+    """Current user plus their _id and school membership, usually without a DB hit.
     
-    email: str = payload.get("sub")
-    user_type: str = payload.get("user_type")
+    Claims older than PRINCIPAL_CLAIMS_MAX_AGE_SECONDS are reloaded (and cached for
+    the same period), which bounds how stale school membership can be.
+    """
+    principal = principal_from_claims(payload)
+    if principal is not None:
+        return principal
     
-    if email is None or user_type is None:
-        raise credentials_exception
+    email = payload["sub"]
+    cached = _principal_cache.get(email)
+    if cached and time.time() - cached[1] <= settings.principal_claims_max_age_seconds:
+        return cached[0]
     
-    return {"email": email, "user_type": user_type}
\ No newline at end of file
+    principal = await refresh_principal(email)
+    if principal is None:
+        raise _credentials_exception()
+    return principal
\ No newline at end of file
@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 from app.db.mongo import get_database
+from app.core.responses import BSONRoute
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/create-school")
 async def create_sample_school():
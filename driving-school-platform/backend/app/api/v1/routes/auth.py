@@ -1,37 +1,47 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.api.v1.schemas.auth import UserLogin, UserRegister, Token
-from app.core.security import verify_password, get_password_hash, create_access_token, verify_token
+from app.core.security import verify_password_async, get_password_hash_async, create_access_token, verify_token
+from app.core.config import settings
+from app.api.v1.dependencies import get_current_user, refresh_principal
 from app.db.mongo import get_database
+from app.services.identity_service import IdentityService, USER_COLLECTIONS
 from app.db.models.student import Student
 from app.db.models.instructor import Instructor
+from app.core.responses import BSONRoute
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 @router.post("/register", response_model=Token)
 async def register(user_data: UserRegister):
     try:
         db = get_database()
+        user_type = "student" if user_data.user_type == "student" else "instructor"
         
-        # Check if user exists
-        existing_user = await db.students.find_one({"email": user_data.email}) or \
-                       await db.instructors.find_one({"email": user_data.email})
+        # Check accounts that predate the identities index
+        if settings.identity_legacy_fallback:
+            existing_user, _ = await IdentityService.find_legacy_user(user_data.email)
+            if existing_user:
+                raise HTTPException(status_code=400, detail="Email already registered")
         
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Email already registered")
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Registration failed")
-    
         # Hash password
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
+        
+        # Claim the email; the unique index rejects concurrent duplicates
+        user_id = ObjectId()
+        try:
+            await IdentityService.create_identity(user_data.email, user_type, user_id, hashed_password)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create user based on type
-        if user_data.user_type == "student":
+        if user_type == "student":
             user_dict = {
+                "_id": user_id,
                 "email": user_data.email,
                 "password_hash": hashed_password,
                 "first_name": user_data.first_name,
@@ -44,9 +54,9 @@ async def register(user_data: UserRegister):
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
-            await db.students.insert_one(user_dict)
         else:
             user_dict = {
+                "_id": user_id,
                 "email": user_data.email,
                 "password_hash": hashed_password,
                 "first_name": user_data.first_name,
@@ -58,31 +68,62 @@ async def register(user_data: UserRegister):
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             }
-            await db.instructors.insert_one(user_dict)
+        
+        try:
+            await db[USER_COLLECTIONS[user_type]].insert_one(user_dict)
+        except Exception:
+            await IdentityService.delete_by_email(user_data.email)
+            raise
         
         # Create token
-        access_token = create_access_token(data={"sub": user_data.email, "user_type": user_data.user_type})
+        principal = {
+            "email": user_data.email,
+            "user_type": user_type,
+            "user_id": user_id,
+            "school_id": None,
+            "school_status": None
+        }
+        access_token = create_access_token(data=IdentityService.principal_claims(principal))
         return {"access_token": access_token, "token_type": "bearer"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Registration failed")
 
 @router.post("/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     try:
-        db = get_database()
-        
-        # Find user in both collections
-        user = await db.students.find_one({"email": form_data.username})
-        user_type = "student"
+        # Single indexed lookup across students and instructors
+        identity = await IdentityService.get_by_email(form_data.username)
+        if identity:
+            password_hash = identity.get("password_hash")
+        elif settings.identity_legacy_fallback:
+            user, _ = await IdentityService.find_legacy_user(form_data.username)
+            password_hash = user.get("password_hash") if user else None
+        else:
+            password_hash = None
         
-        if not user:
-            user = await db.instructors.find_one({"email": form_data.username})
-            user_type = "instructor"
+        if not password_hash or not await verify_password_async(form_data.password, password_hash):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        if not user or not verify_password(form_data.password, user["password_hash"]):
+        # The account itself must still exist under this email, not just its identity entry
+        principal = await IdentityService.load_principal(form_data.username, identity)
+        if not principal or principal["email"] != form_data.username:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        access_token = create_access_token(data={"sub": user["email"], "user_type": user_type})
+        access_token = create_access_token(data=IdentityService.principal_claims(principal))
         return {"access_token": access_token, "token_type": "bearer"}
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Login failed")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Login failed")
+
+@router.post("/refresh", response_model=Token)
+async def refresh_token(current_user: dict = Depends(get_current_user)):
+    """Reissue the access token with up-to-date principal claims (e.g. after joining a school)"""
+    principal = await refresh_principal(current_user["email"])
+    if not principal:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    
+    access_token = create_access_token(data=IdentityService.principal_claims(principal))
+    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -2,25 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from app.api.v1.dependencies import get_current_user
 from app.db.mongo import get_database
+from app.db.repositories import SchoolRepository
+from app.core.responses import BSONRoute
 from bson import ObjectId
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/available")
 async def get_available_schools():
     """Get list of available schools for students to join"""
-    print("Available schools endpoint called")
     try:
-        db = get_database()
         schools = []
         
-        # Count total schools first
-        total_count = await db.schools.count_documents({})
-        print(f"Total schools in database: {total_count}")
-        
-        async for school in db.schools.find({}):
-            print(f"Found school: {school.get('name', 'Unknown')} with status: {school.get('status', 'No status')}")
+        async for school in SchoolRepository.find_public_cards():
             school_data = {
                 "id": str(school["_id"]),
                 "name": school.get("name", ""),
@@ -37,7 +32,6 @@ async def get_available_schools():
             }
             schools.append(school_data)
         
-        print(f"Returning {len(schools)} schools")
         return {"schools": schools, "total_found": len(schools)}
     
     except Exception as e:
@@ -60,7 +54,7 @@ async def get_my_school():
         
         if latest_request:
             if latest_request["status"] == "approved":
-                school = await db.schools.find_one({"_id": latest_request["school_id"]})
+                school = await SchoolRepository.get(latest_request["school_id"])
                 if school:
                     return {
                         "school": {
@@ -219,16 +213,10 @@ async def create_join_request(request_data: dict):
 @router.get("/public")
 async def get_public_schools():
     """Public endpoint to get schools without authentication"""
-    print("Public schools endpoint called")
     try:
-        db = get_database()
         schools = []
         
-        total_count = await db.schools.count_documents({})
-        print(f"Total schools in database: {total_count}")
-        
-        async for school in db.schools.find({}):
-            print(f"Found school: {school.get('name', 'Unknown')}")
+        async for school in SchoolRepository.find_public_cards():
             school_data = {
                 "id": str(school["_id"]),
                 "name": school.get("name", ""),
@@ -245,7 +233,6 @@ async def get_public_schools():
             }
             schools.append(school_data)
         
-        print(f"Returning {len(schools)} schools")
         return {"schools": schools}
     
     except Exception as e:
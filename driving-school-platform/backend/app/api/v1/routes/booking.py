@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_user, get_current_principal, refresh_principal, invalidate_principal
 from app.db.mongo import get_database
+from app.db.repositories import InstructorRepository, StudentRepository, to_object_id
+from app.core.responses import BSONRoute
+from app.services.notification_outbox import NotificationOutbox, notification_event, stream_event
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
 from bson import ObjectId
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/school/join")
 async def request_school_join(
     school_data: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Student requests to join a school"""
     try:
@@ -18,7 +22,7 @@ async def request_school_join(
             raise HTTPException(status_code=403, detail="Only students can join schools")
         
         db = get_database()
-        student = await db.students.find_one({"email": current_user["email"]})
+        student = await StudentRepository.get_display_name(current_user["user_id"])
         school_id = school_data.get("school_id")
         
         # Create booking request
@@ -33,27 +37,28 @@ async def request_school_join(
             "updated_at": datetime.utcnow()
         }
         
-        result = await db.bookings.insert_one(booking)
-        
-        # Add to school's pending requests
-        await db.schools.update_one(
-            {"_id": ObjectId(school_id)},
-            {"$addToSet": {"pending_student_requests": str(student["_id"])}}
-        )
+        booking["_id"] = ObjectId()
         
-        # Create notification for school
-        notification = {
-            "school_id": school_id,
-            "title": "New Student Request",
-            "message": f"{student['first_name']} {student['last_name']} wants to join your school",
-            "type": "school_join_request",
-            "booking_id": str(result.inserted_id),
-            "read": False,
-            "created_at": datetime.utcnow()
-        }
-        await db.notifications.insert_one(notification)
+        async with NotificationOutbox.transaction() as session:
+            await db.bookings.insert_one(booking, session=session)
+            
+            # Add to school's pending requests
+            await db.schools.update_one(
+                {"_id": ObjectId(school_id)},
+                {"$addToSet": {"pending_student_requests": str(student["_id"])}},
+                session=session
+            )
+            
+            # Notify the school
+            await NotificationOutbox.enqueue([notification_event(
+                "New Student Request",
+                f"{student['first_name']} {student['last_name']} wants to join your school",
+                "school_join_request",
+                school_id=school_id,
+                booking_id=str(booking["_id"])
+            )], session=session)
         
-        return {"message": "School join request sent successfully", "booking_id": str(result.inserted_id)}
+        return {"message": "School join request sent successfully", "booking_id": str(booking["_id"])}
     
     except Exception as e:
         print(f"Error in school join request: {e}")
@@ -62,7 +67,7 @@ async def request_school_join(
 @router.post("/lesson")
 async def request_lesson_booking(
     lesson_data: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     """Student requests to book a lesson"""
     try:
@@ -70,17 +75,21 @@ async def request_lesson_booking(
             raise HTTPException(status_code=403, detail="Only students can book lessons")
         
         db = get_database()
-        student = await db.students.find_one({"email": current_user["email"]})
         
-        # Check if student is approved by school
-        if not student.get("school_id") or student.get("school_status") != "approved":
-            raise HTTPException(status_code=403, detail="You must be approved by a school first")
+        # Check if student is approved by school (re-checking the DB before refusing on stale claims)
+        if not current_user.get("school_id") or current_user.get("school_status") != "approved":
+            current_user = await refresh_principal(current_user["email"])
+            if not current_user or not current_user.get("school_id") or current_user.get("school_status") != "approved":
+                raise HTTPException(status_code=403, detail="You must be approved by a school first")
+        
+        student = await StudentRepository.get_display_name(current_user["user_id"])
         
         # Create lesson
         lesson = {
             "student_id": str(student["_id"]),
             "instructor_id": lesson_data.get("instructor_id"),
-            "school_id": student.get("school_id"),
+            # Principals carry ids as strings; stored as the school document's ObjectId
+            "school_id": ObjectId(current_user["school_id"]),
             "lesson_type": lesson_data.get("lesson_type", "driving"),
             "vehicle_type": lesson_data.get("vehicle_type"),
             "scheduled_date": datetime.fromisoformat(lesson_data["scheduled_date"]),
@@ -91,14 +100,15 @@ async def request_lesson_booking(
             "updated_at": datetime.utcnow()
         }
         
-        lesson_result = await db.lessons.insert_one(lesson)
+        lesson["_id"] = ObjectId()
         
         # Create booking request
         booking = {
+            "_id": ObjectId(),
             "booking_type": "lesson",
             "student_id": str(student["_id"]),
             "instructor_id": lesson_data.get("instructor_id"),
-            "lesson_id": str(lesson_result.inserted_id),
+            "lesson_id": str(lesson["_id"]),
             "preferred_date": datetime.fromisoformat(lesson_data["scheduled_date"]),
             "status": "pending_instructor",
             "student_message": lesson_data.get("message", ""),
@@ -107,27 +117,35 @@ async def request_lesson_booking(
             "updated_at": datetime.utcnow()
         }
         
-        booking_result = await db.bookings.insert_one(booking)
-        
-        # Create notification for instructor
-        instructor = await db.instructors.find_one({"_id": ObjectId(lesson_data.get("instructor_id"))})
+        # Notify the instructor
+        notifications = []
+        instructor = await InstructorRepository.get_contact(lesson_data.get("instructor_id"))
         if instructor:
-            notification = {
-                "user_email": instructor["email"],
-                "title": "New Lesson Request",
-                "message": f"New lesson request from {student['first_name']} {student['last_name']}",
-                "type": "lesson_request",
-                "lesson_id": str(lesson_result.inserted_id),
-                "booking_id": str(booking_result.inserted_id),
-                "read": False,
-                "created_at": datetime.utcnow()
-            }
-            await db.notifications.insert_one(notification)
+            notifications.append(notification_event(
+                "New Lesson Request",
+                f"New lesson request from {student['first_name']} {student['last_name']}",
+                "lesson_request",
+                user_email=instructor["email"],
+                lesson_id=str(lesson["_id"]),
+                booking_id=str(booking["_id"])
+            ))
+            notifications.append(stream_event(
+                instructor["email"],
+                "booking",
+                booking_id=str(booking["_id"]),
+                lesson_id=str(lesson["_id"]),
+                status=booking["status"]
+            ))
+        
+        async with NotificationOutbox.transaction() as session:
+            await db.lessons.insert_one(lesson, session=session)
+            await db.bookings.insert_one(booking, session=session)
+            await NotificationOutbox.enqueue(notifications, session=session)
         
         return {
             "message": "Lesson booking request sent successfully",
-            "lesson_id": str(lesson_result.inserted_id),
-            "booking_id": str(booking_result.inserted_id)
+            "lesson_id": str(lesson["_id"]),
+            "booking_id": str(booking["_id"])
         }
     
     except Exception as e:
@@ -147,58 +165,76 @@ async def approve_school_join(
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
         
-        # Update booking status
-        await db.bookings.update_one(
-            {"_id": ObjectId(booking_id)},
-            {
-                "$set": {
-                    "status": "confirmed",
-                    "school_response": "approved",
-                    "school_response_at": datetime.utcnow(),
-                    "confirmed_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        # Bookings hold the id as sent; students store the school document's ObjectId like lessons do
+        school_id = to_object_id(booking.get("school_id") or "")
+        if school_id is None:
+            raise HTTPException(status_code=400, detail="Booking has no valid school_id")
         
-        # Update student status
-        await db.students.update_one(
-            {"_id": ObjectId(booking["student_id"])},
-            {
-                "$set": {
-                    "school_id": booking["school_id"],
-                    "school_status": "approved",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        student = await StudentRepository.get_contact(booking["student_id"])
         
-        # Add student to school
-        await db.schools.update_one(
-            {"_id": ObjectId(booking["school_id"])},
-            {
-                "$addToSet": {"student_ids": booking["student_id"]},
-                "$pull": {"pending_student_requests": booking["student_id"]},
-                "$inc": {"total_students": 1}
-            }
-        )
+        async with NotificationOutbox.transaction() as session:
+            # Update booking status
+            await db.bookings.update_one(
+                {"_id": ObjectId(booking_id)},
+                {
+                    "$set": {
+                        "status": "confirmed",
+                        "school_response": "approved",
+                        "school_response_at": datetime.utcnow(),
+                        "confirmed_at": datetime.utcnow(),
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                session=session
+            )
+            
+            # Update student status
+            await db.students.update_one(
+                {"_id": ObjectId(booking["student_id"])},
+                {
+                    "$set": {
+                        "school_id": school_id,
+                        "school_status": "approved",
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                session=session
+            )
+            
+            # Add student to school
+            await db.schools.update_one(
+                {"_id": school_id},
+                {
+                    "$addToSet": {"student_ids": booking["student_id"]},
+                    "$pull": {"pending_student_requests": booking["student_id"]},
+                    "$inc": {"total_students": 1}
+                },
+                session=session
+            )
+            
+            # Notify the student
+            if student:
+                await NotificationOutbox.enqueue([notification_event(
+                    "School Application Approved",
+                    "Your application to join the school has been approved!",
+                    "school_approval",
+                    user_email=student["email"],
+                    booking_id=booking_id
+                ), stream_event(
+                    student["email"],
+                    "booking",
+                    booking_id=booking_id,
+                    booking_type="school_join",
+                    status="confirmed"
+                )], session=session)
         
-        # Create notification for student
-        student = await db.students.find_one({"_id": ObjectId(booking["student_id"])})
         if student:
-            notification = {
-                "user_email": student["email"],
-                "title": "School Application Approved",
-                "message": "Your application to join the school has been approved!",
-                "type": "school_approval",
-                "booking_id": booking_id,
-                "read": False,
-                "created_at": datetime.utcnow()
-            }
-            await db.notifications.insert_one(notification)
+            invalidate_principal(student["email"])
         
         return {"message": "Student approved successfully"}
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error approving school join: {e}")
         raise HTTPException(status_code=500, detail="Failed to approve student")
@@ -219,45 +255,52 @@ async def accept_lesson_booking(
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
         
-        # Update booking status
-        await db.bookings.update_one(
-            {"_id": ObjectId(booking_id)},
-            {
-                "$set": {
-                    "status": "confirmed",
-                    "instructor_response": "accepted",
-                    "instructor_response_at": datetime.utcnow(),
-                    "confirmed_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        student = await StudentRepository.get_contact(booking["student_id"])
         
-        # Update lesson status
-        await db.lessons.update_one(
-            {"_id": ObjectId(booking["lesson_id"])},
-            {
-                "$set": {
-                    "status": "confirmed",
-                    "instructor_accepted": True,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Create notification for student
-        student = await db.students.find_one({"_id": ObjectId(booking["student_id"])})
-        if student:
-            notification = {
-                "user_email": student["email"],
-                "title": "Lesson Confirmed",
-                "message": "Your lesson has been confirmed by the instructor!",
-                "type": "lesson_confirmed",
-                "lesson_id": booking["lesson_id"],
-                "read": False,
-                "created_at": datetime.utcnow()
-            }
-            await db.notifications.insert_one(notification)
+        async with NotificationOutbox.transaction() as session:
+            # Update booking status
+            await db.bookings.update_one(
+                {"_id": ObjectId(booking_id)},
+                {
+                    "$set": {
+                        "status": "confirmed",
+                        "instructor_response": "accepted",
+                        "instructor_response_at": datetime.utcnow(),
+                        "confirmed_at": datetime.utcnow(),
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                session=session
+            )
+            
+            # Update lesson status
+            await db.lessons.update_one(
+                {"_id": ObjectId(booking["lesson_id"])},
+                {
+                    "$set": {
+                        "status": "confirmed",
+                        "instructor_accepted": True,
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                session=session
+            )
+            
+            # Notify the student
+            if student:
+                await NotificationOutbox.enqueue([notification_event(
+                    "Lesson Confirmed",
+                    "Your lesson has been confirmed by the instructor!",
+                    "lesson_confirmed",
+                    user_email=student["email"],
+                    lesson_id=booking["lesson_id"]
+                ), stream_event(
+                    student["email"],
+                    "booking",
+                    booking_id=booking_id,
+                    lesson_id=booking["lesson_id"],
+                    status="confirmed"
+                )], session=session)
         
         return {"message": "Lesson accepted successfully"}
     
@@ -266,26 +309,29 @@ async def accept_lesson_booking(
         raise HTTPException(status_code=500, detail="Failed to accept lesson")
 
 @router.get("/my-requests")
-async def get_my_booking_requests(current_user: dict = Depends(get_current_user)):
+async def get_my_booking_requests(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_principal)
+):
     """Get user's booking requests"""
     try:
         db = get_database()
         
         if current_user["user_type"] == "student":
-            student = await db.students.find_one({"email": current_user["email"]})
-            query = {"student_id": str(student["_id"])}
+            query = {"student_id": str(current_user["user_id"])}
         else:
-            instructor = await db.instructors.find_one({"email": current_user["email"]})
-            query = {"instructor_id": str(instructor["_id"])}
+            query = {"instructor_id": str(current_user["user_id"])}
         
-        bookings = []
-        async for booking in db.bookings.find(query).sort("created_at", -1):
-            booking["id"] = str(booking["_id"])
-            booking.pop("_id", None)
-            bookings.append(booking)
+        result = await fetch_page(db.bookings.find, query, page, "created_at")
+        for booking in result.items:
+            booking["id"] = str(booking.pop("_id"))
         
-        return bookings
+        set_next_cursor(response, result.next_cursor)
+        return result.items
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching booking requests: {e}")
         return []
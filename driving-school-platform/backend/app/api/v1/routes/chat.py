@@ -1,42 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
 from app.api.v1.dependencies import get_current_user
 from app.db.mongo import get_database
+from app.services.chat_service import (
+    ChatService,
+    DEFAULT_HISTORY_PAGE,
+    conversation_key,
+    conversation_response,
+    is_read,
+    message_frame,
+    message_response,
+    new_message
+)
+from app.services.message_writer import message_writer
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
+from app.utils.validation import validate_object_id
+from app.core.connections import manager
+from app.core import fanout
+from app.core.responses import BSONRoute, dumps
+from app.core.security import verify_token
 from bson import ObjectId
-from datetime import datetime
-from typing import List
+from typing import Optional
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.user_connections = {}
+def _frame(**fields) -> str:
+    return dumps(fields).decode()
 
-    async def connect(self, websocket: WebSocket, user_email: str):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.user_connections[user_email] = websocket
+def _acknowledge(connection, client_id):
+    """Callback sending the sender an ack (or error) once the writer has persisted its message"""
+    def done(future):
+        if future.cancelled() or future.exception() is not None:
+            connection.enqueue(_frame(type="error", client_id=client_id, detail="Failed to send message"))
+            return
+        message = future.result()
+        connection.enqueue(_frame(
+            type="ack",
+            client_id=client_id,
+            id=str(message["_id"]),
+            created_at=message["created_at"]
+        ))
+    return done
 
-    def disconnect(self, websocket: WebSocket, user_email: str):
-        self.active_connections.remove(websocket)
-        if user_email in self.user_connections:
-            del self.user_connections[user_email]
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)):
+    """Chat socket, authenticated once with the access token at connect.
 
-    async def send_personal_message(self, message: str, user_email: str):
-        if user_email in self.user_connections:
-            await self.user_connections[user_email].send_text(message)
-
-manager = ConnectionManager()
-
-@router.websocket("/ws/{user_email}")
-async def websocket_endpoint(websocket: WebSocket, user_email: str):
-    await manager.connect(websocket, user_email)
+    Clients send ``{"type": "message", "receiver_email", "message",
+    "client_id"}`` frames; each is persisted by the write-behind batcher and
+    answered with ``{"type": "ack", "client_id", "id", "created_at"}``.
+    Incoming messages arrive as ``{"type": "message", "message": {...}}``.
+    """
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    user_email = payload["sub"]
+    connection = await manager.connect(websocket, user_email)
     try:
         while True:
-            data = await websocket.receive_text()
-            # Handle incoming messages
+            text = await websocket.receive_text()
+            # Any frame (including pong replies to our pings) keeps the connection alive
+            connection.touch()
+            try:
+                frame = json.loads(text)
+            except ValueError:
+                connection.enqueue(_frame(type="error", detail="Invalid JSON"))
+                continue
+            if not isinstance(frame, dict) or frame.get("type") in ("ping", "pong"):
+                continue
+            
+            client_id = frame.get("client_id")
+            if frame.get("type") != "message":
+                connection.enqueue(_frame(type="error", client_id=client_id, detail="Unknown frame type"))
+                continue
+            if not frame.get("receiver_email") or not frame.get("message"):
+                connection.enqueue(_frame(type="error", client_id=client_id, detail="receiver_email and message are required"))
+                continue
+            
+            future = message_writer.submit(new_message(
+                user_email,
+                frame["receiver_email"],
+                frame["message"],
+                frame.get("message_type", "text")
+            ))
+            future.add_done_callback(_acknowledge(connection, client_id))
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user_email)
+        pass
+    finally:
+        manager.disconnect(connection)
 
 @router.post("/send")
 async def send_message(
@@ -44,27 +97,18 @@ async def send_message(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        db = get_database()
-        
-        message = {
-            "sender_email": current_user["email"],
-            "receiver_email": message_data.get("receiver_email", ""),
-            "message": message_data.get("message", ""),
-            "message_type": message_data.get("type", "text"),
-            "read": False,
-            "created_at": datetime.utcnow()
-        }
-        
-        result = await db.messages.insert_one(message)
-        message["id"] = str(result.inserted_id)
-        message.pop("_id", None)
+        message = await ChatService.create_message(
+            current_user["email"],
+            message_data.get("receiver_email", ""),
+            message_data.get("message", ""),
+            message_data.get("type", "text")
+        )
+        frame = message_frame(message)
+        message["id"] = str(message.pop("_id"))
         
         # Send via websocket if user is online
         try:
-            await manager.send_personal_message(
-                f"New message from {current_user['email']}: {message_data.get('message', '')}",
-                message_data.get("receiver_email", "")
-            )
+            await fanout.publish(message_data.get("receiver_email", ""), frame)
         except Exception as ws_error:
             print(f"WebSocket error: {ws_error}")
         
@@ -75,34 +119,21 @@ async def send_message(
         raise HTTPException(status_code=500, detail="Failed to send message")
 
 @router.get("/conversations")
-async def get_conversations(current_user: dict = Depends(get_current_user)):
+async def get_conversations(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
     try:
         db = get_database()
         
-        # Get unique conversation partners
-        pipeline = [
-            {"$match": {
-                "$or": [
-                    {"sender_email": current_user["email"]},
-                    {"receiver_email": current_user["email"]}
-                ]
-            }},
-            {"$group": {
-                "_id": {
-                    "$cond": [
-                        {"$eq": ["$sender_email", current_user["email"]]},
-                        "$receiver_email",
-                        "$sender_email"
-                    ]
-                },
-                "last_message": {"$last": "$message"},
-                "last_message_time": {"$last": "$created_at"}
-            }}
-        ]
-        
-        conversations = await db.messages.aggregate(pipeline).to_list(100)
-        return conversations
+        # Most recent conversation first, one materialized document per partner
+        result = await fetch_page(db.conversations.find, {"owner_email": current_user["email"]}, page, "last_message_at")
+        set_next_cursor(response, result.next_cursor)
+        return [conversation_response(conversation) for conversation in result.items]
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching conversations: {e}")
         return []
@@ -110,40 +141,44 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
 @router.get("/messages/{other_user_email}")
 async def get_messages(
     other_user_email: str,
+    before: Optional[str] = Query(None, description="Return messages older than this message id"),
+    after: Optional[str] = Query(None, description="Return messages newer than this message id"),
+    limit: int = Query(DEFAULT_HISTORY_PAGE, ge=1, le=200),
     current_user: dict = Depends(get_current_user)
 ):
+    """Latest page of a conversation, oldest first.
+
+    Pass ``before`` (oldest id held) to page back in history, or ``after``
+    (newest id held) to fetch only messages that arrived since.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
     try:
-        db = get_database()
+        key = conversation_key(current_user["email"], other_user_email)
+        watermarks, archived = await ChatService.get_read_state(current_user["email"], other_user_email)
+        anchors = {}
+        for name, message_id in (("before", before), ("after", after)):
+            if message_id:
+                anchors[name] = await ChatService.get_anchor(key, validate_object_id(message_id, name), archived)
+                if not anchors[name]:
+                    raise HTTPException(status_code=404, detail="Anchor message not found")
         
-        messages = []
-        async for message in db.messages.find({
-            "$or": [
-                {"sender_email": current_user["email"], "receiver_email": other_user_email},
-                {"sender_email": other_user_email, "receiver_email": current_user["email"]}
-            ]
-        }).sort("created_at", 1):
-            message_data = {
-                "id": str(message["_id"]),
-                "sender_email": message.get("sender_email", ""),
-                "receiver_email": message.get("receiver_email", ""),
-                "message": message.get("message", ""),
-                "message_type": message.get("message_type", "text"),
-                "read": message.get("read", False),
-                "created_at": message.get("created_at")
-            }
-            messages.append(message_data)
+        history = await ChatService.get_history(
+            current_user["email"], other_user_email, limit=limit, archived=archived, **anchors
+        )
+        messages = [message_response(message, is_read(message, watermarks)) for message in history]
         
-        # Mark messages as read
-        try:
-            await db.messages.update_many(
-                {"sender_email": other_user_email, "receiver_email": current_user["email"]},
-                {"$set": {"read": True}}
-            )
-        except Exception as update_error:
-            print(f"Error marking messages as read: {update_error}")
+        # Opening the latest messages reads the conversation up to the newest one served; paging back doesn't
+        if not before and history:
+            try:
+                await ChatService.mark_conversation_read(current_user["email"], other_user_email, history[-1])
+            except Exception as update_error:
+                print(f"Error marking messages as read: {update_error}")
         
         return messages
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching messages: {e}")
         return []
\ No newline at end of file
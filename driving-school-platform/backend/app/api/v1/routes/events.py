@@ -0,0 +1,196 @@
+import asyncio
+from typing import AsyncIterator, Dict, Optional
+from fastapi import APIRouter, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from app.core.connections import Connection, PING_FRAME, manager
+from app.core.config import settings
+from app.core.responses import BSONRoute
+from app.core.security import verify_token
+from app.services.user_events import UserEvents, event_frame, frame_seq, parse_last_event_id
+
+router = APIRouter(route_class=BSONRoute)
+
+RESET_FRAME = '{"type":"reset"}'
+
+class EventStreamSocket:
+    """Stands in for a WebSocket so ConnectionManager can queue a user's frames for a stream.
+
+    The queue is bounded like a connection's own, so a client that stops
+    reading backs up into its Connection and the overflow policy applies.
+    """
+
+    def __init__(self):
+        self.frames: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await self.frames.put(message)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        try:
+            self.frames.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+def _user_email(token: Optional[str]) -> Optional[str]:
+    payload = verify_token(token) if token else None
+    return payload.get("sub") if payload else None
+
+async def _event_frames(socket: EventStreamSocket, user_email: str, last_event_id: Optional[int]) -> AsyncIterator[str]:
+    """Missed events after ``last_event_id``, then live frames, in sequence order without duplicates.
+
+    The socket is registered before replaying, so nothing published in
+    between is lost; live event frames already covered by the replay are
+    skipped by sequence number. Sequence numbers are allocated before events
+    are stored and published, so concurrent publishers (possibly on other
+    workers) can deliver N+1 before N: a frame past a gap is held for up to
+    ``events_gap_wait_ms`` for the missing ones, then the gap is filled from
+    ``user_events`` (or, if it can't be, the client is told to reset).
+    """
+    last = last_event_id
+    if last is not None:
+        events, lost = await UserEvents.replay(user_email, last)
+        if lost:
+            yield RESET_FRAME
+            last = None  # the client reloads, so carry on from whatever comes next
+        for event in events:
+            yield event_frame(event)
+            last = event["seq"]
+
+    loop = asyncio.get_running_loop()
+    held: Dict[int, str] = {}
+    deadline = 0.0
+    while True:
+        try:
+            timeout = max(deadline - loop.time(), 0) if held else None
+            frame = await asyncio.wait_for(socket.frames.get(), timeout)
+        except asyncio.TimeoutError:
+            # The missing events never came through the bus; they are stored before being published
+            events, lost = await UserEvents.replay(user_email, last)
+            if lost:
+                yield RESET_FRAME
+            for event in events:
+                yield event_frame(event)
+                last = event["seq"]
+            for seq in sorted(held):
+                if seq > last:
+                    yield held[seq]
+                    last = seq
+            held = {}
+            continue
+
+        if frame is None or socket.closed:
+            return
+        seq = frame_seq(frame)
+        if seq is None:
+            yield frame
+            continue
+        if last is not None and seq <= last:
+            continue
+        if last is not None and seq > last + 1:
+            if not held:
+                deadline = loop.time() + settings.events_gap_wait_ms / 1000
+            held[seq] = frame
+            continue
+
+        yield frame
+        last = seq
+        while last + 1 in held:
+            last += 1
+            yield held.pop(last)
+        held = {held_seq: held_frame for held_seq, held_frame in held.items() if held_seq > last}
+
+async def _subscribe(user_email: str):
+    socket = EventStreamSocket()
+    connection = await manager.connect(socket, user_email, channel="events")
+    return socket, connection
+
+def _sse(frame: str) -> str:
+    if frame == PING_FRAME:
+        return ": ping\n\n"
+    seq = frame_seq(frame)
+    if seq is None:
+        return f"data: {frame}\n\n"
+    return f"id: {seq}\ndata: {frame}\n\n"
+
+@router.get("/stream")
+async def event_stream(
+    token: Optional[str] = Query(None, description="Access token, for clients that can't set headers"),
+    resume_from: Optional[str] = Query(None, alias="last_event_id"),
+    authorization: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Server-Sent Events stream of the user's notifications, lesson and booking changes.
+
+    Each event's ``data`` is the same JSON frame the WebSocket variant sends.
+    Browsers resume through the ``Last-Event-ID`` header automatically; other
+    clients can pass ``?last_event_id=``.
+    """
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    user_email = _user_email(token)
+    if user_email is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    socket, connection = await _subscribe(user_email)
+
+    async def stream():
+        try:
+            yield f"retry: {settings.events_retry_ms}\n\n"
+            async for frame in _event_frames(socket, user_email, parse_last_event_id(last_event_id or resume_from)):
+                # Clients never write to an event stream; a frame going out is the liveness signal
+                connection.touch()
+                yield _sse(frame)
+        finally:
+            manager.disconnect(connection)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _forward(websocket: WebSocket, frames: AsyncIterator[str], connection: Connection):
+    try:
+        async for frame in frames:
+            await websocket.send_text(frame)
+    except Exception:
+        pass
+    # The manager dropped the stream (idle, overflow or shutdown)
+    manager.disconnect(connection)
+    try:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    except Exception:
+        pass
+
+@router.websocket("/ws")
+async def event_socket(websocket: WebSocket, token: str = Query(...), last_event_id: Optional[str] = Query(None)):
+    """WebSocket variant of /events/stream; resume with ``?last_event_id=``"""
+    user_email = _user_email(token)
+    if user_email is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    socket, connection = await _subscribe(user_email)
+    forwarder = asyncio.create_task(
+        _forward(websocket, _event_frames(socket, user_email, parse_last_event_id(last_event_id)), connection)
+    )
+    try:
+        while True:
+            await websocket.receive_text()
+            # Any frame (including pong replies to our pings) keeps the connection alive
+            connection.touch()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        forwarder.cancel()
+        manager.disconnect(connection)
\ No newline at end of file
@@ -1,15 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_user, get_current_principal
 from app.db.mongo import get_database
+from app.db.repositories import StudentRepository, display_name
+from app.db.loaders import Loaders, get_loaders
+from app.core.responses import BSONRoute
+from app.services.notification_outbox import NotificationOutbox, notification_event, stream_event
 from bson import ObjectId
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.put("/lessons/{lesson_id}/accept")
 async def accept_lesson(
     lesson_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     if current_user["user_type"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can accept lessons")
@@ -17,7 +21,7 @@ async def accept_lesson(
     db = get_database()
     
     # Verify instructor owns this lesson
-    instructor_id = await get_instructor_id(current_user["email"], db)
+    instructor_id = current_user["user_id"]
     lesson = await db.lessons.find_one({
         "_id": ObjectId(lesson_id),
         "instructor_id": instructor_id
@@ -26,25 +30,22 @@ async def accept_lesson(
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
     
-    # Update lesson status
-    await db.lessons.update_one(
-        {"_id": ObjectId(lesson_id)},
-        {"$set": {"status": "confirmed", "updated_at": datetime.utcnow()}}
-    )
-    
-    # Create notification for student
-    student = await db.students.find_one({"_id": lesson["student_id"]})
-    notification = {
-        "user_email": student["email"],
-        "title": "Lesson Confirmed",
-        "message": f"Your lesson for {lesson['scheduled_date']} has been confirmed by your instructor",
-        "type": "lesson_confirmed",
-        "lesson_id": lesson_id,
-        "read": False,
-        "created_at": datetime.utcnow()
-    }
-    
-    await db.notifications.insert_one(notification)
+    student = await StudentRepository.get_contact(lesson["student_id"])
+    
+    # Update lesson status and notify the student
+    async with NotificationOutbox.transaction() as session:
+        await db.lessons.update_one(
+            {"_id": ObjectId(lesson_id)},
+            {"$set": {"status": "confirmed", "updated_at": datetime.utcnow()}},
+            session=session
+        )
+        await NotificationOutbox.enqueue([notification_event(
+            "Lesson Confirmed",
+            f"Your lesson for {lesson['scheduled_date']} has been confirmed by your instructor",
+            "lesson_confirmed",
+            user_email=student["email"],
+            lesson_id=lesson_id
+        ), stream_event(student["email"], "lesson", lesson_id=lesson_id, status="confirmed")], session=session)
     
     return {"message": "Lesson accepted successfully"}
 
@@ -59,57 +60,53 @@ async def reject_lesson(
     
     db = get_database()
     
-    # Update lesson status
-    await db.lessons.update_one(
-        {"_id": ObjectId(lesson_id)},
-        {"$set": {"status": "cancelled", "notes": f"Rejected: {reason}", "updated_at": datetime.utcnow()}}
-    )
-    
     # Get lesson and student details
     lesson = await db.lessons.find_one({"_id": ObjectId(lesson_id)})
-    student = await db.students.find_one({"_id": lesson["student_id"]})
-    
-    # Create notification for student
-    notification = {
-        "user_email": student["email"],
-        "title": "Lesson Cancelled",
-        "message": f"Your lesson for {lesson['scheduled_date']} has been cancelled. Reason: {reason}",
-        "type": "lesson_cancelled",
-        "lesson_id": lesson_id,
-        "read": False,
-        "created_at": datetime.utcnow()
-    }
-    
-    await db.notifications.insert_one(notification)
+    if not lesson:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    student = await StudentRepository.get_contact(lesson["student_id"])
+    
+    # Update lesson status and notify the student
+    async with NotificationOutbox.transaction() as session:
+        await db.lessons.update_one(
+            {"_id": ObjectId(lesson_id)},
+            {"$set": {"status": "cancelled", "notes": f"Rejected: {reason}", "updated_at": datetime.utcnow()}},
+            session=session
+        )
+        await NotificationOutbox.enqueue([notification_event(
+            "Lesson Cancelled",
+            f"Your lesson for {lesson['scheduled_date']} has been cancelled. Reason: {reason}",
+            "lesson_cancelled",
+            user_email=student["email"],
+            lesson_id=lesson_id
+        ), stream_event(student["email"], "lesson", lesson_id=lesson_id, status="cancelled")], session=session)
     
     return {"message": "Lesson rejected successfully"}
 
 @router.get("/pending-lessons")
-async def get_pending_lessons(current_user: dict = Depends(get_current_user)):
+async def get_pending_lessons(
+    current_user: dict = Depends(get_current_principal),
+    loaders: Loaders = Depends(get_loaders)
+):
     if current_user["user_type"] != "instructor":
         raise HTTPException(status_code=403, detail="Only instructors can view pending lessons")
     
     db = get_database()
-    instructor_id = await get_instructor_id(current_user["email"], db)
+    instructor_id = current_user["user_id"]
     
-    lessons = []
-    async for lesson in db.lessons.find({
+    lessons = await db.lessons.find({
         "instructor_id": instructor_id,
         "status": "scheduled"
-    }).sort("scheduled_date", 1):
-        # Get student details
-        student = await db.students.find_one({"_id": lesson["student_id"]})
-        
+    }).sort("scheduled_date", 1).to_list(None)
+    
+    # Get student details in one batched query
+    students = await loaders.students.load_many([lesson["student_id"] for lesson in lessons])
+    
+    for lesson, student in zip(lessons, students):
         lesson["id"] = str(lesson["_id"])
         lesson["student_id"] = str(lesson["student_id"])
         lesson["instructor_id"] = str(lesson["instructor_id"])
-        lesson["student_name"] = f"{student['first_name']} {student['last_name']}"
-        lesson["student_phone"] = student["phone"]
-        
-        lessons.append(lesson)
+        lesson["student_name"] = display_name(student)
+        lesson["student_phone"] = student.get("phone", "") if student else ""
     
-    return lessons
-
-async def get_instructor_id(email: str, db):
-    instructor = await db.instructors.find_one({"email": email})
-    return instructor["_id"] if instructor else None
\ No newline at end of file
+    return lessons
\ No newline at end of file
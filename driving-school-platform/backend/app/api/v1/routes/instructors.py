@@ -1,18 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from app.api.v1.dependencies import get_current_user
-from app.db.mongo import get_database
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.api.v1.dependencies import get_current_principal
+from app.db.repositories import InstructorRepository
+from app.core.responses import BSONRoute
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
+from pymongo import ASCENDING
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/me")
-async def get_current_instructor(current_user: dict = Depends(get_current_user)):
+async def get_current_instructor(current_user: dict = Depends(get_current_principal)):
     try:
         if current_user["user_type"] != "instructor":
             raise HTTPException(status_code=403, detail="Access denied")
         
-        db = get_database()
-        instructor = await db.instructors.find_one({"email": current_user["email"]})
+        instructor = await InstructorRepository.get(current_user["user_id"])
         
         if not instructor:
             raise HTTPException(status_code=404, detail="Instructor not found")
@@ -37,19 +38,17 @@ async def get_current_instructor(current_user: dict = Depends(get_current_user))
         print(f"Error fetching instructor profile: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch profile")
 
-@router.get("/", response_model=List[dict])
-async def get_all_instructors():
+@router.get("/")
+async def get_all_instructors(response: Response, page: PageParams = Depends()):
     try:
-        db = get_database()
-        instructors = []
-        async for instructor in db.instructors.find():
-            instructor["id"] = str(instructor["_id"])
-            # Remove sensitive fields
-            instructor.pop("password", None)
-            instructor.pop("_id", None)
-            instructors.append(instructor)
+        result = await fetch_page(InstructorRepository.find_public_cards, {}, page, direction=ASCENDING)
+        for instructor in result.items:
+            instructor["id"] = str(instructor.pop("_id"))
         
-        return instructors
+        set_next_cursor(response, result.next_cursor)
+        return result.items
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching instructors: {e}")
         return []
\ No newline at end of file
@@ -1,34 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List
 from app.api.v1.schemas.lesson import LessonCreate, LessonResponse
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_principal, refresh_principal
 from app.db.mongo import get_database
+from app.db.repositories import InstructorRepository, display_name
+from app.db.loaders import Loaders, get_loaders
 from app.db.models.lesson import Lesson
+from app.core.responses import BSONRoute
+from app.services.notification_outbox import NotificationOutbox, notification_event, stream_event
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
 from bson import ObjectId
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/", response_model=LessonResponse)
 async def create_lesson(
     lesson_data: LessonCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can book lessons")
     
     db = get_database()
-    student = await db.students.find_one({"email": current_user["email"]})
     
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
-    # Check if student is approved by a school
-    if not student.get("school_status") or student.get("school_status") != "approved":
-        raise HTTPException(status_code=403, detail="You must be approved by a school before booking lessons")
+    # Check if student is approved by a school (re-checking the DB before refusing on stale claims)
+    if current_user.get("school_status") != "approved":
+        current_user = await refresh_principal(current_user["email"])
+        if not current_user:
+            raise HTTPException(status_code=404, detail="Student not found")
+        if current_user.get("school_status") != "approved":
+            raise HTTPException(status_code=403, detail="You must be approved by a school before booking lessons")
     
     lesson_dict = {
-        "student_id": ObjectId(str(student["_id"])),
+        "student_id": current_user["user_id"],
         "instructor_id": ObjectId(lesson_data.instructor_id),
         "lesson_type": lesson_data.lesson_type,
         "scheduled_date": lesson_data.scheduled_date,
@@ -38,72 +43,71 @@ async def create_lesson(
         "updated_at": datetime.utcnow()
     }
     
-    result = await db.lessons.insert_one(lesson_dict)
-    lesson_dict["id"] = str(result.inserted_id)
-    lesson_dict["student_id"] = str(lesson_dict["student_id"])
-    lesson_dict["instructor_id"] = str(lesson_dict["instructor_id"])
+    lesson_dict["_id"] = ObjectId()
+    lesson_id = str(lesson_dict["_id"])
     
-    # Create notifications
+    # Notifications for the student and (if found) the instructor
     notifications = [
-        {
-            "user_email": current_user["email"],
-            "title": "Lesson Booked",
-            "message": f"Your lesson is scheduled for {lesson_data.scheduled_date}",
-            "type": "lesson_booked",
-            "lesson_id": str(result.inserted_id),
-            "read": False,
-            "created_at": datetime.utcnow()
-        }
+        notification_event(
+            "Lesson Booked",
+            f"Your lesson is scheduled for {lesson_data.scheduled_date}",
+            "lesson_booked",
+            user_email=current_user["email"],
+            lesson_id=lesson_id
+        )
     ]
-    
-    # Get instructor for notification
-    instructor = await db.instructors.find_one({"_id": ObjectId(lesson_data.instructor_id)})
+    instructor = await InstructorRepository.get_contact(lesson_data.instructor_id)
     if instructor:
-        notifications.append({
-            "user_email": instructor["email"],
-            "title": "New Lesson Request",
-            "message": f"New lesson request for {lesson_data.scheduled_date}",
-            "type": "lesson_request",
-            "lesson_id": str(result.inserted_id),
-            "read": False,
-            "created_at": datetime.utcnow()
-        })
+        notifications.append(notification_event(
+            "New Lesson Request",
+            f"New lesson request for {lesson_data.scheduled_date}",
+            "lesson_request",
+            user_email=instructor["email"],
+            lesson_id=lesson_id
+        ))
+        notifications.append(stream_event(instructor["email"], "lesson", lesson_id=lesson_id, status="scheduled"))
+    notifications.append(stream_event(current_user["email"], "lesson", lesson_id=lesson_id, status="scheduled"))
     
-    try:
-        await db.notifications.insert_many(notifications)
-    except Exception as e:
-        print(f"Failed to create notifications: {e}")
+    async with NotificationOutbox.transaction() as session:
+        await db.lessons.insert_one(lesson_dict, session=session)
+        await NotificationOutbox.enqueue(notifications, session=session)
     
+    lesson_dict["id"] = str(lesson_dict.pop("_id"))
+    lesson_dict["student_id"] = str(lesson_dict["student_id"])
+    lesson_dict["instructor_id"] = str(lesson_dict["instructor_id"])
     return lesson_dict
 
 @router.get("/upcoming")
-async def get_upcoming_lessons(current_user: dict = Depends(get_current_user)):
+async def get_upcoming_lessons(
+    current_user: dict = Depends(get_current_principal),
+    loaders: Loaders = Depends(get_loaders)
+):
     try:
         db = get_database()
         
         if current_user["user_type"] == "student":
-            student = await db.students.find_one({"email": current_user["email"]})
-            if not student:
-                return []
-            
             query = {
-                "student_id": student["_id"],
+                "student_id": current_user["user_id"],
                 "scheduled_date": {"$gte": datetime.utcnow()},
                 "status": {"$in": ["scheduled", "confirmed"]}
             }
         else:
-            instructor = await db.instructors.find_one({"email": current_user["email"]})
-            if not instructor:
-                return []
-            
             query = {
-                "instructor_id": instructor["_id"],
+                "instructor_id": current_user["user_id"],
                 "scheduled_date": {"$gte": datetime.utcnow()},
                 "status": {"$in": ["scheduled", "confirmed"]}
             }
         
-        lessons = []
-        async for lesson in db.lessons.find(query).sort("scheduled_date", 1).limit(5):
+        lessons = await db.lessons.find(query).sort("scheduled_date", 1).limit(5).to_list(5)
+        
+        # Resolve the other party's names with one batched query
+        if current_user["user_type"] == "student":
+            others = await loaders.instructors.load_many([lesson["instructor_id"] for lesson in lessons])
+        else:
+            others = await loaders.students.load_many([lesson["student_id"] for lesson in lessons])
+        
+        results = []
+        for lesson, other in zip(lessons, others):
             lesson_data = {
                 "id": str(lesson["_id"]),
                 "student_id": str(lesson["student_id"]),
@@ -115,39 +119,37 @@ async def get_upcoming_lessons(current_user: dict = Depends(get_current_user)):
             }
             
             # Add instructor/student name for display
-            if current_user["user_type"] == "student":
-                instructor_doc = await db.instructors.find_one({"_id": lesson["instructor_id"]})
-                if instructor_doc:
-                    lesson_data["instructor_name"] = f"{instructor_doc.get('first_name', '')} {instructor_doc.get('last_name', '')}"
-            else:
-                student_doc = await db.students.find_one({"_id": lesson["student_id"]})
-                if student_doc:
-                    lesson_data["student_name"] = f"{student_doc.get('first_name', '')} {student_doc.get('last_name', '')}"
+            if other:
+                name_field = "instructor_name" if current_user["user_type"] == "student" else "student_name"
+                lesson_data[name_field] = display_name(other)
             
-            lessons.append(lesson_data)
+            results.append(lesson_data)
         
-        return lessons
+        return results
     
     except Exception as e:
         print(f"Error fetching upcoming lessons: {e}")
         return []
 
 @router.get("/my-lessons", response_model=List[LessonResponse])
-async def get_my_lessons(current_user: dict = Depends(get_current_user)):
+async def get_my_lessons(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_principal)
+):
     db = get_database()
     
     if current_user["user_type"] == "student":
-        student = await db.students.find_one({"email": current_user["email"]})
-        query = {"student_id": student["_id"]}
+        query = {"student_id": current_user["user_id"]}
     else:
-        instructor = await db.instructors.find_one({"email": current_user["email"]})
-        query = {"instructor_id": instructor["_id"]}
+        query = {"instructor_id": current_user["user_id"]}
     
-    lessons = []
-    async for lesson in db.lessons.find(query):
+    # Latest scheduled first
+    result = await fetch_page(db.lessons.find, query, page, "scheduled_date")
+    for lesson in result.items:
         lesson["id"] = str(lesson["_id"])
         lesson["student_id"] = str(lesson["student_id"])
         lesson["instructor_id"] = str(lesson["instructor_id"])
-        lessons.append(lesson)
     
-    return lessons
\ No newline at end of file
+    set_next_cursor(response, result.next_cursor)
+    return result.items
\ No newline at end of file
@@ -1,24 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
 from app.api.v1.dependencies import get_current_user
 from app.db.mongo import get_database
-from app.utils.email_sender import EmailSender
-from datetime import datetime
+from app.db.repositories import InstructorRepository, StudentRepository
+from app.services.notification_outbox import NotificationOutbox, notification_event
+from app.services.notification_service import NotificationService
+from app.utils.validation import validate_object_id
+from app.utils.pagination import PageParams, set_next_cursor
+from app.core.responses import BSONRoute
 from bson import ObjectId
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/")
-async def get_notifications(current_user: dict = Depends(get_current_user)):
-    db = get_database()
-    
-    # Get user notifications
-    notifications = []
-    async for notification in db.notifications.find({"user_email": current_user["email"]}).sort("created_at", -1):
+async def get_notifications(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    # Get user notifications, newest first
+    result = await NotificationService.get_page(current_user["email"], page)
+    for notification in result.items:
         notification["id"] = str(notification["_id"])
-        notifications.append(notification)
     
-    return notifications
+    set_next_cursor(response, result.next_cursor)
+    return result.items
+
+@router.get("/unread-count")
+async def get_unread_count(current_user: dict = Depends(get_current_user)):
+    """Badge count: one point read of the user's counter document"""
+    return {"unread_count": await NotificationService.unread_count(current_user["email"])}
+
+@router.put("/read")
+async def mark_all_notifications_read(
+    up_to: Optional[str] = Query(None, description="Only mark this notification and older ones"),
+    current_user: dict = Depends(get_current_user)
+):
+    anchor = None
+    if up_to:
+        anchor = await NotificationService.get_notification(current_user["email"], validate_object_id(up_to, "up_to"))
+        if not anchor:
+            raise HTTPException(status_code=404, detail="Notification not found")
+    
+    marked = await NotificationService.mark_all_read(current_user["email"], anchor)
+    return {"message": "Notifications marked as read", "marked": marked}
 
 @router.post("/send-lesson-notification")
 async def send_lesson_notification(
@@ -33,46 +58,34 @@ async def send_lesson_notification(
         raise HTTPException(status_code=404, detail="Lesson not found")
     
     # Get student and instructor details
-    student = await db.students.find_one({"_id": lesson["student_id"]})
-    instructor = await db.instructors.find_one({"_id": lesson["instructor_id"]})
-    
-    # Create notifications
-    notifications = [
-        {
-            "user_email": student["email"],
-            "title": "Lesson Booked",
-            "message": f"Your lesson with {instructor['first_name']} {instructor['last_name']} is scheduled for {lesson['scheduled_date']}",
-            "type": "lesson_booked",
-            "lesson_id": lesson_id,
-            "read": False,
-            "created_at": datetime.utcnow()
-        },
-        {
-            "user_email": instructor["email"],
-            "title": "New Lesson Request",
-            "message": f"New lesson request from {student['first_name']} {student['last_name']} for {lesson['scheduled_date']}",
-            "type": "lesson_request",
-            "lesson_id": lesson_id,
-            "read": False,
-            "created_at": datetime.utcnow()
-        }
-    ]
-    
-    await db.notifications.insert_many(notifications)
+    student = await StudentRepository.get_contact(lesson["student_id"])
+    instructor = await InstructorRepository.get_contact(lesson["instructor_id"])
     
-    # Send email notifications
-    email_sender = EmailSender()
-    await email_sender.send_email(
-        [student["email"]],
-        "Lesson Booked Confirmation",
-        f"Your driving lesson has been booked for {lesson['scheduled_date']}"
-    )
-    
-    await email_sender.send_email(
-        [instructor["email"]],
-        "New Lesson Request",
-        f"You have a new lesson request from {student['first_name']} {student['last_name']}"
-    )
+    # Queue in-app notifications and emails; the dispatcher delivers them
+    await NotificationOutbox.enqueue([
+        notification_event(
+            "Lesson Booked",
+            f"Your lesson with {instructor['first_name']} {instructor['last_name']} is scheduled for {lesson['scheduled_date']}",
+            "lesson_booked",
+            user_email=student["email"],
+            email={
+                "subject": "Lesson Booked Confirmation",
+                "body": f"Your driving lesson has been booked for {lesson['scheduled_date']}"
+            },
+            lesson_id=lesson_id
+        ),
+        notification_event(
+            "New Lesson Request",
+            f"New lesson request from {student['first_name']} {student['last_name']} for {lesson['scheduled_date']}",
+            "lesson_request",
+            user_email=instructor["email"],
+            email={
+                "subject": "New Lesson Request",
+                "body": f"You have a new lesson request from {student['first_name']} {student['last_name']}"
+            },
+            lesson_id=lesson_id
+        )
+    ])
     
     return {"message": "Notifications sent successfully"}
 
@@ -81,11 +94,6 @@ async def mark_notification_read(
     notification_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    db = get_database()
-    
-    await db.notifications.update_one(
-        {"_id": ObjectId(notification_id), "user_email": current_user["email"]},
-        {"$set": {"read": True}}
-    )
+    await NotificationService.mark_read(current_user["email"], validate_object_id(notification_id, "notification_id"))
     
     return {"message": "Notification marked as read"}
\ No newline at end of file
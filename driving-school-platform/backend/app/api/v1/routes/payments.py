@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.api.v1.dependencies import get_current_user
 from app.db.mongo import get_database
+from app.core.responses import BSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/process")
 async def process_payment(
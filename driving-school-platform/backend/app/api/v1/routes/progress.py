@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_user, get_current_principal
 from app.db.mongo import get_database
+from app.core.responses import BSONRoute
 from bson import ObjectId
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/lessons/{lesson_id}/notes")
 async def add_lesson_notes(
@@ -38,25 +39,16 @@ async def add_lesson_notes(
     return {"message": "Progress notes added successfully"}
 
 @router.get("/me")
-async def get_my_progress(current_user: dict = Depends(get_current_user)):
+async def get_my_progress(current_user: dict = Depends(get_current_principal)):
     try:
         if current_user["user_type"] != "student":
             raise HTTPException(status_code=403, detail="Only students can view their progress")
         
         db = get_database()
-        student = await db.students.find_one({"email": current_user["email"]})
-        
-        if not student:
-            return {
-                "total_lessons": 0,
-                "completed_lessons": 0,
-                "average_rating": 0,
-                "progress_entries": []
-            }
         
         # Get all lessons for student
         lessons = []
-        async for lesson in db.lessons.find({"student_id": student["_id"]}):
+        async for lesson in db.lessons.find({"student_id": current_user["user_id"]}):
             lesson["id"] = str(lesson["_id"])
             lessons.append(lesson)
         
@@ -1,25 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.api.v1.dependencies import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.api.v1.dependencies import get_current_principal
 from app.db.mongo import get_database
+from app.db.repositories import display_name
+from app.db.loaders import Loaders, get_loaders
+from app.core.responses import BSONRoute
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
 from bson import ObjectId
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/instructor/{instructor_id}")
 async def rate_instructor(
     instructor_id: str,
     rating_data: dict,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can rate instructors")
     
     db = get_database()
-    student = await db.students.find_one({"email": current_user["email"]})
     
     rating = {
-        "student_id": student["_id"],
+        "student_id": current_user["user_id"],
         "instructor_id": ObjectId(instructor_id),
         "rating": rating_data.get("rating", 5),
         "comment": rating_data.get("comment", ""),
@@ -48,14 +51,20 @@ async def rate_instructor(
     return {"message": "Rating submitted successfully"}
 
 @router.get("/instructor/{instructor_id}")
-async def get_instructor_ratings(instructor_id: str):
+async def get_instructor_ratings(
+    instructor_id: str,
+    response: Response,
+    page: PageParams = Depends(),
+    loaders: Loaders = Depends(get_loaders)
+):
     db = get_database()
     
-    ratings = []
-    async for rating in db.ratings.find({"instructor_id": ObjectId(instructor_id)}).sort("created_at", -1):
-        student = await db.students.find_one({"_id": rating["student_id"]})
+    result = await fetch_page(db.ratings.find, {"instructor_id": ObjectId(instructor_id)}, page, "created_at")
+    students = await loaders.students.load_many([rating["student_id"] for rating in result.items])
+    
+    for rating, student in zip(result.items, students):
         rating["id"] = str(rating["_id"])
-        rating["student_name"] = f"{student['first_name']} {student['last_name']}"
-        ratings.append(rating)
+        rating["student_name"] = display_name(student)
     
-    return ratings
\ No newline at end of file
+    set_next_cursor(response, result.next_cursor)
+    return result.items
\ No newline at end of file
@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends
 from typing import List
 from app.api.v1.dependencies import get_current_user
 from app.db.mongo import get_database
+from app.core.responses import BSONRoute
 from datetime import datetime, timedelta
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/available-slots")
 async def get_available_slots(
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_user, get_current_principal, invalidate_principal
 from app.db.mongo import get_database
+from app.db.repositories import SchoolRepository, StudentRepository, display_name
+from app.db.loaders import Loaders, get_loaders
 from app.utils.validation import validate_object_id, validate_required_fields
+from app.core.responses import BSONRoute
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
 from bson import ObjectId
+from pymongo import ASCENDING
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.post("/")
 async def create_school(
@@ -33,21 +38,18 @@ async def create_school(
     return school_dict
 
 @router.get("/")
-async def get_schools():
-    db = get_database()
-    schools = []
-    
-    async for school in db.schools.find({"status": "active"}):
-        school["id"] = str(school["_id"])
-        del school["_id"]  # Remove _id to avoid serialization issues
-        schools.append(school)
+async def get_schools(response: Response, page: PageParams = Depends()):
+    result = await fetch_page(SchoolRepository.find_public_cards, {"status": "active"}, page, direction=ASCENDING)
+    for school in result.items:
+        school["id"] = str(school.pop("_id"))
     
-    return schools
+    set_next_cursor(response, result.next_cursor)
+    return result.items
 
 @router.post("/{school_id}/join")
 async def join_school(
     school_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     if current_user["user_type"] != "student":
         raise HTTPException(status_code=403, detail="Only students can join schools")
@@ -58,12 +60,11 @@ async def join_school(
     db = get_database()
     
     # Verify school exists
-    school = await db.schools.find_one({"_id": school_obj_id})
-    if not school:
+    if not await SchoolRepository.exists(school_obj_id):
         raise HTTPException(status_code=404, detail="School not found")
     
     # Get student
-    student = await db.students.find_one({"email": current_user["email"]})
+    student = await StudentRepository.get_contact(current_user["user_id"])
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
@@ -95,7 +96,8 @@ async def join_school(
 @router.get("/{school_id}/requests")
 async def get_school_requests(
     school_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal),
+    loaders: Loaders = Depends(get_loaders)
 ):
     # Validate school_id
     school_obj_id = validate_object_id(school_id, "school_id")
@@ -103,40 +105,47 @@ async def get_school_requests(
     db = get_database()
     
     # Verify user is school admin or instructor
-    school = await db.schools.find_one({"_id": school_obj_id})
+    school = await SchoolRepository.get_with_instructor(school_obj_id, current_user["user_id"])
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
     
     # Check if user has permission to view school requests
     if current_user["user_type"] == "instructor":
-        instructor = await db.instructors.find_one({"email": current_user["email"]})
-        if not instructor or str(instructor["_id"]) not in school.get("instructor_ids", []):
+        if not school.get("instructor_ids"):
             raise HTTPException(status_code=403, detail="Access denied")
     elif current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    requests = []
-    async for request in db.school_requests.find({
+    requests = await db.school_requests.find({
         "school_id": school_obj_id,
         "status": "pending"
-    }):
-        # Get student details
-        student = await db.students.find_one({"_id": request["student_id"]})
+    }).to_list(None)
+    
+    # Get student details in one batched query
+    students = await loaders.students.load_many([request["student_id"] for request in requests])
+    
+    for request, student in zip(requests, students):
         request["id"] = str(request["_id"])
+        # Fall back to the details captured on the request if the student is gone
+        student = student or {
+            "_id": request["student_id"],
+            "first_name": request.get("student_name", ""),
+            "email": request.get("student_email", ""),
+            "phone": request.get("student_phone", "")
+        }
         request["student"] = {
             "id": str(student["_id"]),
-            "name": f"{student['first_name']} {student['last_name']}",
-            "email": student["email"],
-            "phone": student["phone"]
+            "name": display_name(student),
+            "email": student.get("email", ""),
+            "phone": student.get("phone", "")
         }
-        requests.append(request)
     
     return requests
 
 @router.put("/requests/{request_id}/approve")
 async def approve_student_request(
     request_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     # Validate request_id
     request_obj_id = validate_object_id(request_id, "request_id")
@@ -152,13 +161,12 @@ async def approve_student_request(
         raise HTTPException(status_code=400, detail="Request is not pending")
     
     # Verify user can approve requests for this school
-    school = await db.schools.find_one({"_id": request["school_id"]})
+    school = await SchoolRepository.get_with_instructor(request["school_id"], current_user["user_id"])
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
     
     if current_user["user_type"] == "instructor":
-        instructor = await db.instructors.find_one({"email": current_user["email"]})
-        if not instructor or str(instructor["_id"]) not in school.get("instructor_ids", []):
+        if not school.get("instructor_ids"):
             raise HTTPException(status_code=403, detail="Access denied")
     elif current_user["user_type"] != "admin":
         raise HTTPException(status_code=403, detail="Access denied")
@@ -180,6 +188,8 @@ async def approve_student_request(
         {"_id": request["student_id"]},
         {"$set": {"school_id": request["school_id"], "school_status": "approved"}}
     )
+    if request.get("student_email"):
+        invalidate_principal(request["student_email"])
     
     return {"message": "Student approved successfully"}
 
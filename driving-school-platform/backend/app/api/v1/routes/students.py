@@ -1,20 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List
 from app.api.v1.schemas.student import StudentResponse, StudentUpdate
-from app.api.v1.dependencies import get_current_user
+from app.api.v1.dependencies import get_current_user, get_current_principal
 from app.db.mongo import get_database
+from app.db.repositories import StudentRepository
+from app.core.responses import BSONRoute
+from app.utils.pagination import PageParams, fetch_page, set_next_cursor
 from bson import ObjectId
+from pymongo import ASCENDING
 
-router = APIRouter()
+router = APIRouter(route_class=BSONRoute)
 
 @router.get("/me")
-async def get_current_student(current_user: dict = Depends(get_current_user)):
+async def get_current_student(current_user: dict = Depends(get_current_principal)):
     try:
         if current_user["user_type"] != "student":
             raise HTTPException(status_code=403, detail="Access denied")
         
-        db = get_database()
-        student = await db.students.find_one({"email": current_user["email"]})
+        student = await StudentRepository.get(current_user["user_id"])
         
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
@@ -40,7 +43,7 @@ async def get_current_student(current_user: dict = Depends(get_current_user)):
 @router.put("/me")
 async def update_current_student(
     student_update: StudentUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_principal)
 ):
     try:
         if current_user["user_type"] != "student":
@@ -51,11 +54,11 @@ async def update_current_student(
         
         if update_data:
             await db.students.update_one(
-                {"email": current_user["email"]},
+                {"_id": current_user["user_id"]},
                 {"$set": update_data}
             )
         
-        student = await db.students.find_one({"email": current_user["email"]})
+        student = await StudentRepository.get(current_user["user_id"])
         
         response = {
             "id": str(student["_id"]),
@@ -75,14 +78,17 @@ async def update_current_student(
         raise HTTPException(status_code=500, detail="Failed to update profile")
 
 @router.get("/", response_model=List[StudentResponse])
-async def get_all_students(current_user: dict = Depends(get_current_user)):
+async def get_all_students(
+    response: Response,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["user_type"] != "instructor":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    db = get_database()
-    students = []
-    async for student in db.students.find():
+    result = await fetch_page(StudentRepository.find_profiles, {}, page, direction=ASCENDING)
+    for student in result.items:
         student["id"] = str(student["_id"])
-        students.append(student)
     
-    return students
\ No newline at end of file
+    set_next_cursor(response, result.next_cursor)
+    return result.items
\ No newline at end of file
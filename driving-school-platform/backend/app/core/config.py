@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 import os
 
 class Settings(BaseSettings):
@@ -8,15 +8,104 @@ class Settings(BaseSettings):
     secret_key: str = os.getenv("SECRET_KEY", "fallback-secret-for-development-only")
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    token_cache_size: int = 10000
+    principal_claims_max_age_seconds: int = 300
+    cpu_pool_workers: Optional[int] = None  # defaults to the number of CPUs
     
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "driving_school"
     
+    # Motor connection pool
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 10  # opened at startup so the first requests don't pay for connects
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_wait_queue_timeout_ms: Optional[int] = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_connect_timeout_ms: int = 10000
+    mongo_socket_timeout_ms: Optional[int] = None
+    mongo_compressors: str = ""  # e.g. "zstd,snappy"; needs the zstandard/python-snappy packages
+    mongo_metrics_reply_bytes: bool = False
+    # Probe students/instructors for emails missing from identities; only needed on
+    # databases that app/db/migrations/backfill_identities.py has not been run against
+    identity_legacy_fallback: bool = False
+    
     aws_access_key_id: Optional[str] = None
     aws_secret_access_key: Optional[str] = None
     aws_region: str = "us-east-1"
     s3_bucket: Optional[str] = None
     
+    # Mongo queries allowed per request; overrides are keyed by "METHOD route-template"
+    query_budget_default: int = 10
+    query_budgets: Dict[str, int] = {}
+    query_budget_strict: bool = False  # raise instead of warning (used by tests)
+    
+    # WebSocket delivery: per-connection send queue and what to do when it fills up
+    ws_send_queue_size: int = 256
+    ws_overflow_policy: str = "drop_oldest"  # drop_oldest | drop_newest | disconnect
+    ws_send_timeout_seconds: float = 10.0
+    ws_heartbeat_interval_seconds: float = 25.0
+    ws_idle_timeout_seconds: float = 75.0  # close sockets silent for this long
+    
+    # How WebSocket frames reach users connected to other workers: inprocess | mongo
+    fanout_backend: str = "inprocess"
+    fanout_collection: str = "fanout_events"
+    fanout_capped_bytes: int = 64 * 1024 * 1024
+    fanout_clock_skew_seconds: float = 2.0  # overlap re-read when a tail cursor restarts
+    fanout_dedupe_window: int = 10000
+    
+    # Chat messages sent over the WebSocket are persisted in batches of up to this size/age
+    chat_write_batch_size: int = 100
+    chat_write_window_ms: int = 20
+    
+    # "messages" (one document per message) or "buckets" (see app.services.message_buckets)
+    chat_storage_mode: str = "messages"
+    chat_bucket_max_messages: int = 200
+    chat_bucket_max_seconds: int = 86400
+    
+    # Notification outbox (app.services.notification_outbox)
+    outbox_transactions: bool = False  # write events in the business change's transaction; needs a replica set. Off, a crash between the two writes loses the notifications
+    outbox_batch_size: int = 100
+    outbox_poll_interval_seconds: float = 0.5
+    outbox_lease_seconds: int = 60
+    outbox_max_attempts: int = 8
+    outbox_retry_base_seconds: float = 2.0
+    outbox_retention_seconds: int = 7 * 24 * 3600  # delivered events are kept this long
+    
+    # Server-push event stream (/events/stream, /events/ws)
+    events_retention_seconds: int = 24 * 3600  # how far back a reconnecting client can resume
+    events_replay_limit: int = 500  # beyond this many missed events the client is told to reload
+    events_retry_ms: int = 3000  # SSE reconnect delay suggested to clients
+    events_gap_wait_ms: int = 1000  # how long an out-of-order event waits for the ones before it
+    
+    # Retention (app.services.retention): read notifications of the expiring types are deleted
+    # once past their expiry; older read notifications and chat history move to *_archive
+    notification_expiring_types: str = "lesson_booked,lesson_request,lesson_confirmed,lesson_cancelled"
+    notification_expire_seconds: int = 30 * 24 * 3600  # counted from creation
+    notification_archive_after_seconds: int = 90 * 24 * 3600
+    chat_archive_after_seconds: int = 180 * 24 * 3600
+    archive_enabled: bool = True
+    archive_interval_seconds: int = 3600
+    archive_batch_size: int = 500
+    archive_max_batches: int = 100  # per collection and run, so a backlog is worked off over several runs
+    
+    # Outgoing email (app.utils.email_sender): "console" prints, "smtp" delivers through the pool
+    email_backend: str = "console"
+    email_from: str = "noreply@drivingschool.com"
+    smtp_host: str = "localhost"
+    smtp_port: int = 587
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_starttls: bool = True  # upgrade when the server offers it
+    smtp_timeout_seconds: float = 30.0
+    email_pool_size: int = 4  # persistent SMTP connections
+    email_pipeline_depth: int = 20  # messages sent per PIPELINING round trip
+    email_max_messages_per_connection: int = 100  # reconnect after this many, as servers cap it
+    email_idle_seconds: float = 60.0  # reconnect rather than reuse a connection unused this long
+    email_digest_window_ms: int = 1000  # emails to one recipient queued this close together go out as one
+    email_digest_max: int = 10
+    email_max_attempts: int = 3  # 4xx replies and dropped connections; the outbox retries after that
+    email_retry_base_seconds: float = 1.0
+    
     allowed_origins: str = "http://localhost:3000,http://localhost:19006"
     
     class Config:
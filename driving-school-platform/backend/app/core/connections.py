@@ -0,0 +1,168 @@
+"""WebSocket connection registry with per-connection send queues.
+
+Each connection gets a bounded queue drained by its own writer task, so
+``send_personal_message`` only enqueues and never waits on a client's socket.
+A user may have several connections (one per device). A heartbeat task pings
+every connection and closes the ones that have been silent for too long.
+
+Connections belong to a channel: ``chat`` sockets get chat frames and
+``events`` streams (/events/stream, /events/ws) get event frames, so neither
+receives the other's.
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Set
+from fastapi import WebSocket
+from app.core.config import settings
+from app.core.metrics import (
+    ws_connected_users,
+    ws_connections,
+    ws_disconnects,
+    ws_messages_dropped,
+    ws_send_duration,
+    ws_send_queue_depth
+)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+CHANNELS = ("chat", "events")
+PING_FRAME = '{"type": "ping"}'
+
+class Connection:
+    """One WebSocket with its bounded send queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, user_email: str, manager: "ConnectionManager", channel: str = "chat"):
+        self.websocket = websocket
+        self.user_email = user_email
+        self.manager = manager
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._closing: Optional[asyncio.Task] = None
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def touch(self):
+        """Record client activity (any received frame counts as a heartbeat reply)"""
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, message: str) -> bool:
+        """Queue a frame for the writer; returns False if it was not queued"""
+        if self.closed:
+            return False
+        if self.queue.full():
+            policy = settings.ws_overflow_policy
+            ws_messages_dropped.inc(policy=policy)
+            if policy == "disconnect":
+                self.manager.abort(self, "overflow")
+                return False
+            if policy == "drop_newest":
+                return False
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+        ws_send_queue_depth.observe(self.queue.qsize())
+        return True
+
+    async def _write_loop(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                started = time.perf_counter()
+                await asyncio.wait_for(self.websocket.send_text(message), settings.ws_send_timeout_seconds)
+                ws_send_duration.observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            await self.manager.close(self, "send_timeout")
+        except Exception:
+            await self.manager.close(self, "send_failed")
+
+    def stop(self):
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+class ConnectionManager:
+    def __init__(self):
+        self.user_connections: Dict[str, Set[Connection]] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def connect(self, websocket: WebSocket, user_email: str, channel: str = "chat") -> Connection:
+        if channel not in CHANNELS:
+            raise ValueError(f"channel must be one of {', '.join(CHANNELS)}")
+        await websocket.accept()
+        connection = Connection(websocket, user_email, self, channel)
+        self.user_connections.setdefault(user_email, set()).add(connection)
+        ws_connections.inc()
+        ws_connected_users.set(len(self.user_connections))
+        return connection
+
+    def disconnect(self, connection: Connection, reason: str = "client_closed"):
+        """Forget a connection; safe to call more than once"""
+        connections = self.user_connections.get(connection.user_email)
+        if not connections or connection not in connections:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self.user_connections[connection.user_email]
+        connection.stop()
+        ws_connections.dec()
+        ws_connected_users.set(len(self.user_connections))
+        ws_disconnects.inc(reason=reason)
+
+    async def close(self, connection: Connection, reason: str):
+        """Server-side close (slow, idle or broken client)"""
+        self.disconnect(connection, reason)
+        await connection.close_socket(1001 if reason == "shutdown" else 1008)
+
+    def abort(self, connection: Connection, reason: str):
+        """Like close, without waiting for the close frame to be written"""
+        self.disconnect(connection, reason)
+        connection._closing = asyncio.create_task(connection.close_socket(1008))
+
+    async def send_personal_message(self, message: str, user_email: str, channel: str = "chat") -> int:
+        """Queue a frame on every connection a user has on ``channel``; returns how many accepted it"""
+        delivered = 0
+        for connection in list(self.user_connections.get(user_email, ())):
+            if connection.channel == channel and connection.enqueue(message):
+                delivered += 1
+        return delivered
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.user_connections.values())
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.ws_heartbeat_interval_seconds)
+            now = time.monotonic()
+            for connections in list(self.user_connections.values()):
+                for connection in list(connections):
+                    if now - connection.last_seen > settings.ws_idle_timeout_seconds:
+                        self.abort(connection, "idle")
+                    else:
+                        connection.enqueue(PING_FRAME)
+
+    def start_heartbeat(self):
+        if settings.ws_overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"ws_overflow_policy must be one of {', '.join(OVERFLOW_POLICIES)}")
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def shutdown(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        for connections in list(self.user_connections.values()):
+            for connection in list(connections):
+                await self.close(connection, "shutdown")
+
+manager = ConnectionManager()
\ No newline at end of file
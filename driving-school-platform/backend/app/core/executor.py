@@ -0,0 +1,23 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.core.config import settings
+
+# Process pool for CPU-bound work (password hashing) so it never runs on the event loop
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ProcessPoolExecutor(max_workers=settings.cpu_pool_workers or None)
+    return _cpu_executor
+
+async def run_cpu_bound(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), func, *args)
+
+def shutdown_cpu_executor():
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
\ No newline at end of file
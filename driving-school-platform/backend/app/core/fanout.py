@@ -0,0 +1,166 @@
+"""Fan-out of user-addressed frames to whichever worker holds the user's sockets.
+
+``publish`` hands a frame to the configured bus, which delivers it through
+every worker's ConnectionManager to the user's connections on the frame's
+channel (``chat`` or ``events``):
+
+* ``inprocess`` (default) delivers straight to this process's manager, which
+  is all a single-worker deployment needs.
+* ``mongo`` appends the frame to a capped collection that every worker tails
+  with a tailable/await cursor, so any worker can reach a user connected to
+  any other. It works on a standalone mongod (no replica set needed). The
+  publishing worker delivers its own frames directly and skips them when they
+  come back through the tail.
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+from app.core.config import settings
+from app.core.metrics import fanout_delivery_latency, fanout_published
+from app.db.mongo import get_database
+
+Deliver = Callable[[str, str, str], Awaitable[int]]  # (message, user_email, channel)
+
+class FanoutBus:
+    name = "base"
+
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+
+    async def publish(self, user_email: str, message: str, channel: str = "chat"):
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def _deliver(self, user_email: str, message: str, published_at: float, channel: str = "chat"):
+        await self.deliver(message, user_email, channel)
+        fanout_delivery_latency.observe(max(time.time() - published_at, 0.0), backend=self.name)
+
+class InProcessBus(FanoutBus):
+    name = "inprocess"
+
+    async def publish(self, user_email: str, message: str, channel: str = "chat"):
+        fanout_published.inc(backend=self.name)
+        await self._deliver(user_email, message, time.time(), channel)
+
+class MongoFanoutBus(FanoutBus):
+    name = "mongo"
+
+    def __init__(self, deliver: Deliver):
+        super().__init__(deliver)
+        self.origin = uuid.uuid4().hex
+        self._tail_task: Optional[asyncio.Task] = None
+        # Ids already delivered, so a restarted cursor can re-read an overlap window safely
+        self._seen: "OrderedDict[object, None]" = OrderedDict()
+
+    @property
+    def collection(self):
+        return get_database()[settings.fanout_collection]
+
+    async def ensure_collection(self):
+        db = get_database()
+        if settings.fanout_collection not in await db.list_collection_names():
+            try:
+                await db.create_collection(settings.fanout_collection, capped=True, size=settings.fanout_capped_bytes)
+                # A tailable cursor on an empty capped collection dies immediately
+                await self.collection.insert_one({"type": "init", "published_at": datetime.utcnow()})
+            except CollectionInvalid:
+                pass  # another worker created it first
+
+    async def publish(self, user_email: str, message: str, channel: str = "chat"):
+        published_at = time.time()
+        await self.collection.insert_one({
+            "origin": self.origin,
+            "user_email": user_email,
+            "channel": channel,
+            "message": message,
+            "published_at": datetime.utcfromtimestamp(published_at),
+            "published_ts": published_at
+        })
+        fanout_published.inc(backend=self.name)
+        await self._deliver(user_email, message, published_at, channel)
+
+    def _remember(self, event_id) -> bool:
+        if event_id in self._seen:
+            return False
+        self._seen[event_id] = None
+        if len(self._seen) > settings.fanout_dedupe_window:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _tail(self):
+        since = datetime.utcnow()
+        while True:
+            cursor = self.collection.find(
+                {"published_at": {"$gte": since - timedelta(seconds=settings.fanout_clock_skew_seconds)}},
+                cursor_type=CursorType.TAILABLE_AWAIT
+            ).max_await_time_ms(1000)
+            try:
+                while cursor.alive:
+                    async for event in cursor:
+                        if not self._remember(event["_id"]) or "user_email" not in event:
+                            continue
+                        since = max(since, event["published_at"])
+                        if event.get("origin") == self.origin:
+                            continue
+                        await self._deliver(
+                            event["user_email"], event["message"], event["published_ts"], event.get("channel", "chat")
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Fan-out tail failed, restarting: {e}")
+            # The cursor dies when the capped collection wraps past it; reopen from the last event
+            await asyncio.sleep(0.5)
+
+    async def start(self):
+        await self.ensure_collection()
+        if self._tail_task is None:
+            self._tail_task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._tail_task is not None:
+            self._tail_task.cancel()
+            try:
+                await self._tail_task
+            except asyncio.CancelledError:
+                pass
+            self._tail_task = None
+
+BACKENDS = {
+    InProcessBus.name: InProcessBus,
+    MongoFanoutBus.name: MongoFanoutBus
+}
+
+_bus: Optional[FanoutBus] = None
+
+def get_fanout_bus() -> FanoutBus:
+    global _bus
+    if _bus is None:
+        from app.core.connections import manager
+        if settings.fanout_backend not in BACKENDS:
+            raise ValueError(f"fanout_backend must be one of {', '.join(BACKENDS)}")
+        _bus = BACKENDS[settings.fanout_backend](manager.send_personal_message)
+    return _bus
+
+async def publish(user_email: str, message: str, channel: str = "chat"):
+    """Deliver a frame to every connection the user has on ``channel``, on any worker"""
+    await get_fanout_bus().publish(user_email, message, channel)
+
+async def start_fanout():
+    await get_fanout_bus().start()
+
+async def stop_fanout():
+    global _bus
+    if _bus is not None:
+        await _bus.stop()
+        _bus = None
\ No newline at end of file
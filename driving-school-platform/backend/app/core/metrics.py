@@ -0,0 +1,362 @@
+"""In-process metrics rendered in the Prometheus text exposition format"""
+import contextvars
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ASGI scope of the HTTP request being served, so driver callbacks can attribute work to its route
+current_request_scope: contextvars.ContextVar = contextvars.ContextVar("current_request_scope", default=None)
+
+def route_label(scope: Optional[dict]) -> str:
+    """Route template (e.g. /api/v1/lessons/{lesson_id}) for a request scope"""
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def current_route() -> str:
+    return route_label(current_request_scope.get())
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        # Optional callback returning {label values: value}, sampled at render time
+        self._function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._label_values(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        if self._function is not None:
+            items = list(self._function().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._label_values(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+mongo_command_duration = registry.histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency attributed to the HTTP route that issued it",
+    ("route", "collection", "command")
+)
+mongo_documents_returned = registry.counter(
+    "mongo_command_documents_returned_total",
+    "Documents returned (or affected, for writes) by MongoDB commands",
+    ("route", "collection", "command")
+)
+mongo_reply_bytes = registry.counter(
+    "mongo_command_reply_bytes_total",
+    "BSON size of MongoDB command replies (only when MONGO_METRICS_REPLY_BYTES is on)",
+    ("route", "collection", "command")
+)
+mongo_command_failures = registry.counter(
+    "mongo_command_failures_total",
+    "Failed MongoDB commands",
+    ("route", "collection", "command")
+)
+http_request_mongo_queries = registry.histogram(
+    "http_request_mongo_queries",
+    "MongoDB queries issued per HTTP request",
+    ("method", "route"),
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 25, 50, 100)
+)
+query_budget_exceeded = registry.counter(
+    "query_budget_exceeded_total",
+    "Requests that issued more MongoDB queries than their route's budget",
+    ("method", "route")
+)
+token_cache_hits = registry.counter(
+    "token_cache_hits_total",
+    "Access tokens answered from the verified-token cache"
+)
+token_cache_misses = registry.counter(
+    "token_cache_misses_total",
+    "Access tokens that had to be decoded and verified"
+)
+ws_connections = registry.gauge(
+    "ws_connections",
+    "Open WebSocket connections in this process"
+)
+ws_connected_users = registry.gauge(
+    "ws_connected_users",
+    "Users with at least one open WebSocket connection in this process"
+)
+ws_send_queue_depth = registry.histogram(
+    "ws_send_queue_depth",
+    "Per-connection send queue depth after enqueueing a message",
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+ws_send_duration = registry.histogram(
+    "ws_send_duration_seconds",
+    "Time to write one frame to a WebSocket"
+)
+ws_messages_dropped = registry.counter(
+    "ws_messages_dropped_total",
+    "Messages not delivered because a connection's send queue was full",
+    ("policy",)
+)
+ws_disconnects = registry.counter(
+    "ws_disconnects_total",
+    "WebSocket connections removed, by reason",
+    ("reason",)
+)
+fanout_published = registry.counter(
+    "fanout_published_total",
+    "Frames published to the fan-out bus",
+    ("backend",)
+)
+fanout_delivery_latency = registry.histogram(
+    "fanout_delivery_latency_seconds",
+    "Time from publishing a frame to handing it to a worker's connection manager",
+    ("backend",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+chat_write_batch_size = registry.histogram(
+    "chat_write_batch_size",
+    "Messages persisted per write-behind insert_many",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+chat_write_flush_duration = registry.histogram(
+    "chat_write_flush_duration_seconds",
+    "Time to persist one write-behind batch of chat messages"
+)
+chat_write_failures = registry.counter(
+    "chat_write_failures_total",
+    "Chat messages from the WebSocket that could not be persisted"
+)
+notification_outbox_dispatched = registry.counter(
+    "notification_outbox_dispatched_total",
+    "Outbox notifications delivered, by channel",
+    ("channel",)
+)
+notification_outbox_retries = registry.counter(
+    "notification_outbox_retries_total",
+    "Outbox events scheduled for another delivery attempt"
+)
+notification_outbox_failed = registry.counter(
+    "notification_outbox_failed_total",
+    "Outbox events given up on after outbox_max_attempts"
+)
+notification_outbox_lag = registry.histogram(
+    "notification_outbox_lag_seconds",
+    "Time from enqueueing a notification to finishing its delivery",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+archive_moved = registry.counter(
+    "archive_moved_total",
+    "Documents moved into an archive collection, by source collection",
+    ("collection",)
+)
+archive_run_duration = registry.histogram(
+    "archive_run_duration_seconds",
+    "Time taken by one archiver run over all collections",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+email_sent = registry.counter(
+    "email_sent_total",
+    "Emails accepted by the SMTP server (a digest counts once)"
+)
+email_digested = registry.counter(
+    "email_digested_total",
+    "Emails folded into another one to the same recipient"
+)
+email_retries = registry.counter(
+    "email_retries_total",
+    "Emails scheduled for another attempt after a 4xx reply or connection failure"
+)
+email_failed = registry.counter(
+    "email_failed_total",
+    "Emails given up on, by reason",
+    ("reason",)
+)
+email_queue_depth = registry.gauge(
+    "email_queue_depth",
+    "Emails waiting for a pooled SMTP connection"
+)
+email_batch_size = registry.histogram(
+    "email_batch_size",
+    "Emails sent per pipelined SMTP round trip",
+    buckets=(1, 2, 5, 10, 20, 50, 100)
+)
+email_batch_duration = registry.histogram(
+    "email_batch_duration_seconds",
+    "Time to send one pipelined batch, including any reconnect",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+mongo_pool_checkout_wait = registry.histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    ("address",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+mongo_pool_checkout_failures = registry.counter(
+    "mongo_pool_checkout_failures_total",
+    "Connection checkouts that failed, e.g. on wait queue timeout",
+    ("address", "reason")
+)
+mongo_pool_in_use = registry.gauge(
+    "mongo_pool_connections_in_use",
+    "Connections currently checked out of the pool",
+    ("address",)
+)
+mongo_pool_waiting = registry.gauge(
+    "mongo_pool_checkouts_waiting",
+    "Operations currently waiting for a pooled connection",
+    ("address",)
+)
+mongo_pool_open = registry.gauge(
+    "mongo_pool_connections_open",
+    "Open pooled connections",
+    ("address",)
+)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import time
+from app.core.config import settings
+from app.core.metrics import (
+    current_request_scope,
+    http_request_duration,
+    http_request_mongo_queries,
+    query_budget_exceeded,
+    route_label
+)
+from app.core.query_budget import (
+    QueryBudgetExceeded,
+    QueryCounter,
+    budget_for,
+    current_query_counter,
+    query_count_observers
+)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request by route template.
+
+    It also publishes the request scope in a contextvar so database command
+    listeners can attribute their work to the route being served.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = current_request_scope.set(scope)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route_label(scope),
+                status=str(status_code)
+            )
+            current_request_scope.reset(token)
+
+class QueryBudgetMiddleware:
+    """Counts MongoDB queries per HTTP request and checks them against the route's budget.
+
+    Over-budget requests are logged and counted. With QUERY_BUDGET_STRICT the
+    response is held back until the check passes and QueryBudgetExceeded is
+    raised instead of sending it, so the client gets a 500; streamed
+    responses are released at their first chunk and can only be checked
+    after they finish.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = QueryCounter()
+        token = current_query_counter.set(counter)
+        held = []
+
+        async def hold(message):
+            if held is None:
+                await send(message)
+            elif message["type"] == "http.response.body" and message.get("more_body", False):
+                await release()
+                await send(message)
+            else:
+                held.append(message)
+
+        async def release():
+            nonlocal held
+            messages, held = held, None
+            for message in messages:
+                await send(message)
+
+        try:
+            await self.app(scope, receive, hold if settings.query_budget_strict else send)
+        finally:
+            current_query_counter.reset(token)
+
+        method = scope["method"]
+        route = route_label(scope)
+        http_request_mongo_queries.observe(counter.count, method=method, route=route)
+        for observer in query_count_observers:
+            observer(method, route, counter.count)
+
+        budget = budget_for(method, route)
+        if counter.count > budget:
+            query_budget_exceeded.inc(method=method, route=route)
+            message = f"{method} {route} issued {counter.count} MongoDB queries (budget {budget})"
+            if settings.query_budget_strict:
+                raise QueryBudgetExceeded(message)
+            print(f"⚠️ Query budget exceeded: {message}")
+
+        if settings.query_budget_strict and held is not None:
+            await release()
\ No newline at end of file
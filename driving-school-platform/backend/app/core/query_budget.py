@@ -0,0 +1,69 @@
+"""Per-request MongoDB query budgets that flag N+1 regressions.
+
+The command listener counts the queries issued while serving a request
+(cursor continuations are not counted); QueryBudgetMiddleware checks the
+total against the route's budget once the request finishes.
+"""
+import contextvars
+import threading
+from typing import Callable, Dict, List, Optional
+from app.core.config import settings
+
+# Budgets keyed by "METHOD route-template"; anything else gets settings.query_budget_default.
+# Keep these at the current round-trip counts so a new per-row lookup trips the guard.
+QUERY_BUDGETS: Dict[str, int] = {
+    "POST /api/v1/auth/login": 4,
+    "POST /api/v1/auth/register": 6,
+    "GET /api/v1/notifications/": 3,  # + archived flag and notifications_archive past the hot listing
+    "POST /api/v1/notifications/send-lesson-notification": 4,
+    "GET /api/v1/notifications/unread-count": 1,
+    "GET /api/v1/events/stream": 2,
+    "PUT /api/v1/notifications/read": 3,
+    "PUT /api/v1/notifications/{notification_id}/read": 2,
+    "POST /api/v1/lessons/": 4,
+    "GET /api/v1/lessons/upcoming": 2,
+    "GET /api/v1/lessons/my-lessons": 1,
+    "GET /api/v1/instructor/pending-lessons": 2,
+    "GET /api/v1/ratings/instructor/{instructor_id}": 2,
+    "GET /api/v1/schools/{school_id}/requests": 3,
+    "POST /api/v1/booking/school/join": 4,
+    "POST /api/v1/booking/lesson": 6,
+    "PUT /api/v1/booking/school/{booking_id}/approve": 6,
+    "PUT /api/v1/booking/lesson/{booking_id}/accept": 5,
+    "GET /api/v1/booking/my-requests": 1,
+    "POST /api/v1/chat/send": 2,
+    "GET /api/v1/chat/conversations": 1,
+    "GET /api/v1/chat/messages/{other_user_email}": 8,  # + anchor and history from the archive, unread recount
+}
+
+# Cursor continuations scale with result size, not with the number of distinct queries
+UNCOUNTED_COMMANDS = {"getMore", "killCursors"}
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        # Called from Motor's executor threads
+        with self._lock:
+            self.count += 1
+
+current_query_counter: contextvars.ContextVar = contextvars.ContextVar("current_query_counter", default=None)
+
+# Called with (method, route, count) for every finished request; the test suite collects counts here
+query_count_observers: List[Callable[[str, str, int], None]] = []
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def budget_for(method: str, route: str) -> int:
+    key = f"{method} {route}"
+    if key in settings.query_budgets:
+        return settings.query_budgets[key]
+    return QUERY_BUDGETS.get(key, settings.query_budget_default)
+
+def count_command(command_name: str):
+    counter: Optional[QueryCounter] = current_query_counter.get()
+    if counter is not None and command_name not in UNCOUNTED_COMMANDS:
+        counter.increment()
\ No newline at end of file
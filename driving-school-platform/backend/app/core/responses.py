@@ -0,0 +1,72 @@
+import asyncio
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+def _default(obj: Any):
+    """Fallback for the types orjson doesn't encode natively (BSON types, Decimal, sets, models)"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, date) and not isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class BSONJSONResponse(JSONResponse):
+    """JSON response rendered with orjson that understands ObjectId, datetime and Decimal128"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class BSONRoute(APIRoute):
+    """Route that renders raw handler results with BSONJSONResponse.
+
+    For routes without a response_model the handler's return value is rendered
+    directly, skipping FastAPI's generic jsonable_encoder pass, so handlers can
+    return Mongo documents as-is. Headers and status set on an injected
+    ``Response`` parameter are carried over, as FastAPI does.
+    """
+
+    def get_route_handler(self):
+        if self.response_model is None and not getattr(self.dependant.call, "renders_bson", False):
+            self.dependant.call = self._render_bson(self.dependant.call)
+        return super().get_route_handler()
+
+    def _render_bson(self, call):
+        status_code = self.status_code or 200
+        is_coroutine = asyncio.iscoroutinefunction(call)
+        response_param = self.dependant.response_param_name
+
+        async def call_and_render(**values):
+            if is_coroutine:
+                content = await call(**values)
+            else:
+                content = await run_in_threadpool(call, **values)
+            if isinstance(content, Response):
+                return content
+            sub_response = values.get(response_param) if response_param else None
+            if sub_response is None:
+                return BSONJSONResponse(content, status_code=status_code)
+            response = BSONJSONResponse(content, status_code=sub_response.status_code or status_code)
+            response.headers.raw.extend(sub_response.headers.raw)
+            return response
+
+        call_and_render.renders_bson = True
+        return call_and_render
\ No newline at end of file
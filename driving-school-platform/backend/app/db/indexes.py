@@ -0,0 +1,168 @@
+import asyncio
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.core.config import settings
+from app.db.mongo import get_database
+
+# Declared indexes per collection, shaped after the filters/sorts the routes issue
+INDEXES: Dict[str, List[IndexModel]] = {
+    "students": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "instructors": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "identities": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "schools": [
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "lessons": [
+        IndexModel([("student_id", ASCENDING), ("scheduled_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("instructor_id", ASCENDING), ("scheduled_date", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("instructor_id", ASCENDING), ("scheduled_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("scheduled_date", ASCENDING)]),
+    ],
+    "bookings": [
+        IndexModel([("student_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("instructor_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "school_requests": [
+        IndexModel([("school_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("student_id", ASCENDING), ("school_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "notifications": [
+        IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Only read ones expire, so the unread counters never lose a document
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, partialFilterExpression={"read": True}),
+    ],
+    "notifications_archive": [
+        IndexModel([("user_email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, partialFilterExpression={"read": True}),
+    ],
+    "notification_outbox": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)]),
+        IndexModel([("lease", ASCENDING)], sparse=True),
+        IndexModel([("dispatched_at", ASCENDING)], expireAfterSeconds=settings.outbox_retention_seconds),
+    ],
+    "user_events": [
+        IndexModel([("user_email", ASCENDING), ("seq", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.events_retention_seconds),
+    ],
+    "conversations": [
+        IndexModel([("owner_email", ASCENDING), ("other_email", ASCENDING)], unique=True),
+        IndexModel([("owner_email", ASCENDING), ("last_message_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "messages": [
+        IndexModel([("conversation_key", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "messages_archive": [
+        IndexModel([("conversation_key", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "message_buckets": [
+        IndexModel([("conversation_key", ASCENDING), ("end_at", DESCENDING)]),
+        IndexModel([("conversation_key", ASCENDING), ("start_at", ASCENDING)]),
+        # Anchors are looked up by the embedded message _id
+        IndexModel([("conversation_key", ASCENDING), ("messages._id", ASCENDING)]),
+    ],
+    "message_buckets_archive": [
+        IndexModel([("conversation_key", ASCENDING), ("end_at", DESCENDING)]),
+        IndexModel([("conversation_key", ASCENDING), ("start_at", ASCENDING)]),
+        # Anchors are looked up by the embedded message _id
+        IndexModel([("conversation_key", ASCENDING), ("messages._id", ASCENDING)]),
+    ],
+    "ratings": [
+        IndexModel([("instructor_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "progress": [
+        IndexModel([("lesson_id", ASCENDING)]),
+    ],
+}
+
+# Index options that make two indexes on the same keys behave differently
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Outcome of the last reconcile, keyed by collection
+index_status: Dict[str, dict] = {}
+_reconcile_task: Optional[asyncio.Task] = None
+
+def _key_spec(keys) -> tuple:
+    # IndexModel documents hold a SON, index_information() a list of pairs
+    pairs = keys.items() if hasattr(keys, "items") else keys
+    return tuple(
+        (field, direction if isinstance(direction, str) else int(direction))
+        for field, direction in pairs
+    )
+
+def _options(spec: dict) -> dict:
+    return {option: spec[option] for option in COMPARED_OPTIONS if option in spec}
+
+async def ensure_collection_indexes(collection_name: str) -> dict:
+    """Create missing declared indexes for one collection and report drift.
+
+    Existing indexes are never dropped: an index on the same keys with
+    different options, or one that is not declared, is only reported.
+    """
+    db = get_database()
+    collection = db[collection_name]
+    existing = {
+        _key_spec(spec["key"]): (name, spec)
+        for name, spec in (await collection.index_information()).items()
+    }
+
+    missing = []
+    drift = []
+    declared_keys = set()
+    for model in INDEXES.get(collection_name, []):
+        document = model.document
+        keys = _key_spec(document["key"])
+        declared_keys.add(keys)
+        if keys not in existing:
+            missing.append(model)
+            continue
+
+        name, spec = existing[keys]
+        if _options(spec) != _options(document):
+            drift.append(f"{name}: options {_options(spec)} != declared {_options(document)}")
+
+    undeclared = [
+        name for keys, (name, _) in existing.items()
+        if name != "_id_" and keys not in declared_keys
+    ]
+
+    created = await collection.create_indexes(missing) if missing else []
+    result = {"created": created, "drift": drift, "undeclared": undeclared}
+    index_status[collection_name] = result
+    return result
+
+async def ensure_indexes():
+    """Reconcile every collection in the registry"""
+    for collection_name in INDEXES:
+        try:
+            result = await ensure_collection_indexes(collection_name)
+        except Exception as e:
+            index_status[collection_name] = {"error": str(e)}
+            print(f"❌ Index reconcile failed for {collection_name}: {e}")
+            continue
+
+        if result["created"]:
+            print(f"Created indexes on {collection_name}: {', '.join(result['created'])}")
+        for drift in result["drift"]:
+            print(f"⚠️ Index drift on {collection_name}: {drift}")
+        if result["undeclared"]:
+            print(f"⚠️ Undeclared indexes on {collection_name}: {', '.join(result['undeclared'])}")
+
+def start_index_reconcile():
+    """Reconcile in the background so startup (and readiness) never waits on index builds"""
+    global _reconcile_task
+    _reconcile_task = asyncio.create_task(ensure_indexes())
+    return _reconcile_task
+
+async def stop_index_reconcile():
+    if _reconcile_task is not None and not _reconcile_task.done():
+        _reconcile_task.cancel()
+        try:
+            await _reconcile_task
+        except asyncio.CancelledError:
+            pass
\ No newline at end of file
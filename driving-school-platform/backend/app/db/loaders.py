@@ -0,0 +1,80 @@
+"""Request-scoped batching loaders that replace per-row find_one calls.
+
+Keys requested within the same event-loop tick are resolved with a single
+``$in`` query and memoized for the rest of the request.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from app.db.mongo import get_database
+from app.db.repositories import CONTACT, PUBLIC_SCHOOL_CARD, to_object_id
+
+class DataLoader:
+    def __init__(self, batch_load: Callable[[List[Any]], Any], key_fn: Optional[Callable[[Any], Any]] = None):
+        # batch_load(keys) -> awaitable dict of key -> value (missing keys resolve to None)
+        self._batch_load = batch_load
+        self._key_fn = key_fn
+        self._cache: Dict[Any, asyncio.Future] = {}
+        self._queue: List[Any] = []
+        self._tasks = set()
+        self.batches = 0
+
+    def load(self, key) -> asyncio.Future:
+        if self._key_fn is not None:
+            key = self._key_fn(key)
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        if not self._queue:
+            loop.call_soon(self._schedule_dispatch)
+        self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable) -> List[Optional[Any]]:
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def _schedule_dispatch(self):
+        # Keep a reference so the batch task isn't garbage collected mid-flight
+        task = asyncio.ensure_future(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        self.batches += 1
+        try:
+            results = await self._batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                if not self._cache[key].done():
+                    self._cache[key].set_exception(e)
+            return
+
+        for key in keys:
+            if not self._cache[key].done():
+                self._cache[key].set_result(results.get(key))
+
+def _collection_loader(collection: str, projection: dict) -> DataLoader:
+    async def batch_load(keys):
+        db = get_database()
+        documents = {}
+        async for document in db[collection].find({"_id": {"$in": keys}}, projection):
+            documents[document["_id"]] = document
+        return documents
+
+    # Ids are stored both as ObjectId and as str across collections; normalise them
+    return DataLoader(batch_load, key_fn=to_object_id)
+
+class Loaders:
+    """Loaders for one request; create one per request via get_loaders"""
+
+    def __init__(self):
+        self.students = _collection_loader("students", CONTACT)
+        self.instructors = _collection_loader("instructors", CONTACT)
+        self.schools = _collection_loader("schools", PUBLIC_SCHOOL_CARD)
+
+async def get_loaders() -> Loaders:
+    return Loaders()
\ No newline at end of file
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Callable, List
+from pymongo import UpdateOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+from app.services.retention import archive_of
+
+# Distinct participants of the archived chat history, per layout
+MESSAGE_PARTICIPANTS = [
+    {"$group": {"_id": {"sender": "$sender_email", "receiver": "$receiver_email"}}}
+]
+BUCKET_PARTICIPANTS = [
+    {"$project": {"message": {"$first": "$messages"}}},
+    {"$group": {"_id": {"sender": "$message.sender_email", "receiver": "$message.receiver_email"}}}
+]
+
+def _counter_flag(email: str) -> List[UpdateOne]:
+    return [UpdateOne({"_id": email}, {"$set": {"archived": True}}, upsert=True)]
+
+def _conversation_flags(participants: dict) -> List[UpdateOne]:
+    sender, receiver = participants["sender"], participants["receiver"]
+    return [
+        UpdateOne({"owner_email": owner, "other_email": other}, {"$set": {"history_archived": True}})
+        for owner, other in ((sender, receiver), (receiver, sender))
+    ]
+
+async def _flag(source: str, pipeline: list, target: str, updates: Callable[[object], List[UpdateOne]], batch_size: int) -> int:
+    db = get_database()
+    total = 0
+    batch = []
+    async for owner in db[archive_of(source)].aggregate(pipeline, allowDiskUse=True):
+        if owner["_id"] is None:
+            continue
+        batch.extend(updates(owner["_id"]))
+        if len(batch) >= batch_size:
+            await db[target].bulk_write(batch, ordered=False)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        await db[target].bulk_write(batch, ordered=False)
+        total += len(batch)
+    return total
+
+async def backfill_archive_flags(batch_size: int = 1000):
+    """Flag the owners of documents archived before the Archiver flagged them.
+
+    Reads skip the archive for users and conversations without the flag, so
+    run this once after upgrading if the Archiver has already moved anything.
+    Flags are only ever set, so the job can be re-run safely.
+    """
+    total = await _flag(
+        "notifications", [{"$group": {"_id": "$user_email"}}], "notification_counters", _counter_flag, batch_size
+    )
+    total += await _flag("messages", MESSAGE_PARTICIPANTS, "conversations", _conversation_flags, batch_size)
+    total += await _flag("message_buckets", BUCKET_PARTICIPANTS, "conversations", _conversation_flags, batch_size)
+
+    print(f"Flagged {total} archive owners")
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await backfill_archive_flags()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,47 @@
+import asyncio
+from pymongo import UpdateOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_collection_indexes
+from app.services.chat_service import conversation_key
+
+async def backfill_conversation_keys(batch_size: int = 1000):
+    """Stamp conversation_key on messages written before it existed.
+
+    Only messages still missing the key are visited, in _id order and in bulk
+    batches, so the job can be re-run safely.
+    """
+    db = get_database()
+    await ensure_collection_indexes("messages")
+
+    projection = {"sender_email": 1, "receiver_email": 1}
+    total = 0
+    batch = []
+    async for message in db.messages.find({"conversation_key": {"$exists": False}}, projection).sort("_id", 1).batch_size(batch_size):
+        batch.append(UpdateOne(
+            {"_id": message["_id"]},
+            {"$set": {"conversation_key": conversation_key(
+                message.get("sender_email", ""),
+                message.get("receiver_email", "")
+            )}}
+        ))
+        if len(batch) >= batch_size:
+            await db.messages.bulk_write(batch, ordered=False)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        await db.messages.bulk_write(batch, ordered=False)
+        total += len(batch)
+
+    print(f"Backfilled conversation keys on {total} messages")
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await backfill_conversation_keys()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
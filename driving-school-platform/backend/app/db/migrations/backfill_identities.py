@@ -0,0 +1,59 @@
+import asyncio
+from pymongo import UpdateOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_collection_indexes
+from app.services.identity_service import USER_COLLECTIONS
+from datetime import datetime
+
+async def backfill_identities(batch_size: int = 500):
+    """Build the identities collection from existing students and instructors.
+
+    Users are streamed in _id order and upserted in bulk batches, so the job can
+    be re-run safely and never holds a whole collection in memory.
+    """
+    db = get_database()
+    await ensure_collection_indexes("identities")
+
+    projection = {"email": 1, "password_hash": 1}
+    total = 0
+    for user_type, collection in USER_COLLECTIONS.items():
+        batch = []
+        async for user in db[collection].find({}, projection).sort("_id", 1).batch_size(batch_size):
+            if not user.get("email"):
+                continue
+            batch.append(UpdateOne(
+                {"email": user["email"]},
+                {
+                    "$set": {
+                        "user_type": user_type,
+                        "user_id": user["_id"],
+                        "password_hash": user.get("password_hash"),
+                        "updated_at": datetime.utcnow()
+                    },
+                    "$setOnInsert": {"created_at": datetime.utcnow()}
+                },
+                upsert=True
+            ))
+            if len(batch) >= batch_size:
+                await db.identities.bulk_write(batch, ordered=False)
+                total += len(batch)
+                batch = []
+
+        if batch:
+            await db.identities.bulk_write(batch, ordered=False)
+            total += len(batch)
+
+        print(f"Backfilled identities from {collection}")
+
+    print(f"Backfilled {total} identities")
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await backfill_identities()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,50 @@
+import asyncio
+from pymongo import UpdateOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_collection_indexes
+from app.services.retention import expires_at, expiring_types
+
+async def backfill_notification_expiry(batch_size: int = 1000):
+    """Stamp expires_at on notifications of the expiring types stored before it existed.
+
+    Only notifications still missing it are visited, in _id order and in bulk
+    batches, so the job can be re-run safely (e.g. after adding a type to
+    NOTIFICATION_EXPIRING_TYPES). Read ones past their expiry are then removed
+    by the TTL monitor.
+    """
+    db = get_database()
+    await ensure_collection_indexes("notifications")
+
+    query = {
+        "type": {"$in": sorted(expiring_types())},
+        "expires_at": {"$exists": False},
+        "created_at": {"$ne": None}
+    }
+    total = 0
+    batch = []
+    async for notification in db.notifications.find(query, {"type": 1, "created_at": 1}).sort("_id", 1).batch_size(batch_size):
+        batch.append(UpdateOne(
+            {"_id": notification["_id"]},
+            {"$set": {"expires_at": expires_at(notification["type"], notification["created_at"])}}
+        ))
+        if len(batch) >= batch_size:
+            await db.notifications.bulk_write(batch, ordered=False)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        await db.notifications.bulk_write(batch, ordered=False)
+        total += len(batch)
+
+    print(f"Backfilled expiry on {total} notifications")
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await backfill_notification_expiry()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,46 @@
+import asyncio
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+
+async def backfill_student_school_ids(batch_size: int = 1000):
+    """Convert students' string school_id to the school document's ObjectId.
+
+    Booking approvals used to copy the id as the request sent it, so students
+    approved that way hold a string while lessons and school requests hold
+    ObjectIds. Only string values are visited, so the job can be re-run;
+    strings that are not valid ids are reported and left alone.
+    """
+    db = get_database()
+    total = 0
+    invalid = 0
+    batch = []
+    async for student in db.students.find({"school_id": {"$type": "string"}}, {"school_id": 1}).batch_size(batch_size):
+        if not ObjectId.is_valid(student["school_id"]):
+            invalid += 1
+            continue
+        batch.append(UpdateOne(
+            {"_id": student["_id"], "school_id": student["school_id"]},
+            {"$set": {"school_id": ObjectId(student["school_id"])}}
+        ))
+        if len(batch) >= batch_size:
+            await db.students.bulk_write(batch, ordered=False)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        await db.students.bulk_write(batch, ordered=False)
+        total += len(batch)
+
+    print(f"Converted school_id on {total} students" + (f", {invalid} left with invalid ids" if invalid else ""))
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await backfill_student_school_ids()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,72 @@
+import asyncio
+from typing import List
+from pymongo import ASCENDING
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_collection_indexes
+from app.db.migrations.backfill_conversation_keys import backfill_conversation_keys
+from app.services.message_buckets import build_buckets
+
+async def _write_buckets(keys: List[str], buckets: List[dict]):
+    db = get_database()
+    # Replace the conversations wholesale so the job can be re-run
+    await db.message_buckets.delete_many({"conversation_key": {"$in": keys}})
+    if buckets:
+        await db.message_buckets.insert_many(buckets, ordered=False)
+
+async def bucket_messages(batch_size: int = 1000):
+    """Copy messages into message_buckets for CHAT_STORAGE_MODE=buckets.
+
+    Messages are streamed in (conversation_key, created_at, _id) order and
+    packed per conversation with the configured bucket limits. Conversations
+    already present in message_buckets are rebuilt from messages; the
+    messages collection is left in place, so switching back is a config change.
+    Run it before switching the mode, while sends still go to messages.
+    """
+    db = get_database()
+    await backfill_conversation_keys()
+    await ensure_collection_indexes("message_buckets")
+
+    cursor = db.messages.find({}).sort([
+        ("conversation_key", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)
+    ]).batch_size(batch_size)
+
+    total_messages = 0
+    total_buckets = 0
+    keys: List[str] = []
+    buckets: List[dict] = []
+    conversation: List[dict] = []
+
+    def close_conversation():
+        nonlocal total_buckets
+        packed = build_buckets(conversation)
+        keys.append(conversation[0]["conversation_key"])
+        buckets.extend(packed)
+        total_buckets += len(packed)
+
+    async for message in cursor:
+        if conversation and message["conversation_key"] != conversation[0]["conversation_key"]:
+            close_conversation()
+            conversation = []
+            if sum(bucket["count"] for bucket in buckets) >= batch_size:
+                await _write_buckets(keys, buckets)
+                keys, buckets = [], []
+        conversation.append(message)
+        total_messages += 1
+
+    if conversation:
+        close_conversation()
+    if keys:
+        await _write_buckets(keys, buckets)
+
+    print(f"Packed {total_messages} messages into {total_buckets} buckets")
+    return total_buckets
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await bucket_messages()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,130 @@
+import asyncio
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, ReplaceOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+from app.db.indexes import ensure_collection_indexes
+from app.db.migrations.backfill_conversation_keys import backfill_conversation_keys
+from app.services.chat_service import ReadPosition, read_position
+from app.services import message_buckets
+
+class _ConversationState:
+    """Running totals for one conversation while its messages stream past"""
+
+    def __init__(self, watermarks: Dict[str, ReadPosition], archived: bool = False):
+        self.watermarks = watermarks
+        self.archived = archived
+        self.unread: Dict[str, int] = {}
+        self.last: Optional[dict] = None
+
+    def add(self, message: dict):
+        receiver = message["receiver_email"]
+        position = (message["created_at"], message["_id"])
+        if message.get("read"):
+            # Legacy read flag: everything the receiver got up to here is read
+            if receiver not in self.watermarks or position > self.watermarks[receiver]:
+                self.watermarks[receiver] = position
+            self.unread[receiver] = 0
+        elif receiver not in self.watermarks or position > self.watermarks[receiver]:
+            self.unread[receiver] = self.unread.get(receiver, 0) + 1
+        self.last = message
+
+    def documents(self) -> List[ReplaceOne]:
+        last = self.last
+        documents = []
+        participants = (last["sender_email"], last["receiver_email"])
+        for owner, other in (participants, participants[::-1]):
+            document = {
+                "owner_email": owner,
+                "other_email": other,
+                "conversation_key": last["conversation_key"],
+                "last_message": last.get("message", ""),
+                "last_message_type": last.get("message_type", "text"),
+                "last_message_id": last["_id"],
+                "last_message_at": last.get("created_at"),
+                "last_sender_email": last["sender_email"],
+                "unread_count": self.unread.get(owner, 0)
+            }
+            if owner in self.watermarks:
+                document["last_read_at"], document["last_read_message_id"] = self.watermarks[owner]
+            if self.archived:
+                document["history_archived"] = True
+            documents.append(ReplaceOne({"owner_email": owner, "other_email": other}, document, upsert=True))
+        return documents
+
+async def _existing_state(message: dict) -> _ConversationState:
+    """Fresh totals keeping the conversation's read watermarks and archive flag"""
+    db = get_database()
+    sender, receiver = message["sender_email"], message["receiver_email"]
+    conversations = await db.conversations.find(
+        {"$or": [
+            {"owner_email": sender, "other_email": receiver},
+            {"owner_email": receiver, "other_email": sender}
+        ]},
+        {"owner_email": 1, "last_read_at": 1, "last_read_message_id": 1, "history_archived": 1}
+    ).to_list(2)
+    watermarks = {
+        conversation["owner_email"]: read_position(conversation)
+        for conversation in conversations
+        if read_position(conversation) is not None
+    }
+    return _ConversationState(watermarks, any(conversation.get("history_archived") for conversation in conversations))
+
+async def rebuild_conversations(batch_size: int = 500):
+    """Reconstruct the conversations collection from messages.
+
+    Messages are streamed in (conversation_key, created_at, _id) order off the
+    history index, so only one conversation is held in memory at a time and the
+    last message seen for a key is its newest. Existing read watermarks are
+    kept (and advanced past legacy ``read`` flags), as is the archive flag;
+    unread counts are recounted from them. In bucket mode the buckets are unwound in the same order.
+    Archived history is not read: conversations with nothing left in the hot
+    collection keep their document, and unread counts only cover hot messages.
+    """
+    db = get_database()
+    await backfill_conversation_keys()
+    await ensure_collection_indexes("conversations")
+
+    projection = {
+        "conversation_key": 1, "sender_email": 1, "receiver_email": 1,
+        "message": 1, "message_type": 1, "read": 1, "created_at": 1
+    }
+    if message_buckets.buckets_enabled():
+        cursor = message_buckets.iter_messages(batch_size)
+    else:
+        cursor = db.messages.find({}, projection).sort([
+            ("conversation_key", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)
+        ]).batch_size(batch_size)
+
+    total = 0
+    batch = []
+    state = None
+    async for message in cursor:
+        if state is None or message["conversation_key"] != state.last["conversation_key"]:
+            if state is not None:
+                batch.extend(state.documents())
+            state = await _existing_state(message)
+        state.add(message)
+
+        if len(batch) >= batch_size:
+            await db.conversations.bulk_write(batch, ordered=False)
+            total += len(batch)
+            batch = []
+
+    if state is not None:
+        batch.extend(state.documents())
+    if batch:
+        await db.conversations.bulk_write(batch, ordered=False)
+        total += len(batch)
+
+    print(f"Rebuilt {total} conversation documents")
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await rebuild_conversations()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,46 @@
+import asyncio
+from pymongo import UpdateOne
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+
+async def rebuild_notification_counters(batch_size: int = 1000):
+    """Recount every user's unread notifications into notification_counters.
+
+    Run once to seed the counters for notifications stored before they
+    existed, and again if a counter ever drifts (e.g. a dispatcher crashed
+    between storing a batch and counting it). Counters of users with nothing
+    unread are reset to zero; the Archiver's ``archived`` flags are kept.
+    """
+    db = get_database()
+    cursor = db.notifications.aggregate([
+        {"$match": {"read": False, "user_email": {"$exists": True}}},
+        {"$group": {"_id": "$user_email", "unread": {"$sum": 1}}}
+    ])
+
+    total = 0
+    emails = []
+    batch = []
+    async for counter in cursor:
+        emails.append(counter["_id"])
+        batch.append(UpdateOne({"_id": counter["_id"]}, {"$set": {"unread": counter["unread"]}}, upsert=True))
+        if len(batch) >= batch_size:
+            await db.notification_counters.bulk_write(batch, ordered=False)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        await db.notification_counters.bulk_write(batch, ordered=False)
+        total += len(batch)
+    await db.notification_counters.update_many({"_id": {"$nin": emails}}, {"$set": {"unread": 0}})
+
+    print(f"Rebuilt {total} notification counters")
+    return total
+
+async def main():
+    await connect_to_mongo()
+    try:
+        await rebuild_notification_counters()
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
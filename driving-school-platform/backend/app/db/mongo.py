@@ -1,5 +1,7 @@
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.db.monitoring import command_metrics_listener, pool_metrics_listener
 
 class MongoDB:
     client: AsyncIOMotorClient = None
@@ -7,12 +9,41 @@ class MongoDB:
 
 mongodb = MongoDB()
 
+def client_options() -> dict:
+    """Pool, timeout and compression options for the Motor client, from Settings"""
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "event_listeners": [command_metrics_listener, pool_metrics_listener]
+    }
+    if settings.mongo_max_idle_time_ms is not None:
+        options["maxIdleTimeMS"] = settings.mongo_max_idle_time_ms
+    if settings.mongo_wait_queue_timeout_ms is not None:
+        options["waitQueueTimeoutMS"] = settings.mongo_wait_queue_timeout_ms
+    if settings.mongo_socket_timeout_ms is not None:
+        options["socketTimeoutMS"] = settings.mongo_socket_timeout_ms
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+    return options
+
+async def warm_connection_pool():
+    """Open minPoolSize connections up front by running that many concurrent pings"""
+    if settings.mongo_min_pool_size <= 0:
+        return
+    await asyncio.gather(*[
+        mongodb.client.admin.command('ping')
+        for _ in range(settings.mongo_min_pool_size)
+    ])
+
 async def connect_to_mongo():
     try:
-        mongodb.client = AsyncIOMotorClient(settings.mongodb_url)
+        mongodb.client = AsyncIOMotorClient(settings.mongodb_url, **client_options())
         mongodb.database = mongodb.client[settings.database_name]
         # Test connection
         await mongodb.client.admin.command('ping')
+        await warm_connection_pool()
         print("✅ Connected to MongoDB successfully!")
     except Exception as e:
         print(f"❌ MongoDB connection failed: {e}")
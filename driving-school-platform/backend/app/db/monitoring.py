@@ -0,0 +1,152 @@
+import contextvars
+import threading
+import time
+import bson
+from pymongo import monitoring
+from app.core.config import settings
+from app.core.query_budget import count_command
+from app.core.metrics import (
+    current_route,
+    mongo_command_duration,
+    mongo_documents_returned,
+    mongo_reply_bytes,
+    mongo_command_failures,
+    mongo_pool_checkout_wait,
+    mongo_pool_checkout_failures,
+    mongo_pool_in_use,
+    mongo_pool_waiting,
+    mongo_pool_open
+)
+
+# Commands whose reply is not tied to a user collection
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+# Set by the query-plan check to a list collecting (command_name, command) for the calls it makes
+captured_commands: contextvars.ContextVar = contextvars.ContextVar("captured_commands", default=None)
+
+def _collection_name(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+def _documents_in_reply(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Attributes every driver command to the FastAPI route that issued it.
+
+    Motor runs commands on executor threads with the request's context copied,
+    so the route is read from the request contextvar at command start.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        count_command(event.command_name)
+        captured = captured_commands.get()
+        if captured is not None:
+            captured.append((event.command_name, event.command))
+        key = (event.connection_id, event.request_id)
+        labels = {
+            "route": current_route(),
+            "collection": _collection_name(event.command_name, event.command),
+            "command": event.command_name
+        }
+        with self._lock:
+            self._pending[key] = labels
+
+    def _pop(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        labels = self._pop(event)
+        if labels is None:
+            return
+        mongo_command_duration.observe(event.duration_micros / 1e6, **labels)
+        mongo_documents_returned.inc(_documents_in_reply(event.reply), **labels)
+        if settings.mongo_metrics_reply_bytes:
+            # Re-encodes the reply, so it is opt-in for measuring projection wins
+            mongo_reply_bytes.inc(len(bson.encode(event.reply)), **labels)
+
+    def failed(self, event):
+        labels = self._pop(event)
+        if labels is None:
+            return
+        mongo_command_duration.observe(event.duration_micros / 1e6, **labels)
+        mongo_command_failures.inc(**labels)
+
+command_metrics_listener = CommandMetricsListener()
+
+def _address(address) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Exports pool saturation: checkout wait time, waiters, in-use and open connections.
+
+    Checkout start and completion are reported on the same thread, so the start
+    time is kept in a thread-local.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        address = _address(event.address)
+        mongo_pool_in_use.set(0, address=address)
+        mongo_pool_waiting.set(0, address=address)
+        mongo_pool_open.set(0, address=address)
+
+    def connection_created(self, event):
+        mongo_pool_open.inc(address=_address(event.address))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_open.dec(address=_address(event.address))
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+        mongo_pool_waiting.inc(address=_address(event.address))
+
+    def _checkout_finished(self, address: str):
+        mongo_pool_waiting.dec(address=address)
+        started = getattr(self._local, "checkout_started", None)
+        if started is not None:
+            mongo_pool_checkout_wait.observe(time.perf_counter() - started, address=address)
+            self._local.checkout_started = None
+
+    def connection_checked_out(self, event):
+        address = _address(event.address)
+        self._checkout_finished(address)
+        mongo_pool_in_use.inc(address=address)
+
+    def connection_check_out_failed(self, event):
+        address = _address(event.address)
+        self._checkout_finished(address)
+        mongo_pool_checkout_failures.inc(address=address, reason=str(event.reason))
+
+    def connection_checked_in(self, event):
+        mongo_pool_in_use.dec(address=_address(event.address))
+
+pool_metrics_listener = PoolMetricsListener()
\ No newline at end of file
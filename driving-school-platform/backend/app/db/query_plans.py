@@ -0,0 +1,481 @@
+"""Query-plan regression check for the queries the routes and services issue.
+
+Seeds a throwaway database with synthetic data shaped like the app's own
+writes and applies the index registry. Each shape in ``QUERY_SHAPES`` then
+calls a route handler or service the way a request (or background worker)
+would; the commands it sends are recorded from the driver's command events
+and ``explain`` is run on every query among them. A query fails if its
+winning plan contains a COLLSCAN or an in-memory SORT, or if it examines more
+than ``max_examined_ratio`` documents per returned (or matched) document.
+
+Because the filters come from the calls themselves, a route that changes its
+query is checked as it now is, without updating this module.
+
+Run it with ``python -m tools.check_plans`` (``make check-plans``).
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterator, List, Tuple
+from bson import ObjectId
+from fastapi import Response
+from fastapi.security import OAuth2PasswordRequestForm
+from app.api.v1.routes import auth as auth_routes
+from app.api.v1.routes import available_schools as available_school_routes
+from app.api.v1.routes import booking as booking_routes
+from app.api.v1.routes import chat as chat_routes
+from app.api.v1.routes import instructor_actions as instructor_action_routes
+from app.api.v1.routes import instructors as instructor_routes
+from app.api.v1.routes import lessons as lesson_routes
+from app.api.v1.routes import notifications as notification_routes
+from app.api.v1.routes import progress as progress_routes
+from app.api.v1.routes import ratings as ratings_routes
+from app.api.v1.routes import scheduling as scheduling_routes
+from app.api.v1.routes import schools as school_routes
+from app.api.v1.routes import students as student_routes
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.db.indexes import ensure_indexes, index_status
+from app.db.loaders import Loaders
+from app.db.migrations.bucket_messages import bucket_messages
+from app.db.migrations.rebuild_notification_counters import rebuild_notification_counters
+from app.db.migrations.rebuild_conversations import rebuild_conversations
+from app.db.monitoring import captured_commands
+from app.db.mongo import get_database
+from app.services.chat_service import DEFAULT_HISTORY_PAGE, conversation_key
+from app.services.identity_service import IdentityService
+from app.services.notification_outbox import NotificationDispatcher
+from app.services.retention import Archiver
+from app.services.user_events import UserEvents
+from app.utils.pagination import NEXT_CURSOR_HEADER, PageParams
+
+# Commands explain accepts; inserts and cursor continuations have no plan to check
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Session, transaction and routing fields the driver adds, which explain rejects
+SESSION_FIELDS = {
+    "lsid", "txnNumber", "autocommit", "startTransaction", "$clusterTime", "$db",
+    "$readPreference", "readConcern", "writeConcern"
+}
+
+SEED_PASSWORD = "check-plans"
+
+# Below the seeded per-user counts, so listings reach a second (keyset) page
+CHECK_PAGE_SIZE = 10
+
+@dataclass
+class QueryShape:
+    name: str  # route or service whose queries are checked
+    run: Callable[[dict], Awaitable]  # calls it with the seeded fixture, as a request would
+
+async def _two_pages(list_page: Callable[[Response, PageParams], Awaitable]):
+    """A listing's first page and the one after it, following X-Next-Cursor like a client"""
+    response = Response()
+    await list_page(response, PageParams(cursor=None, limit=CHECK_PAGE_SIZE))
+    cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    if cursor:
+        await list_page(Response(), PageParams(cursor=cursor, limit=CHECK_PAGE_SIZE))
+
+async def _in_bucket_mode(call: Callable[[], Awaitable]):
+    mode = settings.chat_storage_mode
+    settings.chat_storage_mode = "buckets"
+    try:
+        return await call()
+    finally:
+        settings.chat_storage_mode = mode
+
+def _chat_messages(c: dict, before=None):
+    return chat_routes.get_messages(
+        c["instructor_email"],
+        before=str(before) if before else None,
+        after=None,
+        limit=DEFAULT_HISTORY_PAGE,
+        current_user=c["student"]
+    )
+
+# Writes come after the reads of the same data; the Archiver moves documents, so it runs last
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("auth.login", lambda c: auth_routes.login(
+        OAuth2PasswordRequestForm(username=c["student_email"], password=SEED_PASSWORD)
+    )),
+    QueryShape("identity_service.find_legacy_user", lambda c: IdentityService.find_legacy_user(c["instructor_email"])),
+    QueryShape("lessons.get_upcoming_lessons[student]", lambda c: lesson_routes.get_upcoming_lessons(c["student"], Loaders())),
+    QueryShape("lessons.get_upcoming_lessons[instructor]", lambda c: lesson_routes.get_upcoming_lessons(c["instructor"], Loaders())),
+    QueryShape("lessons.get_my_lessons[student]", lambda c: _two_pages(
+        lambda response, page: lesson_routes.get_my_lessons(response, page, c["student"])
+    )),
+    QueryShape("lessons.get_my_lessons[instructor]", lambda c: _two_pages(
+        lambda response, page: lesson_routes.get_my_lessons(response, page, c["instructor"])
+    )),
+    QueryShape("instructor_actions.get_pending_lessons", lambda c: instructor_action_routes.get_pending_lessons(
+        c["instructor"], Loaders()
+    )),
+    QueryShape("scheduling.get_available_slots", lambda c: scheduling_routes.get_available_slots(
+        str(c["instructor"]["user_id"]), c["now"].strftime("%Y-%m-%d"), c["student"]
+    )),
+    QueryShape("progress.get_my_progress", lambda c: progress_routes.get_my_progress(c["student"])),
+    QueryShape("booking.get_my_booking_requests[student]", lambda c: _two_pages(
+        lambda response, page: booking_routes.get_my_booking_requests(response, page, c["student"])
+    )),
+    QueryShape("booking.get_my_booking_requests[instructor]", lambda c: _two_pages(
+        lambda response, page: booking_routes.get_my_booking_requests(response, page, c["instructor"])
+    )),
+    QueryShape("schools.get_schools", lambda c: _two_pages(school_routes.get_schools)),
+    QueryShape("available_schools.get_available_schools", lambda c: available_school_routes.get_available_schools()),
+    QueryShape("students.get_all_students", lambda c: _two_pages(
+        lambda response, page: student_routes.get_all_students(response, page, c["instructor"])
+    )),
+    QueryShape("instructors.get_all_instructors", lambda c: _two_pages(instructor_routes.get_all_instructors)),
+    QueryShape("schools.get_school_requests", lambda c: school_routes.get_school_requests(
+        str(c["school_id"]), c["instructor"], Loaders()
+    )),
+    QueryShape("schools.join_school", lambda c: school_routes.join_school(str(c["join_school_id"]), c["student"])),
+    QueryShape("ratings.get_instructor_ratings", lambda c: _two_pages(
+        lambda response, page: ratings_routes.get_instructor_ratings(str(c["instructor"]["user_id"]), response, page, Loaders())
+    )),
+    QueryShape("notifications.get_notifications", lambda c: _two_pages(
+        lambda response, page: notification_routes.get_notifications(response, page, c["student"])
+    )),
+    QueryShape("notifications.get_unread_count", lambda c: notification_routes.get_unread_count(c["student"])),
+    QueryShape("notifications.mark_all_notifications_read[up_to]", lambda c: notification_routes.mark_all_notifications_read(
+        str(c["notification_id"]), c["student"]
+    )),
+    QueryShape("notifications.mark_all_notifications_read", lambda c: notification_routes.mark_all_notifications_read(
+        None, c["student"]
+    )),
+    QueryShape("chat.get_conversations", lambda c: _two_pages(
+        lambda response, page: chat_routes.get_conversations(response, page, c["student"])
+    )),
+    QueryShape("chat.get_messages[before]", lambda c: _chat_messages(c, before=c["message_id"])),
+    QueryShape("chat.get_messages", lambda c: _chat_messages(c)),
+    QueryShape("chat.get_messages[buckets, before]", lambda c: _in_bucket_mode(lambda: _chat_messages(c, before=c["message_id"]))),
+    QueryShape("chat.get_messages[buckets]", lambda c: _in_bucket_mode(lambda: _chat_messages(c))),
+    QueryShape("user_events.replay", lambda c: UserEvents.replay(c["student_email"], c["event_seq"])),
+    QueryShape("notification_dispatcher.claim", lambda c: NotificationDispatcher().claim()),
+    QueryShape("archiver.run_once", lambda c: Archiver().run_once()),
+    QueryShape("archiver.run_once[buckets]", lambda c: _in_bucket_mode(Archiver().run_once)),
+]
+
+def _id_at(when: datetime) -> ObjectId:
+    """A unique _id as if the document had been inserted at ``when``"""
+    return ObjectId(ObjectId.from_datetime(when).binary[:4] + ObjectId().binary[4:])
+
+def _principal(user: dict, user_type: str, school_id=None) -> dict:
+    # As get_current_principal builds it from token claims
+    return {
+        "email": user["email"],
+        "user_type": user_type,
+        "user_id": user["_id"],
+        "school_id": str(school_id) if school_id else None,
+        "school_status": "approved" if school_id else None
+    }
+
+async def seed_synthetic_data(users: int = 200, per_user: int = 20) -> dict:
+    """Fill the database with ``users`` students/instructors and related documents.
+
+    Ids are typed as the app writes them: lessons booked through
+    ``lessons.create_lesson`` hold ObjectIds, those requested through
+    ``booking.request_lesson_booking`` (and their bookings) hold strings.
+    """
+    db = get_database()
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    password_hash = get_password_hash(SEED_PASSWORD)
+
+    def person(i: int, role: str) -> dict:
+        return {
+            "_id": ObjectId(),
+            "email": f"{role}{i}@example.com",
+            "first_name": role.title(),
+            "last_name": str(i),
+            "phone": "",
+            "created_at": now
+        }
+
+    students = [person(i, "student") for i in range(users)]
+    instructors = [person(i, "instructor") for i in range(users)]
+    schools = [
+        {
+            "_id": ObjectId(),
+            "name": f"School {i}",
+            "status": rng.choice(["active", "pending"]),
+            "instructor_ids": [],
+            "created_at": now
+        }
+        for i in range(max(users // 10, 2))
+    ]
+    for instructor in instructors:
+        rng.choice(schools)["instructor_ids"].append(str(instructor["_id"]))
+
+    lessons, bookings, notifications, messages, ratings, requests = [], [], [], [], [], []
+    partners = {}
+    for student in students:
+        for _ in range(per_user):
+            instructor = rng.choice(instructors)
+            partners.setdefault(student["_id"], instructor)
+            created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            scheduled_date = now + timedelta(hours=rng.randint(-24 * 180, 24 * 180))
+            lesson = {
+                "_id": ObjectId(),
+                "lesson_type": "driving",
+                "scheduled_date": scheduled_date,
+                "duration_minutes": 60,
+                "created_at": created_at,
+                "updated_at": created_at
+            }
+            if rng.random() < 0.25:
+                lesson.update({
+                    "student_id": str(student["_id"]),
+                    "instructor_id": str(instructor["_id"]),
+                    "school_id": rng.choice(schools)["_id"],
+                    "status": "pending"
+                })
+                bookings.append({
+                    "_id": ObjectId(),
+                    "booking_type": "lesson",
+                    "student_id": str(student["_id"]),
+                    "instructor_id": str(instructor["_id"]),
+                    "lesson_id": str(lesson["_id"]),
+                    "preferred_date": scheduled_date,
+                    "status": "pending_instructor",
+                    "requested_at": created_at,
+                    "created_at": created_at,
+                    "updated_at": created_at
+                })
+            else:
+                lesson.update({
+                    "student_id": student["_id"],
+                    "instructor_id": instructor["_id"],
+                    "status": rng.choice(["scheduled", "confirmed", "completed", "cancelled"])
+                })
+            lessons.append(lesson)
+            notifications.append({
+                "_id": _id_at(created_at),
+                "title": "Lesson Booked",
+                "message": "Your lesson is scheduled",
+                "type": "lesson_booked",
+                "user_email": student["email"],
+                "read": rng.random() < 0.8,
+                "created_at": created_at
+            })
+            sender, receiver = rng.sample([student["email"], instructor["email"]], 2)
+            messages.append({
+                "_id": _id_at(created_at),
+                "conversation_key": conversation_key(sender, receiver),
+                "sender_email": sender,
+                "receiver_email": receiver,
+                "message": "hi",
+                "message_type": "text",
+                "created_at": created_at
+            })
+            ratings.append({
+                "student_id": student["_id"],
+                "instructor_id": instructor["_id"],
+                "rating": 5,
+                "comment": "",
+                "lesson_id": lesson["_id"],
+                "created_at": created_at
+            })
+        requests.append({
+            "student_id": student["_id"],
+            "school_id": rng.choice(schools)["_id"],
+            "status": rng.choice(["pending", "approved"]),
+            "student_name": f"{student['first_name']} {student['last_name']}",
+            "student_email": student["email"],
+            "student_phone": "",
+            "created_at": now,
+            "updated_at": now
+        })
+
+    student = students[0]
+    instructor = partners[student["_id"]]
+    request = requests[0]
+    request["status"] = "pending"
+    # The instructor reviews the student's join request at their own school
+    school = next(s for s in schools if s["_id"] == request["school_id"])
+    if str(instructor["_id"]) not in school["instructor_ids"]:
+        school["instructor_ids"].append(str(instructor["_id"]))
+    join_school = next(s for s in schools if s["_id"] != request["school_id"])
+
+    # One conversation that ran for months, so its history spans many buckets
+    long_conversation = []
+    for day in range(120):
+        created_at = now - timedelta(days=day, minutes=rng.randint(0, 600))
+        sender, receiver = rng.sample([student["email"], instructor["email"]], 2)
+        long_conversation.append({
+            "_id": _id_at(created_at),
+            "conversation_key": conversation_key(sender, receiver),
+            "sender_email": sender,
+            "receiver_email": receiver,
+            "message": "hi",
+            "message_type": "text",
+            "created_at": created_at
+        })
+    messages.extend(long_conversation)
+
+    await db.students.insert_many(students)
+    await db.instructors.insert_many(instructors)
+    await db.identities.insert_many(
+        [
+            {
+                "email": user["email"],
+                "user_type": user_type,
+                "user_id": user["_id"],
+                "password_hash": password_hash,
+                "created_at": now,
+                "updated_at": now
+            }
+            for user_type, group in (("student", students), ("instructor", instructors))
+            for user in group
+        ]
+    )
+    await db.schools.insert_many(schools)
+    await db.lessons.insert_many(lessons)
+    await db.bookings.insert_many(bookings)
+    await db.notifications.insert_many(notifications)
+    await rebuild_notification_counters()
+    await db.messages.insert_many(messages)
+    await rebuild_conversations()
+    await bucket_messages()
+    await db.ratings.insert_many(ratings)
+    await db.school_requests.insert_many(requests)
+
+    # Mostly dispatched events, as between two TTL sweeps, and one batch leased to a worker
+    outbox_lease = f"check-plans:{ObjectId()}"
+    outbox = []
+    for notification in notifications:
+        event = {
+            "notification": {key: notification[key] for key in ("title", "message", "type", "user_email")},
+            "status": rng.choices(["dispatched", "pending", "failed"], weights=[85, 10, 5])[0],
+            "attempts": 0,
+            "available_at": now + timedelta(seconds=rng.randint(-3600, 3600)),
+            "created_at": notification["created_at"]
+        }
+        if event["status"] == "pending" and rng.random() < 0.1:
+            event["lease"] = outbox_lease
+            event["leased_until"] = now + timedelta(seconds=settings.outbox_lease_seconds)
+        outbox.append(event)
+    await db.notification_outbox.insert_many(outbox)
+
+    await db.user_events.insert_many([
+        {"user_email": user["email"], "seq": seq, "type": "lesson", "data": {}, "created_at": now}
+        for user in students
+        for seq in range(1, per_user + 1)
+    ])
+
+    await db.progress.insert_many([
+        {"lesson_id": lesson["_id"], "notes": "", "performance_rating": 0, "created_at": now}
+        for lesson in lessons[::3]
+    ])
+
+    student_notifications = sorted(
+        (n for n in notifications if n["user_email"] == student["email"]),
+        key=lambda n: n["created_at"]
+    )
+
+    return {
+        "now": now,
+        "student": _principal(student, "student", request["school_id"]),
+        "student_email": student["email"],
+        "instructor": _principal(instructor, "instructor", request["school_id"]),
+        "instructor_email": instructor["email"],
+        "message_id": long_conversation[len(long_conversation) // 2]["_id"],
+        "school_id": request["school_id"],
+        "join_school_id": join_school["_id"],
+        "notification_id": student_notifications[len(student_notifications) // 2]["_id"],
+        "event_seq": per_user // 2
+    }
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            yield from _plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+def _sections(explain, key: str) -> Iterator[dict]:
+    """Every ``key`` section of an explain output; aggregations nest one per stage reading a collection"""
+    if isinstance(explain, dict):
+        if key in explain:
+            yield explain[key]
+        for value in explain.values():
+            yield from _sections(value, key)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from _sections(item, key)
+
+def _returned(stats: dict) -> int:
+    # Writes return nothing; count the documents they would change instead
+    stages = stats.get("executionStages", {})
+    return max(stats.get("nReturned", 0), stages.get("nMatched", 0), stages.get("nWouldDelete", 0))
+
+def explainable(command: dict) -> dict:
+    """The recorded command without driver-added fields, as explain takes it"""
+    command = {key: value for key, value in command.items() if key not in SESSION_FIELDS}
+    # explain takes a single statement; those of one bulk write share a shape
+    for field in ("updates", "deletes"):
+        if field in command:
+            command[field] = command[field][:1]
+    return command
+
+async def explain_command(command: dict, max_examined_ratio: float) -> List[str]:
+    """Return the reasons a command's winning plan is rejected (empty when it passes)"""
+    db = get_database()
+    explain = await db.command("explain", explainable(command), verbosity="executionStats")
+    stages = [stage for plan in _sections(explain, "winningPlan") for stage in _plan_stages(plan)]
+    examined = sum(stats.get("totalDocsExamined", 0) for stats in _sections(explain, "executionStats"))
+    returned = sum(_returned(stats) for stats in _sections(explain, "executionStats"))
+
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("COLLSCAN")
+    if "SORT" in stages:
+        problems.append("in-memory SORT")
+    if examined > max_examined_ratio * max(returned, 1):
+        problems.append(f"examined {examined} docs for {returned} returned")
+    return problems
+
+async def record_commands(shape: QueryShape, context: dict) -> List[Tuple[str, dict]]:
+    """Run a shape and return the (command_name, command) queries it sent"""
+    captured: List[Tuple[str, dict]] = []
+    token = captured_commands.set(captured)
+    try:
+        await shape.run(context)
+    finally:
+        captured_commands.reset(token)
+    return [(name, command) for name, command in captured if name in EXPLAINABLE_COMMANDS]
+
+async def check_query_plans(max_examined_ratio: float = 10.0, users: int = 200) -> bool:
+    await ensure_indexes()
+    failed = [name for name, status in index_status.items() if "error" in status]
+    if failed:
+        print(f"Index reconcile failed for: {', '.join(failed)}")
+        return False
+
+    context = await seed_synthetic_data(users=users)
+    ok = True
+    for shape in QUERY_SHAPES:
+        try:
+            commands = await record_commands(shape, context)
+        except Exception as e:
+            ok = False
+            print(f"FAIL {shape.name}: {e!r}")
+            continue
+        if not commands:
+            ok = False
+            print(f"FAIL {shape.name}: sent no queries")
+            continue
+
+        for name, command in commands:
+            label = f"{shape.name} ({command.get(name)} {name})"
+            try:
+                problems = await explain_command(command, max_examined_ratio)
+            except Exception as e:
+                problems = [f"explain failed: {e}"]
+            if problems:
+                ok = False
+                print(f"FAIL {label}: {'; '.join(problems)}")
+            else:
+                print(f"ok   {label}")
+    return ok
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""Read helpers that fetch only the fields a use case needs.
+
+Routes should go through these instead of loading whole student/instructor/
+school documents: those carry password hashes, unbounded id arrays and
+availability data that are expensive to ship and decode.
+"""
+from typing import Optional, Union
+from bson import ObjectId
+from bson.errors import InvalidId
+from app.db.mongo import get_database
+
+# Per-use-case projections
+ID_ONLY = {"_id": 1}
+DISPLAY_NAME = {"first_name": 1, "last_name": 1}
+CONTACT = {"first_name": 1, "last_name": 1, "email": 1, "phone": 1}
+STUDENT_PROFILE = {
+    "email": 1, "first_name": 1, "last_name": 1, "phone": 1, "date_of_birth": 1,
+    "emergency_contact": 1, "license_number": 1, "created_at": 1
+}
+INSTRUCTOR_PROFILE = {
+    "email": 1, "first_name": 1, "last_name": 1, "phone": 1, "license_number": 1,
+    "certification_date": 1, "hourly_rate": 1, "specializations": 1, "availability": 1,
+    "created_at": 1
+}
+INSTRUCTOR_PUBLIC_CARD = {
+    "email": 1, "first_name": 1, "last_name": 1, "phone": 1, "hourly_rate": 1,
+    "specializations": 1, "vehicle_types": 1, "experience_years": 1, "school_id": 1,
+    "average_rating": 1, "total_ratings": 1, "bio": 1, "photo_url": 1, "status": 1,
+    "created_at": 1
+}
+PUBLIC_SCHOOL_CARD = {
+    "name": 1, "address": 1, "phone": 1, "email": 1, "description": 1, "status": 1,
+    "services": 1, "lesson_types": 1, "pricing": 1, "operating_hours": 1,
+    "total_students": 1, "total_instructors": 1, "average_rating": 1, "rating": 1,
+    "established": 1
+}
+
+IdLike = Union[ObjectId, str]
+
+def to_object_id(value: IdLike) -> Optional[ObjectId]:
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+def display_name(user: Optional[dict]) -> str:
+    if not user:
+        return ""
+    return f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+
+class StudentRepository:
+    @staticmethod
+    async def get(student_id: IdLike, projection: dict = STUDENT_PROFILE) -> Optional[dict]:
+        db = get_database()
+        return await db.students.find_one({"_id": to_object_id(student_id)}, projection)
+
+    @staticmethod
+    async def get_display_name(student_id: IdLike) -> Optional[dict]:
+        return await StudentRepository.get(student_id, DISPLAY_NAME)
+
+    @staticmethod
+    async def get_contact(student_id: IdLike) -> Optional[dict]:
+        return await StudentRepository.get(student_id, CONTACT)
+
+    @staticmethod
+    def find_profiles(query: Optional[dict] = None):
+        db = get_database()
+        return db.students.find(query or {}, STUDENT_PROFILE)
+
+class InstructorRepository:
+    @staticmethod
+    async def get(instructor_id: IdLike, projection: dict = INSTRUCTOR_PROFILE) -> Optional[dict]:
+        db = get_database()
+        return await db.instructors.find_one({"_id": to_object_id(instructor_id)}, projection)
+
+    @staticmethod
+    async def get_display_name(instructor_id: IdLike) -> Optional[dict]:
+        return await InstructorRepository.get(instructor_id, DISPLAY_NAME)
+
+    @staticmethod
+    async def get_contact(instructor_id: IdLike) -> Optional[dict]:
+        return await InstructorRepository.get(instructor_id, CONTACT)
+
+    @staticmethod
+    def find_public_cards(query: Optional[dict] = None):
+        db = get_database()
+        return db.instructors.find(query or {}, INSTRUCTOR_PUBLIC_CARD)
+
+class SchoolRepository:
+    @staticmethod
+    async def get(school_id: IdLike, projection: dict = PUBLIC_SCHOOL_CARD) -> Optional[dict]:
+        db = get_database()
+        return await db.schools.find_one({"_id": to_object_id(school_id)}, projection)
+
+    @staticmethod
+    async def exists(school_id: IdLike) -> bool:
+        return await SchoolRepository.get(school_id, ID_ONLY) is not None
+
+    @staticmethod
+    async def get_with_instructor(school_id: IdLike, instructor_id: IdLike) -> Optional[dict]:
+        """Fetch a school with instructor_ids narrowed to instructor_id.
+
+        ``instructor_ids`` is absent from the result when the instructor is not a
+        member, so the (unbounded) array is never shipped.
+        """
+        db = get_database()
+        return await db.schools.find_one(
+            {"_id": to_object_id(school_id)},
+            {"instructor_ids": {"$elemMatch": {"$eq": str(instructor_id)}}}
+        )
+
+    @staticmethod
+    def find_public_cards(query: Optional[dict] = None):
+        db = get_database()
+        return db.schools.find(query or {}, PUBLIC_SCHOOL_CARD)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from app.db.mongo import get_database
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
+from app.services.identity_service import IdentityService
 from datetime import datetime
 
 async def seed_instructors():
@@ -14,7 +15,7 @@ async def seed_instructors():
     instructors = [
         {
             "email": "mike.instructor@example.com",
-            "password_hash": get_password_hash("password123"),
+            "password_hash": await get_password_hash_async("password123"),
             "first_name": "Mike",
             "last_name": "Johnson",
             "phone": "3456789012",
@@ -35,7 +36,7 @@ async def seed_instructors():
         },
         {
             "email": "sarah.instructor@example.com",
-            "password_hash": get_password_hash("password123"),
+            "password_hash": await get_password_hash_async("password123"),
             "first_name": "Sarah",
             "last_name": "Wilson",
             "phone": "4567890123",
@@ -57,4 +58,7 @@ async def seed_instructors():
     ]
     
     await db.instructors.insert_many(instructors)
+    # Logins go through the identities index
+    for instructor in instructors:
+        await IdentityService.upsert_from_user(instructor, "instructor")
     print(f"Seeded {len(instructors)} instructors")
\ No newline at end of file
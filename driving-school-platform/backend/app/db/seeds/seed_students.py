@@ -1,5 +1,6 @@
 from app.db.mongo import get_database
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
+from app.services.identity_service import IdentityService
 from datetime import datetime
 
 async def seed_students():
@@ -14,7 +15,7 @@ async def seed_students():
     students = [
         {
             "email": "john.doe@example.com",
-            "password_hash": get_password_hash("password123"),
+            "password_hash": await get_password_hash_async("password123"),
             "first_name": "John",
             "last_name": "Doe",
             "phone": "1234567890",
@@ -32,7 +33,7 @@ async def seed_students():
         },
         {
             "email": "alice.smith@example.com",
-            "password_hash": get_password_hash("password123"),
+            "password_hash": await get_password_hash_async("password123"),
             "first_name": "Alice",
             "last_name": "Smith",
             "phone": "2345678901",
@@ -51,4 +52,7 @@ async def seed_students():
     ]
     
     await db.students.insert_many(students)
+    # Logins go through the identities index
+    for student in students:
+        await IdentityService.upsert_from_user(student, "student")
     print(f"Seeded {len(students)} students")
\ No newline at end of file
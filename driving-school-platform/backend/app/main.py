@@ -1,11 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.connections import manager
+from app.core.fanout import start_fanout, stop_fanout
+from app.services.message_writer import message_writer
+from app.services.notification_outbox import notification_dispatcher
+from app.services.retention import archiver
+from app.utils.email_sender import email_sender
+from app.core.middleware import MetricsMiddleware, QueryBudgetMiddleware
+from app.core.responses import BSONJSONResponse
 from app.db.mongo import connect_to_mongo, close_mongo_connection
-from app.api.v1.routes import auth, students, instructors, lessons, scheduling, payments, notifications, instructor_actions, schools, progress, ratings, chat, booking, available_schools, admin
-from app.api import healthcheck
+from app.core.executor import get_cpu_executor, shutdown_cpu_executor
+from app.db.indexes import start_index_reconcile, stop_index_reconcile
+from app.api.v1.routes import auth, students, instructors, lessons, scheduling, payments, notifications, instructor_actions, schools, progress, ratings, chat, booking, available_schools, admin, events
+from app.api import healthcheck, metrics
 
-app = FastAPI(title=settings.app_name, debug=settings.debug)
+app = FastAPI(title=settings.app_name, debug=settings.debug, default_response_class=BSONJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,15 +23,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
+    get_cpu_executor()
     await connect_to_mongo()
+    start_index_reconcile()
+    manager.start_heartbeat()
+    await start_fanout()
+    message_writer.start()
+    email_sender.start()
+    notification_dispatcher.start()
+    archiver.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await stop_index_reconcile()
+    await archiver.stop()
+    await notification_dispatcher.stop()
+    await email_sender.stop()
+    await message_writer.stop()
+    await stop_fanout()
+    await manager.shutdown()
     await close_mongo_connection()
+    shutdown_cpu_executor()
 
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(students.router, prefix="/api/v1/students", tags=["students"])
@@ -37,7 +66,9 @@ app.include_router(ratings.router, prefix="/api/v1/ratings", tags=["ratings"])
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["chat"])
 app.include_router(booking.router, prefix="/api/v1/booking", tags=["booking"])
 app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
 app.include_router(healthcheck.router, tags=["health"])
+app.include_router(metrics.router, tags=["metrics"])
 
 
 
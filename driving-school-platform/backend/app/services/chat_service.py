@@ -0,0 +1,314 @@
+from app.core.responses import dumps
+from app.db.mongo import get_database
+from app.services import message_buckets
+from app.services.retention import archive_of, chat_horizon
+from app.utils.pagination import keyset_query
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_HISTORY_PAGE = 50
+
+# (created_at, _id) of the newest message a participant has read
+ReadPosition = Tuple[datetime, ObjectId]
+
+def conversation_key(email_a: str, email_b: str) -> str:
+    """Order-independent key shared by both directions of a conversation"""
+    return "|".join(sorted((email_a, email_b)))
+
+def new_message(sender_email: str, receiver_email: str, text: str, message_type: str = "text") -> dict:
+    return {
+        "_id": ObjectId(),
+        "conversation_key": conversation_key(sender_email, receiver_email),
+        "sender_email": sender_email,
+        "receiver_email": receiver_email,
+        "message": text,
+        "message_type": message_type,
+        "created_at": datetime.utcnow()
+    }
+
+def conversation_updates(messages: List[dict]) -> List[UpdateOne]:
+    """Upserts applying ``messages`` (oldest first) to their participants' conversation documents.
+
+    Messages in the same conversation are coalesced: each document is written
+    once, with the newest message and the number of messages it received.
+    """
+    latest: Dict[Tuple[str, str], dict] = {}
+    received: Dict[Tuple[str, str], int] = {}
+    for message in messages:
+        sender, receiver = message["sender_email"], message["receiver_email"]
+        latest[(sender, receiver)] = latest[(receiver, sender)] = message
+        received[(receiver, sender)] = received.get((receiver, sender), 0) + 1
+
+    updates = []
+    for (owner, other), message in latest.items():
+        last = {
+            "conversation_key": message["conversation_key"],
+            "last_message": message.get("message", ""),
+            "last_message_type": message.get("message_type", "text"),
+            "last_message_id": message["_id"],
+            "last_message_at": message["created_at"],
+            "last_sender_email": message["sender_email"]
+        }
+        if received.get((owner, other)):
+            update = {"$set": last, "$inc": {"unread_count": received[(owner, other)]}}
+        else:
+            update = {"$set": last, "$setOnInsert": {"unread_count": 0}}
+        updates.append(UpdateOne({"owner_email": owner, "other_email": other}, update, upsert=True))
+    return updates
+
+def conversation_response(conversation: dict) -> dict:
+    return {
+        "_id": conversation["other_email"],  # kept from the old $group shape
+        "other_email": conversation["other_email"],
+        "last_message": conversation.get("last_message", ""),
+        "last_message_time": conversation.get("last_message_at"),
+        "last_sender_email": conversation.get("last_sender_email"),
+        "unread_count": conversation.get("unread_count", 0)
+    }
+
+def read_position(conversation: Optional[dict]) -> Optional[ReadPosition]:
+    if not conversation or conversation.get("last_read_at") is None:
+        return None
+    return conversation["last_read_at"], conversation["last_read_message_id"]
+
+def is_read(message: dict, watermarks: Dict[str, ReadPosition]) -> bool:
+    # Messages written before watermarks carry their own read flag
+    if message.get("read"):
+        return True
+    position = watermarks.get(message.get("receiver_email"))
+    return position is not None and (message["created_at"], message["_id"]) <= position
+
+def message_response(message: dict, read: bool = False) -> dict:
+    return {
+        "id": str(message["_id"]),
+        "sender_email": message.get("sender_email", ""),
+        "receiver_email": message.get("receiver_email", ""),
+        "message": message.get("message", ""),
+        "message_type": message.get("message_type", "text"),
+        "read": read,
+        "created_at": message.get("created_at")
+    }
+
+def message_frame(message: dict) -> str:
+    """WebSocket frame pushing a new message to its receiver"""
+    return dumps({"type": "message", "message": message_response(message)}).decode()
+
+class ChatService:
+    """Message storage and history reads keyed by conversation.
+
+    History is read with (created_at, _id) keyset anchors on the
+    ``(conversation_key, created_at, _id)`` index, so a page costs the same
+    however long the conversation is. Each send also updates one
+    ``conversations`` document per participant (last message, unread count),
+    which is what the inbox reads. Read state is a per-participant watermark on
+    that document rather than a flag on every message, so marking a
+    conversation read is a single small write.
+
+    With ``CHAT_STORAGE_MODE=buckets`` messages are stored many per document
+    in ``message_buckets`` instead (see ``app.services.message_buckets``);
+    everything else is unchanged.
+
+    Old history is moved to the matching ``*_archive`` collection (see
+    ``app.services.retention``); reads fall back to it only in conversations
+    flagged ``history_archived``, for pages that reach back past the archive
+    horizon or run out of hot messages.
+    """
+
+    @staticmethod
+    def _collection() -> str:
+        return "message_buckets" if message_buckets.buckets_enabled() else "messages"
+
+    @staticmethod
+    async def create_message(sender_email: str, receiver_email: str, text: str, message_type: str = "text") -> dict:
+        db = get_database()
+        message = new_message(sender_email, receiver_email, text, message_type)
+        if message_buckets.buckets_enabled():
+            await db.message_buckets.bulk_write(message_buckets.bucket_updates([message]))
+        else:
+            await db.messages.insert_one(message)
+        await db.conversations.bulk_write(conversation_updates([message]), ordered=False)
+        return message
+
+    @staticmethod
+    async def insert_messages(messages: List[dict]) -> List[int]:
+        """Persist a batch of ``new_message`` documents with one insert_many.
+
+        Returns the indexes of the messages that failed to insert; conversation
+        documents are only updated for the ones that made it. In bucket mode
+        the batch is one ordered bulk_write, which stops at the first error.
+        """
+        db = get_database()
+        failed: List[int] = []
+        try:
+            if message_buckets.buckets_enabled():
+                await db.message_buckets.bulk_write(message_buckets.bucket_updates(messages))
+            else:
+                await db.messages.insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            failed = [error["index"] for error in e.details.get("writeErrors", [])]
+            if message_buckets.buckets_enabled() and failed:
+                failed = list(range(min(failed), len(messages)))
+        failed_set = set(failed)
+        inserted = [message for index, message in enumerate(messages) if index not in failed_set]
+        if inserted:
+            await db.conversations.bulk_write(conversation_updates(inserted), ordered=False)
+        return failed
+
+    @staticmethod
+    async def _count_received_after(user_email: str, other_email: str, position: dict) -> int:
+        key = conversation_key(user_email, other_email)
+        if message_buckets.buckets_enabled():
+            return await message_buckets.count_after(key, other_email, position)
+        db = get_database()
+        cursor_position = {"k": "created_at", "v": position["created_at"], "id": position["_id"]}
+        return await db.messages.count_documents(
+            keyset_query({"conversation_key": key, "sender_email": other_email}, cursor_position, "created_at", ASCENDING)
+        )
+
+    @staticmethod
+    async def mark_conversation_read(user_email: str, other_email: str, up_to: dict) -> int:
+        """Move the user's watermark forward to ``up_to``, the newest message they were served.
+
+        The watermark never moves back, and messages received after ``up_to``
+        (sent while the page was being read, or past the end of an ``after``
+        page) stay unread. Returns documents written.
+        """
+        db = get_database()
+        read_at, message_id = up_to["created_at"], up_to["_id"]
+        conversation = await db.conversations.find_one_and_update(
+            {
+                "owner_email": user_email,
+                "other_email": other_email,
+                "unread_count": {"$gt": 0},
+                "$or": [
+                    {"last_read_at": None},
+                    {"last_read_at": {"$lt": read_at}},
+                    {"last_read_at": read_at, "last_read_message_id": {"$lt": message_id}}
+                ]
+            },
+            [{"$set": {
+                "last_read_message_id": message_id,
+                "last_read_at": read_at,
+                "unread_count": {"$cond": [{"$eq": ["$last_message_id", message_id]}, 0, "$unread_count"]}
+            }}],
+            projection={"last_message_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if conversation is None:
+            return 0
+        if conversation.get("last_message_id") != message_id:
+            # Unread is whatever arrived after the watermark; only if no later read moved it since
+            unread = await ChatService._count_received_after(user_email, other_email, up_to)
+            await db.conversations.update_one(
+                {"_id": conversation["_id"], "last_read_message_id": message_id},
+                {"$set": {"unread_count": unread}}
+            )
+        return 1
+
+    @staticmethod
+    async def get_read_state(user_email: str, other_email: str) -> Tuple[Dict[str, ReadPosition], bool]:
+        """Read positions of both participants, keyed by owner email, and whether
+        the conversation has history in the archive"""
+        db = get_database()
+        conversations = await db.conversations.find(
+            {"$or": [
+                {"owner_email": user_email, "other_email": other_email},
+                {"owner_email": other_email, "other_email": user_email}
+            ]},
+            {"owner_email": 1, "last_read_at": 1, "last_read_message_id": 1, "history_archived": 1}
+        ).to_list(2)
+        watermarks = {}
+        for conversation in conversations:
+            position = read_position(conversation)
+            if position is not None:
+                watermarks[conversation["owner_email"]] = position
+        archived = any(conversation.get("history_archived") for conversation in conversations)
+        return watermarks, archived
+
+    @staticmethod
+    async def _find_anchor(collection: str, key: str, message_id: ObjectId) -> Optional[dict]:
+        if message_buckets.buckets_enabled():
+            return await message_buckets.find_anchor(key, message_id, collection)
+        db = get_database()
+        return await db[collection].find_one({"_id": message_id, "conversation_key": key}, {"created_at": 1})
+
+    @staticmethod
+    async def get_anchor(key: str, message_id: ObjectId, archived: bool = True) -> Optional[dict]:
+        collection = ChatService._collection()
+        anchor = await ChatService._find_anchor(collection, key, message_id)
+        if anchor is None and archived:
+            anchor = await ChatService._find_anchor(archive_of(collection), key, message_id)
+        return anchor
+
+    @staticmethod
+    async def _read_history(
+        collection: str,
+        key: str,
+        before: Optional[dict],
+        after: Optional[dict],
+        limit: int
+    ) -> List[dict]:
+        if message_buckets.buckets_enabled():
+            return await message_buckets.get_history(key, before, after, limit, collection)
+
+        db = get_database()
+        query = {"conversation_key": key}
+
+        if after is not None:
+            position = {"k": "created_at", "v": after.get("created_at"), "id": after["_id"]}
+            cursor = db[collection].find(keyset_query(query, position, "created_at", ASCENDING))
+            return await cursor.sort([("created_at", ASCENDING), ("_id", ASCENDING)]).limit(limit).to_list(None)
+
+        if before is not None:
+            position = {"k": "created_at", "v": before.get("created_at"), "id": before["_id"]}
+            query = keyset_query(query, position, "created_at", DESCENDING)
+        cursor = db[collection].find(query).sort([("created_at", DESCENDING), ("_id", DESCENDING)]).limit(limit)
+        messages = await cursor.to_list(None)
+        messages.reverse()
+        return messages
+
+    @staticmethod
+    def _reaches_archive(messages: List[dict], before: Optional[dict], after: Optional[dict], limit: int) -> bool:
+        # Everything from the horizon on is still in the hot collection
+        horizon = chat_horizon()
+        if after is not None:
+            return after.get("created_at") is None or after["created_at"] < horizon
+        if before is not None and before.get("created_at") is not None and before["created_at"] < horizon:
+            return True
+        oldest = messages[0].get("created_at") if messages else None
+        if oldest is not None and oldest < horizon:
+            return True
+        return len(messages) < limit
+
+    @staticmethod
+    async def get_history(
+        user_email: str,
+        other_email: str,
+        before: Optional[dict] = None,
+        after: Optional[dict] = None,
+        limit: int = DEFAULT_HISTORY_PAGE,
+        archived: bool = True
+    ) -> List[dict]:
+        """Return up to ``limit`` messages in ascending order.
+
+        Without anchors this is the latest page; ``before``/``after`` are anchor
+        messages (from ``get_anchor``) to page back in history or fetch only
+        what arrived since the client's newest message. ``archived`` is the
+        conversation's ``history_archived`` flag (see ``get_read_state``).
+        """
+        key = conversation_key(user_email, other_email)
+        collection = ChatService._collection()
+        messages = await ChatService._read_history(collection, key, before, after, limit)
+        if not archived or not ChatService._reaches_archive(messages, before, after, limit):
+            return messages
+
+        older = await ChatService._read_history(archive_of(collection), key, before, after, limit)
+        if not older:
+            return messages
+        # A message being archived right now can be in both
+        merged = {message["_id"]: message for message in older + messages}
+        ordered = sorted(merged.values(), key=lambda message: (message["created_at"], message["_id"]))
+        return ordered[:limit] if after is not None else ordered[-limit:]
\ No newline at end of file
@@ -0,0 +1,127 @@
+from app.db.mongo import get_database
+from bson import ObjectId
+from datetime import datetime
+from typing import Optional
+import time
+
+# Collections that own user accounts, keyed by the user_type stored in tokens
+USER_COLLECTIONS = {
+    "student": "students",
+    "instructor": "instructors"
+}
+
+class IdentityService:
+    """Single-lookup email index over students and instructors.
+
+    Each ``identities`` document maps an email to the owning user's type, _id
+    and password hash so login/registration resolve a user with one query.
+    """
+
+    @staticmethod
+    async def get_by_email(email: str) -> Optional[dict]:
+        db = get_database()
+        return await db.identities.find_one({"email": email})
+
+    @staticmethod
+    async def create_identity(email: str, user_type: str, user_id: ObjectId, password_hash: str):
+        """Insert a new identity; raises DuplicateKeyError if the email is taken"""
+        db = get_database()
+        await db.identities.insert_one({
+            "email": email,
+            "user_type": user_type,
+            "user_id": user_id,
+            "password_hash": password_hash,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        })
+
+    @staticmethod
+    async def upsert_from_user(user: dict, user_type: str):
+        db = get_database()
+        await db.identities.update_one(
+            {"email": user["email"]},
+            {
+                "$set": {
+                    "user_type": user_type,
+                    "user_id": user["_id"],
+                    "password_hash": user.get("password_hash"),
+                    "updated_at": datetime.utcnow()
+                },
+                "$setOnInsert": {"created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+    @staticmethod
+    async def sync_user_update(user_id: ObjectId, update_data: dict):
+        """Mirror email/password changes made to a student or instructor"""
+        changes = {
+            field: update_data[field]
+            for field in ("email", "password_hash")
+            if field in update_data
+        }
+        if not changes:
+            return
+
+        db = get_database()
+        changes["updated_at"] = datetime.utcnow()
+        await db.identities.update_one({"user_id": user_id}, {"$set": changes})
+
+    @staticmethod
+    async def delete_by_email(email: str):
+        db = get_database()
+        await db.identities.delete_one({"email": email})
+
+    @staticmethod
+    async def find_legacy_user(email: str):
+        """Probe the user collections directly for accounts not yet in the index.
+
+        Returns ``(user, user_type)`` and backfills the identity on a hit.
+        """
+        db = get_database()
+        for user_type, collection in USER_COLLECTIONS.items():
+            user = await db[collection].find_one({"email": email})
+            if user:
+                await IdentityService.upsert_from_user(user, user_type)
+                return user, user_type
+        return None, None
+
+    @staticmethod
+    async def load_principal(email: str, identity: Optional[dict] = None) -> Optional[dict]:
+        """Resolve the ids a request acts as: user _id, type and school membership"""
+        db = get_database()
+        if identity is None:
+            identity = await IdentityService.get_by_email(email)
+
+        if identity:
+            user_type = identity["user_type"]
+            user = await db[USER_COLLECTIONS[user_type]].find_one(
+                {"_id": identity["user_id"]},
+                {"email": 1, "school_id": 1, "school_status": 1}
+            )
+        else:
+            user, user_type = await IdentityService.find_legacy_user(email)
+
+        if not user:
+            return None
+
+        school_id = user.get("school_id")
+        return {
+            "email": user["email"],
+            "user_type": user_type,
+            "user_id": user["_id"],
+            "school_id": str(school_id) if school_id else None,
+            "school_status": user.get("school_status")
+        }
+
+    @staticmethod
+    def principal_claims(principal: dict) -> dict:
+        """Token claims carrying the principal, stamped with their issue time"""
+        return {
+            "sub": principal["email"],
+            "user_type": principal["user_type"],
+            "uid": str(principal["user_id"]),
+            "school_id": principal.get("school_id"),
+            "school_status": principal.get("school_status"),
+            "iat": int(time.time())
+        }
\ No newline at end of file
@@ -1,5 +1,6 @@
 from app.db.mongo import get_database
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
+from app.services.identity_service import IdentityService
 from bson import ObjectId
 from datetime import datetime
 
@@ -7,11 +8,12 @@ class InstructorService:
     @staticmethod
     async def create_instructor(instructor_data: dict):
         db = get_database()
-        instructor_data["password_hash"] = get_password_hash(instructor_data.pop("password"))
+        instructor_data["password_hash"] = await get_password_hash_async(instructor_data.pop("password"))
         instructor_data["created_at"] = datetime.utcnow()
         instructor_data["updated_at"] = datetime.utcnow()
         
         result = await db.instructors.insert_one(instructor_data)
+        await IdentityService.upsert_from_user(instructor_data, "instructor")
         return str(result.inserted_id)
     
     @staticmethod
@@ -0,0 +1,167 @@
+"""Bucketed chat storage: many messages per document in ``message_buckets``.
+
+Enabled with ``CHAT_STORAGE_MODE=buckets``. Each bucket holds up to
+``chat_bucket_max_messages`` messages of one conversation, all sent within
+``chat_bucket_max_seconds`` of its first one:
+
+    {conversation_key, start_at, end_at, count, messages: [{_id, sender_email, ...}]}
+
+Messages keep their own ``_id`` so acks, anchors and read watermarks work the
+same as with one document per message. Sends ``$push`` into the open bucket of
+their conversation, upserting a new one when it is full or too old, and
+history reads unwind just enough buckets to fill a page.
+"""
+from datetime import timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from app.core.config import settings
+from app.db.mongo import get_database
+
+STORAGE_MODES = ("messages", "buckets")
+
+def buckets_enabled() -> bool:
+    if settings.chat_storage_mode not in STORAGE_MODES:
+        raise ValueError(f"chat_storage_mode must be one of {', '.join(STORAGE_MODES)}")
+    return settings.chat_storage_mode == "buckets"
+
+def _embedded(message: dict) -> dict:
+    # The conversation key lives on the bucket
+    return {field: value for field, value in message.items() if field != "conversation_key"}
+
+def _unbucketed(bucket: dict, message: dict) -> dict:
+    return {**message, "conversation_key": bucket["conversation_key"]}
+
+def _position(message: dict):
+    return message["created_at"], message["_id"]
+
+def bucket_updates(messages: List[dict]) -> List[UpdateOne]:
+    """One upsert per message (oldest first), appending it to its conversation's open bucket.
+
+    Run them with an ordered bulk_write so a full bucket is seen as full by
+    the next message of the same conversation.
+    """
+    window = timedelta(seconds=settings.chat_bucket_max_seconds)
+    return [
+        UpdateOne(
+            {
+                "conversation_key": message["conversation_key"],
+                "count": {"$lt": settings.chat_bucket_max_messages},
+                "start_at": {"$gt": message["created_at"] - window}
+            },
+            {
+                "$push": {"messages": _embedded(message)},
+                "$inc": {"count": 1},
+                "$min": {"start_at": message["created_at"]},
+                "$max": {"end_at": message["created_at"]}
+            },
+            upsert=True
+        )
+        for message in messages
+    ]
+
+def build_buckets(messages: Iterable[dict]) -> List[dict]:
+    """Pack one conversation's messages (oldest first) into bucket documents"""
+    window = timedelta(seconds=settings.chat_bucket_max_seconds)
+    buckets: List[dict] = []
+    for message in messages:
+        bucket = buckets[-1] if buckets else None
+        if (
+            bucket is None
+            or bucket["count"] >= settings.chat_bucket_max_messages
+            or message["created_at"] - bucket["start_at"] >= window
+        ):
+            bucket = {
+                "conversation_key": message["conversation_key"],
+                "start_at": message["created_at"],
+                "end_at": message["created_at"],
+                "count": 0,
+                "messages": []
+            }
+            buckets.append(bucket)
+        bucket["messages"].append(_embedded(message))
+        bucket["count"] += 1
+        bucket["end_at"] = max(bucket["end_at"], message["created_at"])
+    return buckets
+
+async def find_anchor(key: str, message_id, collection: str = "message_buckets") -> Optional[dict]:
+    db = get_database()
+    bucket = await db[collection].find_one(
+        {"conversation_key": key, "messages._id": message_id},
+        {"conversation_key": 1, "messages": {"$elemMatch": {"_id": message_id}}}
+    )
+    if not bucket:
+        return None
+    return _unbucketed(bucket, bucket["messages"][0])
+
+async def get_history(
+    key: str,
+    before: Optional[dict],
+    after: Optional[dict],
+    limit: int,
+    collection: str = "message_buckets"
+) -> List[dict]:
+    """Same contract as ``ChatService.get_history``, read from buckets.
+
+    Buckets are walked from the anchor outwards (by ``end_at`` going back, by
+    ``start_at`` going forward) and the walk stops once a page is full and the
+    next bucket cannot hold anything closer to the anchor, so a page reads
+    about ``limit / chat_bucket_max_messages`` + 1 documents.
+    """
+    db = get_database()
+    query: Dict[str, object] = {"conversation_key": key}
+    collected: List[dict] = []
+
+    if after is not None:
+        anchor = _position(after)
+        query["end_at"] = {"$gte": after["created_at"]}
+        cursor = db[collection].find(query).sort([("conversation_key", ASCENDING), ("start_at", ASCENDING)])
+        async for bucket in cursor:
+            if len(collected) >= limit and collected[limit - 1]["created_at"] < bucket["start_at"]:
+                break
+            collected.extend(_unbucketed(bucket, m) for m in bucket["messages"] if _position(m) > anchor)
+            collected.sort(key=_position)
+        return collected[:limit]
+
+    anchor = _position(before) if before is not None else None
+    if before is not None:
+        query["start_at"] = {"$lte": before["created_at"]}
+    cursor = db[collection].find(query).sort([("conversation_key", ASCENDING), ("end_at", DESCENDING)])
+    async for bucket in cursor:
+        if len(collected) >= limit and collected[limit - 1]["created_at"] > bucket["end_at"]:
+            break
+        collected.extend(
+            _unbucketed(bucket, m) for m in bucket["messages"]
+            if anchor is None or _position(m) < anchor
+        )
+        collected.sort(key=_position, reverse=True)
+    page = collected[:limit]
+    page.reverse()
+    return page
+
+async def count_after(key: str, sender_email: str, after: dict, collection: str = "message_buckets") -> int:
+    """Messages from ``sender_email`` in the conversation that sort after ``after``"""
+    db = get_database()
+    cursor = db[collection].aggregate([
+        {"$match": {"conversation_key": key, "end_at": {"$gte": after["created_at"]}}},
+        {"$unwind": "$messages"},
+        {"$match": {
+            "messages.sender_email": sender_email,
+            "$or": [
+                {"messages.created_at": {"$gt": after["created_at"]}},
+                {"messages.created_at": after["created_at"], "messages._id": {"$gt": after["_id"]}}
+            ]
+        }},
+        {"$count": "count"}
+    ])
+    result = await cursor.to_list(1)
+    return result[0]["count"] if result else 0
+
+async def iter_messages(batch_size: int = 100) -> AsyncIterator[dict]:
+    """Every bucketed message as a flat document, in (conversation_key, created_at, _id) order"""
+    db = get_database()
+    cursor = db.message_buckets.find({}).sort([
+        ("conversation_key", ASCENDING), ("start_at", ASCENDING)
+    ]).batch_size(batch_size)
+    async for bucket in cursor:
+        for message in sorted(bucket["messages"], key=_position):
+            yield _unbucketed(bucket, message)
\ No newline at end of file
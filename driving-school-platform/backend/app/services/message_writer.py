@@ -0,0 +1,104 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+from app.core.config import settings
+from app.core.metrics import chat_write_batch_size, chat_write_failures, chat_write_flush_duration
+from app.core import fanout
+from app.services.chat_service import ChatService, message_frame
+
+class MessageNotPersisted(Exception):
+    pass
+
+@dataclass
+class _Pending:
+    message: dict
+    future: asyncio.Future
+
+class MessageWriter:
+    """Write-behind batcher for chat messages sent over the WebSocket.
+
+    ``submit`` queues a message and returns a future; a single flusher task
+    collects up to ``chat_write_batch_size`` messages or waits at most
+    ``chat_write_window_ms`` after the first, persists them with one
+    insert_many plus one conversations bulk_write, resolves the futures (the
+    sender's ack) and then pushes each message to its receiver.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, message: dict) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Pending(message, future))
+        return future
+
+    async def _collect(self) -> List[_Pending]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + settings.chat_write_window_ms / 1000
+        while len(batch) < settings.chat_write_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[_Pending]):
+        started = time.perf_counter()
+        try:
+            failed = set(await ChatService.insert_messages([pending.message for pending in batch]))
+        except Exception as e:
+            print(f"Error persisting chat messages: {e}")
+            failed = set(range(len(batch)))
+        chat_write_batch_size.observe(len(batch))
+        chat_write_flush_duration.observe(time.perf_counter() - started)
+
+        delivered = []
+        for index, pending in enumerate(batch):
+            if pending.future.done():
+                continue
+            if index in failed:
+                chat_write_failures.inc()
+                pending.future.set_exception(MessageNotPersisted())
+            else:
+                pending.future.set_result(pending.message)
+                delivered.append(pending.message)
+
+        for message in delivered:
+            try:
+                await fanout.publish(message["receiver_email"], message_frame(message))
+            except Exception as e:
+                print(f"WebSocket error: {e}")
+
+    async def _run(self):
+        while True:
+            await self._flush(await self._collect())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher, persisting whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._flush(batch)
+
+message_writer = MessageWriter()
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""Notification outbox and its background dispatcher.
+
+Routes don't write notifications or send emails themselves: they enqueue
+events into ``notification_outbox`` together with the business change and
+return.
+
+Only with ``OUTBOX_TRANSACTIONS`` on (which needs a replica set) are the
+business write and the enqueue one transaction. It is off by default, so a
+process dying between the two writes keeps the change but loses its
+notifications; the dispatcher warns about this at startup.
+
+The dispatcher claims pending events in batches and delivers each one:
+
+* inbox: one ``insert_many`` into ``notifications`` per batch, reusing the
+  event's ``_id`` so a retried event is never stored twice (expiring types
+  get their ``expires_at``, see ``app.services.retention``); the event is
+  marked ``counted`` once its user's unread counter includes it, so a retry
+  counts notifications an earlier attempt stored but never counted;
+* push: a ``notification`` event on the user's event stream (see
+  ``app.services.user_events``), as are ``stream_event`` events such as
+  lesson and booking status changes;
+* email: through the pooled ``email_sender`` when the event carries one; a
+  batch's emails are handed over together so they can be digested and
+  pipelined.
+
+Events whose delivery fails are retried with exponential backoff until
+``outbox_max_attempts``, then left as ``failed``; an email the server refuses
+outright (5xx) fails its event at once. Claims are leases, renewed while the
+batch's emails are out, so events held by a worker that died are picked up
+again once the lease expires.
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.config import settings
+from app.core.metrics import (
+    notification_outbox_dispatched,
+    notification_outbox_failed,
+    notification_outbox_lag,
+    notification_outbox_retries
+)
+from app.db.mongo import get_database, mongodb
+from app.services.notification_service import NotificationService
+from app.services.retention import expires_at
+from app.services.user_events import UserEvents
+from app.utils.email_sender import email_sender, is_transient
+
+DUPLICATE_KEY = 11000
+
+def notification_event(
+    title: str,
+    message: str,
+    notification_type: str,
+    user_email: Optional[str] = None,
+    email: Optional[dict] = None,
+    **refs
+) -> dict:
+    """An outbox event for one notification.
+
+    ``refs`` (lesson_id, booking_id, school_id, ...) are stored on the
+    notification as they are; ``email`` is ``{"subject", "body"}`` sent to
+    ``user_email``.
+    """
+    notification = {
+        "title": title,
+        "message": message,
+        "type": notification_type,
+        **refs
+    }
+    if user_email is not None:
+        notification["user_email"] = user_email
+    event = {"notification": notification}
+    if email is not None and user_email is not None:
+        event["email"] = {"to": [user_email], **email}
+    return event
+
+def stream_event(user_email: str, event_type: str, **data) -> dict:
+    """An outbox event only pushed to the user's event stream (no inbox entry)"""
+    return {"stream": {"user_email": user_email, "type": event_type, "data": data}}
+
+class NotificationOutbox:
+    @staticmethod
+    @asynccontextmanager
+    async def transaction():
+        """Session to pass to the business writes and ``enqueue``, or None without transactions"""
+        if not settings.outbox_transactions:
+            yield None
+            return
+        async with await mongodb.client.start_session() as session:
+            async with session.start_transaction():
+                yield session
+
+    @staticmethod
+    async def enqueue(events: List[dict], session=None):
+        if not events:
+            return
+        db = get_database()
+        now = datetime.utcnow()
+        await db.notification_outbox.insert_many([
+            {
+                **event,
+                "status": "pending",
+                "attempts": 0,
+                "available_at": now,
+                "created_at": now
+            }
+            for event in events
+        ], session=session)
+        notification_dispatcher.wake()
+
+class NotificationDispatcher:
+    def __init__(self):
+        self.worker = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        """Skip the rest of the poll interval (an event was just enqueued here)"""
+        self._wakeup.set()
+
+    async def claim(self) -> List[dict]:
+        """Lease up to outbox_batch_size due events to this worker"""
+        db = get_database()
+        now = datetime.utcnow()
+        due = {
+            "status": "pending",
+            "available_at": {"$lte": now},
+            "$or": [{"leased_until": {"$exists": False}}, {"leased_until": {"$lte": now}}]
+        }
+        candidates = await db.notification_outbox.find(due, {"_id": 1}).sort(
+            "available_at", ASCENDING
+        ).limit(settings.outbox_batch_size).to_list(None)
+        if not candidates:
+            return []
+
+        lease = f"{self.worker}:{ObjectId()}"
+        await db.notification_outbox.update_many(
+            {**due, "_id": {"$in": [candidate["_id"] for candidate in candidates]}},
+            {"$set": {"lease": lease, "leased_until": now + timedelta(seconds=settings.outbox_lease_seconds)}}
+        )
+        # Only the ones no other worker leased in the meantime
+        return await db.notification_outbox.find({"lease": lease}).to_list(None)
+
+    async def _store(self, events: List[dict]) -> set:
+        """Insert the batch's notifications; returns the ids stored by this call"""
+        db = get_database()
+        notifications = [
+            {**event["notification"], "_id": event["_id"], "read": False, "created_at": event["created_at"]}
+            for event in events
+            if "notification" in event
+        ]
+        if not notifications:
+            return set()
+        for notification in notifications:
+            expiry = expires_at(notification.get("type"), notification["created_at"])
+            if expiry is not None:
+                notification["expires_at"] = expiry
+        failed = set()
+        try:
+            await db.notifications.insert_many(notifications, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") != DUPLICATE_KEY:
+                    raise
+                failed.add(notifications[error["index"]]["_id"])
+        stored = [notification for notification in notifications if notification["_id"] not in failed]
+        notification_outbox_dispatched.inc(len(stored), channel="inbox")
+
+        # Duplicates were stored by an earlier attempt, which may have died before counting them
+        counted = {event["_id"] for event in events if event.get("counted")}
+        uncounted = [notification for notification in notifications if notification["_id"] not in counted]
+        unread: Dict[str, int] = {}
+        for notification in uncounted:
+            if notification.get("user_email"):
+                unread[notification["user_email"]] = unread.get(notification["user_email"], 0) + 1
+        if uncounted:
+            async with NotificationOutbox.transaction() as session:
+                await NotificationService.increment_unread(unread, session=session)
+                await db.notification_outbox.update_many(
+                    {"_id": {"$in": [notification["_id"] for notification in uncounted]}},
+                    {"$set": {"counted": True}},
+                    session=session
+                )
+        return {notification["_id"] for notification in stored}
+
+    async def _stream(self, events: List[dict]):
+        """Publish the batch on its users' event streams (once per outbox event, even when retried)"""
+        published = []
+        for event in events:
+            notification = event.get("notification")
+            if notification and notification.get("user_email"):
+                data = {**notification, "id": str(event["_id"]), "read": False, "created_at": event["created_at"]}
+                published.append({"_id": event["_id"], "user_email": notification["user_email"], "type": "notification", "data": data})
+            elif "stream" in event:
+                published.append({"_id": event["_id"], **event["stream"]})
+        notification_outbox_dispatched.inc(await UserEvents.publish(published), channel="push")
+
+    async def _email(self, event: dict) -> Optional[Exception]:
+        email = event.get("email")
+        if not email:
+            return None
+        error = await email_sender.deliver(email["to"], email["subject"], email["body"])
+        if error is None:
+            notification_outbox_dispatched.inc(channel="email")
+        return error
+
+    async def _hold_lease(self, lease: str):
+        """Push the batch's lease out while it is being delivered, so no other worker re-sends it"""
+        db = get_database()
+        while True:
+            await asyncio.sleep(settings.outbox_lease_seconds / 3)
+            try:
+                await db.notification_outbox.update_many(
+                    {"lease": lease},
+                    {"$set": {"leased_until": datetime.utcnow() + timedelta(seconds=settings.outbox_lease_seconds)}}
+                )
+            except Exception as e:
+                print(f"⚠️ Failed to renew outbox lease: {e}")
+
+    def _retry(self, event: dict, error: str, permanent: bool = False) -> UpdateOne:
+        attempts = event.get("attempts", 0) + 1
+        update = {"attempts": attempts, "last_error": error}
+        if permanent or attempts >= settings.outbox_max_attempts:
+            notification_outbox_failed.inc()
+            update["status"] = "failed"
+        else:
+            notification_outbox_retries.inc()
+            delay = settings.outbox_retry_base_seconds * 2 ** (attempts - 1)
+            update["available_at"] = datetime.utcnow() + timedelta(seconds=delay)
+        return UpdateOne({"_id": event["_id"]}, {"$set": update, "$unset": {"lease": "", "leased_until": ""}})
+
+    async def dispatch(self, events: List[dict]):
+        db = get_database()
+        updates = []
+        try:
+            await self._store(events)
+            await self._stream(events)
+        except Exception as e:
+            # Nothing has been emailed yet, so the whole batch can simply be retried
+            print(f"⚠️ Failed to store notifications: {e}")
+            await db.notification_outbox.bulk_write([self._retry(event, str(e)) for event in events], ordered=False)
+            return
+
+        delivered = []
+        lease = events[0].get("lease")
+        holder = asyncio.create_task(self._hold_lease(lease)) if lease else None
+        try:
+            results = await asyncio.gather(*(self._email(event) for event in events), return_exceptions=True)
+        finally:
+            if holder is not None:
+                holder.cancel()
+        for event, error in zip(events, results):
+            if error is None:
+                delivered.append(event)
+            elif isinstance(error, Exception) and not is_transient(error):
+                updates.append(self._retry(event, f"email refused: {error}", permanent=True))
+            else:
+                print(f"Email sending failed: {error}")
+                updates.append(self._retry(event, f"email not sent: {error}"))
+
+        if delivered:
+            now = datetime.utcnow()
+            updates.append(UpdateMany(
+                {"_id": {"$in": [event["_id"] for event in delivered]}},
+                {"$set": {"status": "done", "dispatched_at": now}, "$unset": {"lease": "", "leased_until": ""}}
+            ))
+            for event in delivered:
+                notification_outbox_lag.observe((now - event["created_at"]).total_seconds())
+        if updates:
+            await db.notification_outbox.bulk_write(updates, ordered=False)
+
+    async def run_once(self) -> int:
+        events = await self.claim()
+        if events:
+            await self.dispatch(events)
+        return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.run_once() >= settings.outbox_batch_size:
+                    continue  # more are probably waiting
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Notification dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.outbox_poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            if not settings.outbox_transactions:
+                print(
+                    "⚠️ OUTBOX_TRANSACTIONS is off: events are enqueued in a separate write from the change "
+                    "that caused them, so a crash in between loses the notification"
+                )
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+notification_dispatcher = NotificationDispatcher()
\ No newline at end of file
@@ -0,0 +1,103 @@
+from app.db.mongo import get_database
+from app.services.retention import archive_of, notification_horizon
+from app.utils.pagination import Page, PageParams, fetch_page, merge_pages
+from bson import ObjectId
+from pymongo import UpdateOne
+from typing import Dict, Optional
+
+class NotificationService:
+    """Read state of a user's notifications.
+
+    Each user has a ``notification_counters`` document (``_id`` is the email)
+    holding their unread count. Every unread -> read flip and every stored
+    unread notification moves it with ``$inc`` by exactly the number of
+    documents changed, so concurrent inserts and reads never lose updates and
+    the badge is a single point read.
+    """
+
+    @staticmethod
+    async def get_page(user_email: str, page: PageParams) -> Page:
+        """One page of the user's notifications, newest first.
+
+        Served from ``notifications`` alone unless the page reaches back past
+        the archive horizon (the "show older" pages), or the hot listing runs
+        out for a user the Archiver has flagged; those also read
+        ``notifications_archive`` with the same cursor and merge the two.
+        """
+        db = get_database()
+        query = {"user_email": user_email}
+        result = await fetch_page(db.notifications.find, query, page, "created_at")
+        if not await NotificationService._reaches_archive(user_email, page, result):
+            return result
+
+        archived = await fetch_page(db[archive_of("notifications")].find, query, page, "created_at")
+        return merge_pages([result, archived], page.limit, "created_at")
+
+    @staticmethod
+    async def _reaches_archive(user_email: str, page: PageParams, result: Page) -> bool:
+        horizon = notification_horizon()
+        position = page.after["v"] if page.after else None
+        if position is not None and position < horizon:
+            return True
+        oldest = result.items[-1].get("created_at") if result.items else None
+        if oldest is not None and oldest < horizon:
+            return True
+        if result.next_cursor:
+            return False
+        # The hot listing ends on this side of the horizon; older ones can only be archived
+        db = get_database()
+        counter = await db.notification_counters.find_one({"_id": user_email}, {"archived": 1})
+        return bool(counter and counter.get("archived"))
+
+    @staticmethod
+    async def increment_unread(counts: Dict[str, int], session=None):
+        """Add newly stored unread notifications, ``{user_email: count}``"""
+        if not counts:
+            return
+        db = get_database()
+        await db.notification_counters.bulk_write([
+            UpdateOne({"_id": email}, {"$inc": {"unread": count}}, upsert=True)
+            for email, count in counts.items()
+        ], ordered=False, session=session)
+
+    @staticmethod
+    async def unread_count(user_email: str) -> int:
+        db = get_database()
+        counter = await db.notification_counters.find_one({"_id": user_email})
+        return max(counter.get("unread", 0), 0) if counter else 0
+
+    @staticmethod
+    async def _mark(user_email: str, query: dict) -> int:
+        db = get_database()
+        query = {**query, "user_email": user_email, "read": False}
+        result = await db.notifications.update_many(query, {"$set": {"read": True}})
+        if result.modified_count:
+            await db.notification_counters.update_one(
+                {"_id": user_email},
+                {"$inc": {"unread": -result.modified_count}},
+                upsert=True
+            )
+        return result.modified_count
+
+    @staticmethod
+    async def mark_read(user_email: str, notification_id: ObjectId) -> int:
+        return await NotificationService._mark(user_email, {"_id": notification_id})
+
+    @staticmethod
+    async def mark_all_read(user_email: str, up_to: Optional[dict] = None) -> int:
+        """Mark every unread notification read, or only those up to and including ``up_to``"""
+        query = {}
+        if up_to is not None:
+            query["$or"] = [
+                {"created_at": {"$lt": up_to["created_at"]}},
+                {"created_at": up_to["created_at"], "_id": {"$lte": up_to["_id"]}}
+            ]
+        return await NotificationService._mark(user_email, query)
+
+    @staticmethod
+    async def get_notification(user_email: str, notification_id: ObjectId) -> Optional[dict]:
+        db = get_database()
+        return await db.notifications.find_one(
+            {"_id": notification_id, "user_email": user_email},
+            {"created_at": 1}
+        )
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""Retention for notifications and chat history.
+
+Two mechanisms keep the hot collections (and their indexes) small:
+
+* expiry: notifications of the ``notification_expiring_types`` are stored with
+  an ``expires_at``; a TTL index that only covers read documents deletes them
+  once they are past it, so unread counters never lose a document;
+* archiving: the ``Archiver`` periodically moves read notifications older than
+  ``notification_archive_after_seconds`` and chat history older than
+  ``chat_archive_after_seconds`` into ``*_archive`` collections of the same
+  shape, in batches of ``archive_batch_size``.
+
+Everything newer than a collection's horizon is guaranteed to still be in the
+hot collection, and before a batch leaves it the owners of the batch are
+flagged (``archived`` on the user's ``notification_counters`` document,
+``history_archived`` on both ``conversations`` documents). Read paths only
+consult the archive for pages that reach back past the horizon, or that run
+out of hot documents for a flagged owner (see ``NotificationService.get_page``
+and ``ChatService.get_history``). A batch is copied before it is deleted and
+copies of an already-archived document are ignored, so a run that dies half
+way, or two workers archiving at once, never loses or duplicates anything.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.config import settings
+from app.core.metrics import archive_moved, archive_run_duration
+from app.db.mongo import get_database
+from app.services import message_buckets
+
+DUPLICATE_KEY = 11000
+
+def expiring_types() -> set:
+    return {value.strip() for value in settings.notification_expiring_types.split(",") if value.strip()}
+
+def expires_at(notification_type: Optional[str], created_at: datetime) -> Optional[datetime]:
+    """When a notification of this type may be deleted (once read), None to keep it"""
+    if notification_type not in expiring_types():
+        return None
+    return created_at + timedelta(seconds=settings.notification_expire_seconds)
+
+def notification_horizon() -> datetime:
+    """Notifications created at or after this are never in the archive"""
+    return datetime.utcnow() - timedelta(seconds=settings.notification_archive_after_seconds)
+
+def chat_horizon() -> datetime:
+    """Messages created at or after this are never in the archive"""
+    return datetime.utcnow() - timedelta(seconds=settings.chat_archive_after_seconds)
+
+def archive_of(collection_name: str) -> str:
+    return f"{collection_name}_archive"
+
+@dataclass
+class ArchivePolicy:
+    collection: str
+    query: Callable[[datetime], dict]  # documents to move, given the horizon
+    horizon: Callable[[], datetime]
+    flag_owners: Callable[[List[dict]], Awaitable[None]]  # mark who has archived documents
+
+def _older_than(field: str, horizon: datetime) -> dict:
+    # The _id bound lets each batch be a range scan on the _id index
+    return {"_id": {"$lt": ObjectId.from_datetime(horizon)}, field: {"$lt": horizon}}
+
+async def _flag_notification_owners(documents: List[dict]):
+    emails = {document["user_email"] for document in documents if document.get("user_email")}
+    if emails:
+        await get_database().notification_counters.bulk_write([
+            UpdateOne({"_id": email}, {"$set": {"archived": True}}, upsert=True)
+            for email in emails
+        ], ordered=False)
+
+async def _flag_conversations(documents: List[dict]):
+    pairs = set()
+    for document in documents:
+        # A bucket holds a single conversation
+        message = document["messages"][0] if "messages" in document else document
+        pairs.add((message["sender_email"], message["receiver_email"]))
+        pairs.add((message["receiver_email"], message["sender_email"]))
+    if pairs:
+        await get_database().conversations.bulk_write([
+            UpdateOne({"owner_email": owner, "other_email": other}, {"$set": {"history_archived": True}})
+            for owner, other in pairs
+        ], ordered=False)
+
+def archive_policies() -> List[ArchivePolicy]:
+    chat = ArchivePolicy(
+        "messages",
+        lambda horizon: _older_than("created_at", horizon),
+        chat_horizon,
+        _flag_conversations
+    )
+    if message_buckets.buckets_enabled():
+        # A bucket past the horizon can no longer receive messages, so it moves whole. Buckets
+        # packed by the bucket_messages migration have _ids from when it ran, so no _id bound
+        chat = ArchivePolicy(
+            "message_buckets",
+            lambda horizon: {"end_at": {"$lt": horizon}},
+            chat_horizon,
+            _flag_conversations
+        )
+    return [
+        ArchivePolicy(
+            "notifications",
+            lambda horizon: {**_older_than("created_at", horizon), "read": True},
+            notification_horizon,
+            _flag_notification_owners
+        ),
+        chat,
+    ]
+
+class Archiver:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _move_batch(self, policy: ArchivePolicy, query: dict) -> int:
+        db = get_database()
+        source = db[policy.collection]
+        documents = await source.find(query).sort("_id", 1).limit(settings.archive_batch_size).to_list(None)
+        if not documents:
+            return 0
+        try:
+            await db[archive_of(policy.collection)].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Already copied by an earlier run that stopped before deleting
+            if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+        # Before the hot copies go, so a read never misses documents only the archive has
+        await policy.flag_owners(documents)
+        ids = [document["_id"] for document in documents]
+        await source.delete_many({**query, "_id": {"$in": ids}})
+        archive_moved.inc(len(ids), collection=policy.collection)
+        return len(ids)
+
+    async def archive(self, policy: ArchivePolicy) -> int:
+        """Move up to archive_max_batches batches of one collection; returns documents moved"""
+        query = policy.query(policy.horizon())
+        moved = 0
+        for _ in range(settings.archive_max_batches):
+            count = await self._move_batch(policy, query)
+            moved += count
+            if count < settings.archive_batch_size:
+                break
+            await asyncio.sleep(0)  # let requests in between batches
+        return moved
+
+    async def run_once(self) -> dict:
+        started = time.perf_counter()
+        moved = {}
+        for policy in archive_policies():
+            try:
+                moved[policy.collection] = await self.archive(policy)
+            except Exception as e:
+                print(f"⚠️ Archiving {policy.collection} failed: {e}")
+        archive_run_duration.observe(time.perf_counter() - started)
+        if any(moved.values()):
+            print(f"Archived {', '.join(f'{count} {name}' for name, count in moved.items() if count)}")
+        return moved
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Archiver run failed: {e}")
+            await asyncio.sleep(settings.archive_interval_seconds)
+
+    def start(self):
+        if self._task is None and settings.archive_enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+archiver = Archiver()
\ No newline at end of file
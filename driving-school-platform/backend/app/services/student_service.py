@@ -1,5 +1,6 @@
 from app.db.mongo import get_database
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
+from app.services.identity_service import IdentityService
 from bson import ObjectId
 from datetime import datetime
 
@@ -7,11 +8,12 @@ class StudentService:
     @staticmethod
     async def create_student(student_data: dict):
         db = get_database()
-        student_data["password_hash"] = get_password_hash(student_data.pop("password"))
+        student_data["password_hash"] = await get_password_hash_async(student_data.pop("password"))
         student_data["created_at"] = datetime.utcnow()
         student_data["updated_at"] = datetime.utcnow()
         
         result = await db.students.insert_one(student_data)
+        await IdentityService.upsert_from_user(student_data, "student")
         return str(result.inserted_id)
     
     @staticmethod
@@ -28,4 +30,5 @@ class StudentService:
             {"_id": ObjectId(student_id)},
             {"$set": update_data}
         )
+        await IdentityService.sync_user_update(ObjectId(student_id), update_data)
         return await db.students.find_one({"_id": ObjectId(student_id)})
\ No newline at end of file
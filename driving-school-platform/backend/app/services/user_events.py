@@ -0,0 +1,109 @@
+"""Per-user event log behind the server-push stream (/events/stream, /events/ws).
+
+Every event gets the next number in its user's sequence, is stored in
+``user_events`` (kept for ``events_retention_seconds``) and pushed as a frame
+through the fan-out bus to the user's open connections:
+
+    {"type": "event", "id": "42", "event": "notification" | "lesson" | "booking", "data": {...}}
+
+A client that reconnects passes the last id it saw and is replayed what it
+missed from ``user_events`` before live frames resume; if those events have
+already expired it gets a ``reset`` event and should reload its lists.
+"""
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core import fanout
+from app.core.responses import dumps
+from app.db.mongo import get_database
+
+def event_frame(event: dict) -> str:
+    return dumps({
+        "type": "event",
+        "id": str(event["seq"]),
+        "event": event["type"],
+        "data": event["data"]
+    }).decode()
+
+def frame_seq(frame: str) -> Optional[int]:
+    """Sequence number of an event frame, None for any other frame (chat, pings)"""
+    if not frame.startswith('{"type":"event"'):
+        return None
+    return int(json.loads(frame)["id"])
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+class UserEvents:
+    @staticmethod
+    async def _allocate(counts: Dict[str, int]) -> Dict[str, int]:
+        """Reserve ``count`` sequence numbers per user; returns the first of each range"""
+        db = get_database()
+        first = {}
+        for user_email, count in counts.items():
+            sequence = await db.user_event_sequences.find_one_and_update(
+                {"_id": user_email},
+                {"$inc": {"seq": count}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            first[user_email] = sequence["seq"] - count + 1
+        return first
+
+    @staticmethod
+    async def publish(events: List[dict]) -> int:
+        """Store and push ``{"user_email", "type", "data"}`` events; returns how many were new.
+
+        An event may carry an ``_id`` (the outbox event's); publishing the same
+        ``_id`` again is a no-op, so a retried outbox event is not streamed twice.
+        """
+        db = get_database()
+        ids = [event["_id"] for event in events if "_id" in event]
+        if ids:
+            seen = {event["_id"] for event in await db.user_events.find({"_id": {"$in": ids}}, {"_id": 1}).to_list(None)}
+            events = [event for event in events if event.get("_id") not in seen]
+        if not events:
+            return 0
+
+        counts: Dict[str, int] = {}
+        for event in events:
+            counts[event["user_email"]] = counts.get(event["user_email"], 0) + 1
+        next_seq = await UserEvents._allocate(counts)
+
+        now = datetime.utcnow()
+        documents = []
+        for event in events:
+            documents.append({**event, "seq": next_seq[event["user_email"]], "created_at": now})
+            next_seq[event["user_email"]] += 1
+        await db.user_events.insert_many(documents, ordered=False)
+
+        for document in documents:
+            try:
+                await fanout.publish(document["user_email"], event_frame(document), channel="events")
+            except Exception as e:
+                print(f"WebSocket error: {e}")
+        return len(documents)
+
+    @staticmethod
+    async def replay(user_email: str, after_seq: int) -> Tuple[List[dict], bool]:
+        """Events after ``after_seq``, oldest first, and whether some were lost.
+
+        Lost means the ones right after ``after_seq`` already expired (or were
+        never stored), or more are missing than ``events_replay_limit``; the
+        client should then reload instead of applying them.
+        """
+        db = get_database()
+        events = await db.user_events.find(
+            {"user_email": user_email, "seq": {"$gt": after_seq}}
+        ).sort("seq", 1).limit(settings.events_replay_limit + 1).to_list(None)
+        if len(events) > settings.events_replay_limit:
+            return [], True
+        if events:
+            return events, events[0]["seq"] != after_seq + 1
+        sequence = await db.user_event_sequences.find_one({"_id": user_email})
+        return [], bool(sequence) and sequence["seq"] > after_seq
\ No newline at end of file
@@ -1,27 +1,496 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import List
+"""Outgoing email.
+
+``EmailSender.send_email`` resolves once the message has been delivered or
+given up on (``deliver`` does the same and says why it was given up on). With ``EMAIL_BACKEND=console`` it is only printed (development);
+with ``smtp`` it goes through a delivery pipeline:
+
+* digests: emails to the same recipient queued within
+  ``email_digest_window_ms`` of each other go out as one message (up to
+  ``email_digest_max`` per message);
+* pool: ``email_pool_size`` workers each keep a persistent SMTP connection and
+  send up to ``email_pipeline_depth`` queued messages per batch. When the
+  server supports PIPELINING (RFC 2920) a message's end of data goes out with
+  the next one's MAIL/RCPT/DATA, so each message costs one round trip;
+* retries: messages refused with a 4xx reply or lost with their connection
+  are retried with exponential backoff up to ``email_max_attempts``; 5xx
+  replies are final.
+
+Addresses are checked before anything is queued (``envelope_address``), since
+they are written into the MAIL FROM and RCPT TO commands as is.
+
+``python -m tools.smtp_stand_in`` runs a local server to point it at.
+"""
+import asyncio
+import base64
+import ssl
+import time
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import formatdate, make_msgid, parseaddr
+from typing import Dict, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.metrics import (
+    email_batch_duration,
+    email_batch_size,
+    email_digested,
+    email_failed,
+    email_queue_depth,
+    email_retries,
+    email_sent
+)
+
+BACKENDS = ("console", "smtp")
+
+# Bodies are encoded to 7 bits so no server needs 8BITMIME
+MESSAGE_POLICY = SMTP_POLICY.clone(cte_type="7bit")
+# Longest line SMTP allows, without the CRLF (RFC 5321)
+MAX_LINE_LENGTH = 998
+
+class SMTPError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+
+class InvalidAddress(SMTPError):
+    """An address refused before queueing; final, as the server's 501 reply would be"""
+
+    def __init__(self, address: str):
+        super().__init__(501, f"Invalid address {address!r}")
+
+def envelope_address(address: str) -> str:
+    """The bare address for MAIL FROM/RCPT TO, from ``user@host`` or ``Name <user@host>``.
+
+    Anything else raises InvalidAddress: a CR/LF or stray angle bracket would
+    end the command early and let the rest be read as new SMTP commands.
+    """
+    if "\r" in address or "\n" in address:
+        raise InvalidAddress(address)
+    _, addr = parseaddr(address)
+    text = address.strip()
+    # parseaddr drops what it can't parse, so the input must be exactly what it found
+    well_formed = text == addr or (text.endswith(f"<{addr}>") and text.count("<") == 1)
+    if not well_formed or "@" not in addr or any(char.isspace() or char in "<>" for char in addr):
+        raise InvalidAddress(address)
+    return addr
+
+def is_transient(error: Exception) -> bool:
+    """4xx replies and connection failures are worth retrying, 5xx replies are not"""
+    return not isinstance(error, SMTPError) or error.code < 500
+
+def _frame(lines: List[bytes]) -> bytes:
+    # CRLF lines, dot-stuffed, ending with the lone dot
+    return b"".join((b"." + line if line.startswith(b".") else line) + b"\r\n" for line in lines) + b".\r\n"
+
+def render_message(sender: str, recipient: str, subject: str, body: str) -> bytes:
+    """The DATA payload of a plain-text email.
+
+    Plain ASCII text, which is what notifications are, is written out
+    directly; anything else is encoded by the email package, which costs
+    over a millisecond per message on the event loop.
+    """
+    headers = [
+        f"From: {sender}",
+        f"To: {recipient}",
+        f"Subject: {subject}",
+        f"Date: {formatdate(usegmt=True)}",
+        f"Message-ID: {make_msgid(domain=sender.partition('@')[2] or None)}",
+    ]
+    lines = body.splitlines()
+    if (
+        subject.isascii() and body.isascii()
+        and "\n" not in subject and "\r" not in subject
+        and all(len(line) <= MAX_LINE_LENGTH for line in headers + lines)
+    ):
+        headers += ["MIME-Version: 1.0", 'Content-Type: text/plain; charset="us-ascii"', "Content-Transfer-Encoding: 7bit"]
+        return _frame([line.encode() for line in headers + [""] + lines])
+
+    message = EmailMessage(policy=MESSAGE_POLICY)
+    for header in headers:
+        name, _, value = header.partition(": ")
+        message[name] = value
+    message.set_content(body)
+    lines = message.as_bytes(policy=MESSAGE_POLICY).split(b"\r\n")
+    if lines and lines[-1] == b"":
+        lines.pop()
+    return _frame(lines)
+
+class SMTPConnection:
+    """One ESMTP client connection over asyncio streams"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        timeout: float = 30.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.extensions: Dict[str, str] = {}
+        self.sent = 0
+        self.last_used = 0.0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _reply(self) -> Tuple[int, str]:
+        lines = []
+        while True:
+            line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError("SMTP server closed the connection")
+            text = line.decode("utf-8", "replace").rstrip("\r\n")
+            lines.append(text[4:])
+            if text[3:4] != "-":
+                try:
+                    return int(text[:3]), "\n".join(lines)
+                except ValueError:
+                    raise ConnectionError(f"Malformed SMTP reply: {text!r}")
+
+    async def _command(self, line: str, expected: Tuple[int, ...] = (250,)) -> str:
+        self._writer.write(line.encode() + b"\r\n")
+        await self._writer.drain()
+        code, message = await self._reply()
+        if code not in expected:
+            raise SMTPError(code, message)
+        return message
+
+    async def _ehlo(self):
+        message = await self._command("EHLO localhost")
+        self.extensions = {}
+        for line in message.split("\n")[1:]:
+            keyword, _, params = line.partition(" ")
+            self.extensions[keyword.upper()] = params
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        code, message = await self._reply()
+        if code != 220:
+            raise SMTPError(code, message)
+        await self._ehlo()
+        if self.starttls and "STARTTLS" in self.extensions:
+            await self._command("STARTTLS", (220,))
+            await self._writer.start_tls(ssl.create_default_context(), server_hostname=self.host)
+            await self._ehlo()
+        if self.username:
+            credentials = base64.b64encode(f"\0{self.username}\0{self.password or ''}".encode()).decode()
+            await self._command(f"AUTH PLAIN {credentials}", (235,))
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        try:
+            if not writer.is_closing():
+                writer.write(b"QUIT\r\n")
+                await asyncio.wait_for(writer.drain(), 1)
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), 1)
+        except Exception:
+            pass
+
+    @staticmethod
+    def _envelope(sender: str, recipient: str) -> bytes:
+        return f"MAIL FROM:<{sender}>\r\nRCPT TO:<{recipient}>\r\nDATA\r\n".encode()
+
+    async def _envelope_result(self) -> Optional[SMTPError]:
+        """Read the MAIL, RCPT and DATA replies: the first refusal, or None once DATA is accepted"""
+        error = None
+        for expected in ((250,), (250, 251), (354,)):
+            code, message = await self._reply()
+            if code not in expected and error is None:
+                error = SMTPError(code, message)
+        return error
+
+    async def _send_one(self, sender: str, recipient: str, data: bytes) -> Optional[SMTPError]:
+        try:
+            await self._command(f"MAIL FROM:<{sender}>")
+            await self._command(f"RCPT TO:<{recipient}>", (250, 251))
+            await self._command("DATA", (354,))
+        except SMTPError as e:
+            await self._command("RSET")
+            return e
+        self._writer.write(data)
+        await self._writer.drain()
+        code, message = await self._reply()
+        return None if code == 250 else SMTPError(code, message)
+
+    async def _send_pipelined(self, messages: List[Tuple[str, str, bytes]], results: List[Optional[SMTPError]]):
+        self._writer.write(self._envelope(*messages[0][:2]))
+        await self._writer.drain()
+        refused = await self._envelope_result()
+        for index, (_, _, data) in enumerate(messages):
+            following = messages[index + 1] if index + 1 < len(messages) else None
+            # A refused transaction is reset instead of sent; either way the next envelope rides along
+            payload = data if refused is None else b"RSET\r\n"
+            if following:
+                payload += self._envelope(*following[:2])
+            self._writer.write(payload)
+            await self._writer.drain()
+            code, message = await self._reply()
+            if refused is None:
+                results.append(None if code == 250 else SMTPError(code, message))
+            else:
+                results.append(refused)
+            if following:
+                refused = await self._envelope_result()
+
+    async def send_many(self, messages: List[Tuple[str, str, bytes]], results: List[Optional[SMTPError]]):
+        """Send ``(sender, recipient, data)`` messages, appending an error or None per message to ``results``.
+
+        ``results`` is filled as replies come in, so if the connection fails
+        part way the caller knows which messages the server already accepted.
+        """
+        if "PIPELINING" in self.extensions:
+            await self._send_pipelined(messages, results)
+        else:
+            for sender, recipient, data in messages:
+                results.append(await self._send_one(sender, recipient, data))
+        self.sent += len(messages)
+        self.last_used = time.monotonic()
+
+@dataclass
+class _Queued:
+    subject: str
+    body: str
+    future: asyncio.Future  # resolves to None once delivered, or the error it was given up on
+
+@dataclass(eq=False)
+class _Outgoing:
+    """One SMTP message to one recipient: a single email or a digest of several"""
+    sender: str
+    recipient: str
+    items: List[_Queued]
+    attempts: int = 0
+    data: bytes = field(default=b"", repr=False)
+    retry: Optional[asyncio.TimerHandle] = None
+
+    def build(self):
+        if len(self.items) == 1:
+            subject, body = self.items[0].subject, self.items[0].body
+        else:
+            subject = f"You have {len(self.items)} new notifications"
+            body = "\n\n".join(f"{item.subject}\n\n{item.body}" for item in self.items)
+        self.data = render_message(self.sender, self.recipient, subject, body)
+
+    def resolve(self, error: Optional[Exception] = None):
+        for item in self.items:
+            if not item.future.done():
+                item.future.set_result(error)
 
 class EmailSender:
-    def __init__(self, smtp_server: str = "localhost", smtp_port: int = 587):
-        self.smtp_server = smtp_server
-        self.smtp_port = smtp_port
-    
+    def __init__(self, smtp_server: Optional[str] = None, smtp_port: Optional[int] = None, backend: Optional[str] = None):
+        self.smtp_server = smtp_server or settings.smtp_host
+        self.smtp_port = smtp_port or settings.smtp_port
+        self.backend = backend or settings.email_backend
+        if self.backend not in BACKENDS:
+            raise ValueError(f"email_backend must be one of {', '.join(BACKENDS)}")
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._outgoing: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[_Outgoing] = set()
+        self.connections_opened = 0
+
     async def send_email(
         self,
         to_emails: List[str],
         subject: str,
         body: str,
-        from_email: str = "noreply@drivingschool.com"
+        from_email: Optional[str] = None
     ) -> bool:
+        """Deliver to every recipient; True only if all of them got it"""
+        return await self.deliver(to_emails, subject, body, from_email) is None
+
+    async def deliver(
+        self,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        from_email: Optional[str] = None
+    ) -> Optional[Exception]:
+        """Deliver to every recipient; None if all of them got it, else the first error given up on.
+
+        Use ``is_transient`` on the error to tell a refusal (5xx) from
+        something worth trying again later. An invalid sender or recipient
+        refuses the whole email with InvalidAddress before anything is sent.
+        """
         try:
-            # Mock email sending for now
+            sender = envelope_address(from_email or settings.email_from)
+            recipients = [envelope_address(recipient) for recipient in to_emails]
+        except InvalidAddress as e:
+            email_failed.inc(reason="invalid_address")
+            return e
+
+        if self.backend == "console":
             print(f"Mock Email Sent:")
-            print(f"To: {to_emails}")
+            print(f"To: {recipients}")
             print(f"Subject: {subject}")
             print(f"Body: {body}")
-            return True
+            return None
+
+        if not self._tasks:
+            self.start()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for recipient in recipients:
+            future = loop.create_future()
+            self._incoming.put_nowait((sender, recipient, _Queued(subject, body, future)))
+            futures.append(future)
+        errors = await asyncio.gather(*futures)
+        # A refusal is final for the whole email, so report it before anything transient
+        errors = [error for error in errors if error is not None]
+        errors.sort(key=is_transient)
+        return errors[0] if errors else None
+
+    def _enqueue(self, outgoing: _Outgoing):
+        self._outgoing.put_nowait(outgoing)
+        email_queue_depth.set(self._outgoing.qsize())
+
+    def _group(self, batch: List[Tuple[str, str, _Queued]]):
+        """Turn queued emails into one message per recipient (and sender), digesting repeats"""
+        grouped: Dict[Tuple[str, str], List[_Queued]] = {}
+        for sender, recipient, item in batch:
+            grouped.setdefault((sender, recipient), []).append(item)
+        for (sender, recipient), items in grouped.items():
+            for start in range(0, len(items), settings.email_digest_max):
+                outgoing = _Outgoing(sender, recipient, items[start:start + settings.email_digest_max])
+                outgoing.build()
+                email_digested.inc(len(outgoing.items) - 1)
+                self._enqueue(outgoing)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._incoming.get()]
+            deadline = loop.time() + settings.email_digest_window_ms / 1000
+            while True:
+                if not self._incoming.empty():
+                    batch.append(self._incoming.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._incoming.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._group(batch)
+
+    def _retry_later(self, outgoing: _Outgoing):
+        email_retries.inc()
+        delay = settings.email_retry_base_seconds * 2 ** (outgoing.attempts - 1)
+        outgoing.retry = asyncio.get_running_loop().call_later(delay, self._requeue, outgoing)
+        self._retries.add(outgoing)
+
+    def _requeue(self, outgoing: _Outgoing):
+        self._retries.discard(outgoing)
+        outgoing.retry = None
+        self._enqueue(outgoing)
+
+    async def _deliver(self, connection: SMTPConnection, batch: List[_Outgoing]):
+        started = time.perf_counter()
+        results: List[Optional[Exception]] = []
+        try:
+            stale = time.monotonic() - connection.last_used > settings.email_idle_seconds
+            if not connection.connected or stale or connection.sent >= settings.email_max_messages_per_connection:
+                await connection.close()
+                await connection.connect()
+                self.connections_opened += 1
+            await connection.send_many([(o.sender, o.recipient, o.data) for o in batch], results)
         except Exception as e:
             print(f"Email sending failed: {e}")
-            return False
\ No newline at end of file
+            # The transaction state is unknown now, so start over on a new connection
+            await connection.close()
+            results.extend([e] * (len(batch) - len(results)))
+        email_batch_size.observe(len(batch))
+        email_batch_duration.observe(time.perf_counter() - started)
+
+        for outgoing, error in zip(batch, results):
+            if error is None:
+                email_sent.inc()
+                outgoing.resolve()
+                continue
+            outgoing.attempts += 1
+            if is_transient(error) and outgoing.attempts < settings.email_max_attempts:
+                self._retry_later(outgoing)
+            else:
+                email_failed.inc(reason="refused" if isinstance(error, SMTPError) else "connection")
+                outgoing.resolve(error)
+
+    async def _work(self):
+        connection = SMTPConnection(
+            self.smtp_server,
+            self.smtp_port,
+            settings.smtp_username,
+            settings.smtp_password,
+            settings.smtp_starttls,
+            settings.smtp_timeout_seconds
+        )
+        try:
+            while True:
+                batch = [await self._outgoing.get()]
+                while len(batch) < settings.email_pipeline_depth and not self._outgoing.empty():
+                    batch.append(self._outgoing.get_nowait())
+                email_queue_depth.set(self._outgoing.qsize())
+                try:
+                    await self._deliver(connection, batch)
+                finally:
+                    for _ in batch:
+                        self._outgoing.task_done()
+        finally:
+            await connection.close()
+
+    def start(self):
+        if self.backend != "smtp" or self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._collect())]
+        self._tasks.extend(asyncio.create_task(self._work()) for _ in range(settings.email_pool_size))
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Send what is already queued (for up to ``timeout`` seconds), then close the pool.
+
+        Emails waiting for a retry are given up on.
+        """
+        if not self._tasks:
+            return
+        collector, workers = self._tasks[0], self._tasks[1:]
+        collector.cancel()
+        batch = []
+        while not self._incoming.empty():
+            batch.append(self._incoming.get_nowait())
+        if batch:
+            self._group(batch)
+        try:
+            await asyncio.wait_for(self._outgoing.join(), timeout or settings.smtp_timeout_seconds)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {self._outgoing.qsize()} emails still queued at shutdown")
+
+        stopped = ConnectionError("Email sender stopped")
+        for outgoing in self._retries:
+            outgoing.retry.cancel()
+            outgoing.resolve(stopped)
+        self._retries = set()
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while not self._outgoing.empty():
+            self._outgoing.get_nowait().resolve(stopped)
+            self._outgoing.task_done()
+        self._tasks = []
+
+email_sender = EmailSender()
\ No newline at end of file
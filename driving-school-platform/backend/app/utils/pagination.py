@@ -0,0 +1,126 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by a sort field with ``_id`` as tiebreak, so each page is a
+range scan on a ``(filter..., sort_field, _id)`` index instead of a skip. The
+cursor is an opaque token holding the last item's sort key; list bodies stay
+plain arrays and the next cursor is returned in the ``X-Next-Cursor`` header
+(absent on the last page).
+"""
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+from bson import json_util
+from fastapi import HTTPException, Query, Response
+from pymongo import DESCENDING
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    payload = json_util.dumps({"k": sort_field, "v": doc.get(sort_field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        decoded = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(decoded, dict) or not {"k", "v", "id"} <= decoded.keys():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return decoded
+
+class PageParams:
+    """``cursor``/``limit`` query parameters; use as ``page: PageParams = Depends()``"""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+    ):
+        self.limit = limit
+        self.after = decode_cursor(cursor) if cursor else None
+
+@dataclass
+class Page:
+    items: List[dict]
+    next_cursor: Optional[str]
+
+def keyset_query(query: dict, after: Optional[dict], sort_field: str, direction: int) -> dict:
+    """Restrict ``query`` to the documents that sort after the cursor position"""
+    if after is None:
+        return query
+    if after["k"] != sort_field:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this listing")
+
+    op = "$lt" if direction == DESCENDING else "$gt"
+    value, last_id = after["v"], after["id"]
+    if sort_field == "_id":
+        position = {"_id": {op: last_id}}
+    elif value is None:
+        # Missing/null keys sort lowest and comparison operators never match null
+        position = {"$or": [{sort_field: None, "_id": {op: last_id}}]}
+        if direction != DESCENDING:
+            position["$or"].append({sort_field: {"$ne": None}})
+    else:
+        position = {"$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "_id": {op: last_id}}
+        ]}
+        if direction == DESCENDING:
+            # Missing/null keys sort last going down and "$lt" never matches them
+            position["$or"].append({sort_field: None})
+    return {"$and": [query, position]} if query else position
+
+async def fetch_page(
+    find: Callable[[dict], Any],
+    query: dict,
+    page: PageParams,
+    sort_field: str = "_id",
+    direction: int = DESCENDING
+) -> Page:
+    """Fetch one page with ``find(query)`` (a collection's or repository's find)"""
+    sort = [(sort_field, direction)]
+    if sort_field != "_id":
+        sort.append(("_id", direction))
+
+    cursor = find(keyset_query(query, page.after, sort_field, direction)).sort(sort).limit(page.limit + 1)
+    items = await cursor.to_list(None)
+
+    next_cursor = None
+    if len(items) > page.limit:
+        items = items[:page.limit]
+        next_cursor = encode_cursor(items[-1], sort_field)
+    return Page(items, next_cursor)
+
+def merge_pages(pages: List[Page], limit: int, sort_field: str = "_id", direction: int = DESCENDING) -> Page:
+    """Combine pages of one listing read with the same cursor from several collections.
+
+    Used for a hot collection and its archive; a document found in both, as
+    while it is being moved, is listed once.
+    """
+    items = {}
+    for page in pages:
+        for item in page.items:
+            items.setdefault(item["_id"], item)
+
+    def sort_key(item: dict):
+        if sort_field == "_id":
+            return item["_id"]
+        # Missing/null keys sort lowest, as in MongoDB
+        value = item.get(sort_field)
+        return (value is not None, value, item["_id"])
+
+    merged = sorted(items.values(), key=sort_key, reverse=direction == DESCENDING)
+
+    next_cursor = None
+    if len(merged) > limit or (merged and any(page.next_cursor for page in pages)):
+        merged = merged[:limit]
+        next_cursor = encode_cursor(merged[-1], sort_field)
+    return Page(merged, next_cursor)
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
\ No newline at end of file
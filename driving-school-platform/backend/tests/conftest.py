@@ -0,0 +1,84 @@
+"""Fixtures for tests that talk to a real MongoDB.
+
+Query counts come from pymongo's command events, which in-memory doubles do
+not emit, so these tests run against a scratch ``mongod`` (or the server in
+TEST_MONGODB_URL) and are skipped when neither is available.
+"""
+import asyncio
+import os
+from contextlib import AsyncExitStack
+import pytest
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from app.api.v1.dependencies import _principal_cache
+from app.core.config import settings
+from app.core.query_budget import budget_for, query_count_observers
+from app.core.security import create_access_token
+from app.main import app
+from app.services.identity_service import IdentityService
+from tools.scratch import ScratchDatabaseUnavailable, scratch_database
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # One loop for the session so the scratch database's Motor client outlives single tests
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest_asyncio.fixture(scope="session")
+async def scratch_db():
+    async with AsyncExitStack() as stack:
+        try:
+            database = await stack.enter_async_context(scratch_database(os.environ.get("TEST_MONGODB_URL"), prefix="tests"))
+        except ScratchDatabaseUnavailable as error:
+            pytest.skip(f"No MongoDB for query-count tests: {error}")
+        yield database
+
+@pytest_asyncio.fixture
+async def db(scratch_db):
+    yield scratch_db
+    for name in await scratch_db.list_collection_names():
+        await scratch_db.drop_collection(name)
+    _principal_cache.clear()
+
+@pytest_asyncio.fixture
+async def client(db):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+def auth_headers():
+    def headers(email, user_type, user_id, school_id=None, school_status=None):
+        principal = {
+            "email": email,
+            "user_type": user_type,
+            "user_id": user_id,
+            "school_id": str(school_id) if school_id else None,
+            "school_status": school_status
+        }
+        return {"Authorization": f"Bearer {create_access_token(IdentityService.principal_claims(principal))}"}
+    return headers
+
+@pytest.fixture
+def query_counts(monkeypatch):
+    """(method, route, count) for each request the test makes, checked against the route budgets.
+
+    Strict mode makes an over-budget request fail before its response is
+    sent; the check on teardown also covers streamed responses.
+    """
+    monkeypatch.setattr(settings, "query_budget_strict", True)
+    counts = []
+
+    def record(method, route, count):
+        counts.append((method, route, count))
+
+    query_count_observers.append(record)
+    yield counts
+    query_count_observers.remove(record)
+
+    over_budget = [
+        f"{method} {route}: {count} queries (budget {budget_for(method, route)})"
+        for method, route, count in counts
+        if count > budget_for(method, route)
+    ]
+    assert not over_budget, "Query budget exceeded:\n" + "\n".join(over_budget)
\ No newline at end of file
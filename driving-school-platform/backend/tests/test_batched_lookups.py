@@ -0,0 +1,88 @@
+"""Routes that resolve related users per row issue the same queries for 1 row as for many"""
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from app.api.v1.routes import schools
+from app.core.middleware import QueryBudgetMiddleware
+
+MANY = 5  # /lessons/upcoming returns at most five lessons
+
+# The schools router is not mounted in app.main; serve it the same way here
+schools_app = FastAPI()
+schools_app.add_middleware(QueryBudgetMiddleware)
+schools_app.include_router(schools.router, prefix="/api/v1/schools")
+
+async def seed_users(db, collection, count):
+    users = [
+        {
+            "_id": ObjectId(),
+            "email": f"{collection}{i}-{ObjectId()}@example.com",
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "phone": f"555-{i:04d}"
+        }
+        for i in range(count)
+    ]
+    await db[collection].insert_many(users)
+    return users
+
+async def seed_lessons(db, count, student=None, instructor=None):
+    """``count`` future lessons, each with a different counterpart"""
+    students = [student] * count if student else await seed_users(db, "students", count)
+    instructors = [instructor] * count if instructor else await seed_users(db, "instructors", count)
+    await db.lessons.insert_many([
+        {
+            "student_id": students[i]["_id"],
+            "instructor_id": instructors[i]["_id"],
+            "scheduled_date": datetime.utcnow() + timedelta(days=i + 1),
+            "status": "scheduled"
+        }
+        for i in range(count)
+    ])
+
+async def upcoming_lessons(db, client, auth_headers, count):
+    [student] = await seed_users(db, "students", 1)
+    await seed_lessons(db, count, student=student)
+    return await client.get("/api/v1/lessons/upcoming", headers=auth_headers(student["email"], "student", student["_id"]))
+
+async def pending_lessons(db, client, auth_headers, count):
+    [instructor] = await seed_users(db, "instructors", 1)
+    await seed_lessons(db, count, instructor=instructor)
+    return await client.get("/api/v1/instructor/pending-lessons", headers=auth_headers(instructor["email"], "instructor", instructor["_id"]))
+
+async def instructor_ratings(db, client, auth_headers, count):
+    [instructor] = await seed_users(db, "instructors", 1)
+    students = await seed_users(db, "students", count)
+    await db.ratings.insert_many([
+        {"student_id": student["_id"], "instructor_id": instructor["_id"], "rating": 5, "created_at": datetime.utcnow()}
+        for student in students
+    ])
+    return await client.get(f"/api/v1/ratings/instructor/{instructor['_id']}")
+
+async def school_requests(db, client, auth_headers, count):
+    [instructor] = await seed_users(db, "instructors", 1)
+    school_id = ObjectId()
+    await db.schools.insert_one({"_id": school_id, "name": "Test School", "instructor_ids": [str(instructor["_id"])]})
+    students = await seed_users(db, "students", count)
+    await db.school_requests.insert_many([
+        {"school_id": school_id, "student_id": student["_id"], "status": "pending", "created_at": datetime.utcnow()}
+        for student in students
+    ])
+    async with AsyncClient(transport=ASGITransport(app=schools_app), base_url="http://test") as schools_client:
+        return await schools_client.get(
+            f"/api/v1/schools/{school_id}/requests",
+            headers=auth_headers(instructor["email"], "instructor", instructor["_id"])
+        )
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("request_rows", [upcoming_lessons, pending_lessons, instructor_ratings, school_requests])
+async def test_query_count_does_not_grow_with_rows(db, client, auth_headers, query_counts, request_rows):
+    one = await request_rows(db, client, auth_headers, 1)
+    many = await request_rows(db, client, auth_headers, MANY)
+
+    assert one.status_code == many.status_code == 200
+    assert (len(one.json()), len(many.json())) == (1, MANY)
+    (_, _, one_count), (_, _, many_count) = query_counts
+    assert one_count == many_count
\ No newline at end of file
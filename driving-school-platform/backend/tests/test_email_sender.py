@@ -0,0 +1,138 @@
+"""EmailSender against the in-memory SMTP stand-in"""
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from app.core.config import settings
+from app.utils.email_sender import EmailSender, InvalidAddress, SMTPError, envelope_address, is_transient
+from tools.smtp_stand_in import StandInSMTPServer
+
+@pytest.fixture(autouse=True)
+def email_settings(monkeypatch):
+    overrides = {
+        "smtp_starttls": False,
+        "smtp_username": None,
+        "email_pool_size": 1,
+        "email_pipeline_depth": 10,
+        "email_digest_window_ms": 20,
+        "email_max_attempts": 3,
+        "email_retry_base_seconds": 0.01,
+        "email_max_messages_per_connection": 100,
+    }
+    for name, value in overrides.items():
+        monkeypatch.setattr(settings, name, value)
+
+@pytest_asyncio.fixture
+async def servers():
+    """Starts a stand-in with the given options and an EmailSender pointed at it"""
+    started = []
+
+    async def start(**options):
+        server = StandInSMTPServer(**options)
+        await server.start()
+        sender = EmailSender("127.0.0.1", server.port, backend="smtp")
+        started.append((server, sender))
+        return server, sender
+
+    yield start
+    for server, sender in started:
+        await sender.stop()
+        await server.stop()
+
+@pytest.mark.asyncio
+async def test_pipelined_delivery(servers):
+    latency = 0.05
+    server, sender = await servers(latency=latency)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        sender.send_email([f"user{i}@example.com"], f"Lesson {i}", f"Lesson {i} was booked.") for i in range(10)
+    ))
+    elapsed = time.perf_counter() - started
+
+    assert all(results)
+    assert sorted(recipients[0] for _, recipients, _ in server.messages) == sorted(f"user{i}@example.com" for i in range(10))
+    assert server.connections == 1
+    # One round trip per message (plus greeting, EHLO and the first envelope) instead of four
+    assert elapsed < 25 * latency
+
+@pytest.mark.asyncio
+async def test_emails_to_one_recipient_are_digested(servers):
+    server, sender = await servers()
+
+    results = await asyncio.gather(*(
+        sender.send_email(["student@example.com"], f"Lesson {i}", f"Lesson {i} was booked.") for i in range(3)
+    ))
+
+    assert results == [True, True, True]
+    assert len(server.messages) == 1
+    _, recipients, data = server.messages[0]
+    assert recipients == ["student@example.com"]
+    assert b"Subject: You have 3 new notifications" in data
+    assert all(f"Lesson {i} was booked.".encode() in data for i in range(3))
+
+@pytest.mark.asyncio
+async def test_temporary_refusal_is_retried(servers):
+    server, sender = await servers(greylist=1)
+
+    assert await sender.deliver(["student@example.com"], "Lesson booked", "See you Monday.") is None
+    assert server.refusals == [("student@example.com", 451)]
+    assert len(server.messages) == 1
+
+@pytest.mark.asyncio
+async def test_permanent_refusal_is_final(servers):
+    server, sender = await servers(reject=["nobody@example.com"])
+
+    refused, delivered = await asyncio.gather(
+        sender.deliver(["nobody@example.com"], "Lesson booked", "See you Monday."),
+        sender.deliver(["student@example.com"], "Lesson booked", "See you Monday.")
+    )
+
+    assert isinstance(refused, SMTPError) and refused.code == 550
+    assert not is_transient(refused)
+    assert delivered is None
+    assert server.refusals == [("nobody@example.com", 550)]  # never retried
+    assert [recipients for _, recipients, _ in server.messages] == [["student@example.com"]]
+
+@pytest.mark.parametrize("address", [
+    "student@example.com>\r\nRCPT TO:<victim@example.com",
+    "student@example.com\nDATA",
+    "student@example.com> SIZE=1",
+    "<>",
+    "student@example.com, other@example.com",
+    "student",
+])
+def test_envelope_address_rejects_injection(address):
+    with pytest.raises(InvalidAddress):
+        envelope_address(address)
+
+def test_envelope_address_takes_the_bare_address():
+    assert envelope_address("Driving School <noreply@example.com>") == "noreply@example.com"
+    assert envelope_address(" student@example.com ") == "student@example.com"
+
+@pytest.mark.asyncio
+async def test_invalid_address_is_refused_before_sending(servers):
+    server, sender = await servers()
+
+    refused = await sender.deliver(
+        ["student@example.com", "student@example.com>\r\nRCPT TO:<victim@example.com"],
+        "Lesson booked",
+        "See you Monday."
+    )
+
+    assert isinstance(refused, InvalidAddress) and not is_transient(refused)
+    assert server.messages == [] and server.connections == 0
+
+@pytest.mark.asyncio
+async def test_reconnects_after_max_messages_per_connection(servers, monkeypatch):
+    monkeypatch.setattr(settings, "email_max_messages_per_connection", 3)
+    monkeypatch.setattr(settings, "email_pipeline_depth", 1)
+    server, sender = await servers()
+
+    results = await asyncio.gather(*(
+        sender.send_email([f"user{i}@example.com"], f"Lesson {i}", "Booked.") for i in range(7)
+    ))
+
+    assert all(results)
+    assert len(server.messages) == 7
+    assert server.connections == sender.connections_opened == 3
\ No newline at end of file
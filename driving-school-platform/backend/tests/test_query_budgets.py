@@ -0,0 +1,128 @@
+"""Per-request MongoDB query counts on the booking and notification paths"""
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from app.core.config import settings
+from app.core.query_budget import QueryBudgetExceeded
+from app.main import app
+
+async def seed_school(db):
+    school_id, student_id, instructor_id = ObjectId(), ObjectId(), ObjectId()
+    await db.schools.insert_one({"_id": school_id, "name": "Test School", "instructor_ids": [str(instructor_id)]})
+    await db.students.insert_one({
+        "_id": student_id,
+        "email": "student@example.com",
+        "first_name": "Sam",
+        "last_name": "Student",
+        "phone": "555-0100",
+        "school_id": school_id,
+        "school_status": "approved"
+    })
+    await db.instructors.insert_one({
+        "_id": instructor_id,
+        "email": "instructor@example.com",
+        "first_name": "Ida",
+        "last_name": "Instructor",
+        "phone": "555-0101",
+        "school_id": school_id
+    })
+    return school_id, student_id, instructor_id
+
+async def seed_notifications(db, user_email, count):
+    now = datetime.utcnow()
+    await db.notifications.insert_many([
+        {
+            "user_email": user_email,
+            "title": f"Notification {i}",
+            "message": "Lesson booked",
+            "notification_type": "lesson_booked",
+            "read": False,
+            "created_at": now - timedelta(minutes=i)
+        }
+        for i in range(count)
+    ])
+    await db.notification_counters.insert_one({"_id": user_email, "unread": count})
+
+@pytest.mark.asyncio
+async def test_lesson_booking_within_budget(db, client, auth_headers, query_counts):
+    school_id, student_id, instructor_id = await seed_school(db)
+    headers = auth_headers("student@example.com", "student", student_id, school_id, "approved")
+
+    response = await client.post("/api/v1/booking/lesson", headers=headers, json={
+        "instructor_id": str(instructor_id),
+        "scheduled_date": (datetime.utcnow() + timedelta(days=2)).isoformat(),
+        "message": "Motorway practice"
+    })
+
+    assert response.status_code == 200
+    assert await db.bookings.count_documents({}) == 1
+    assert await db.notification_outbox.count_documents({}) == 2
+    assert [route for _, route, _ in query_counts] == ["/api/v1/booking/lesson"]
+
+@pytest.mark.asyncio
+async def test_booking_requests_within_budget(db, client, auth_headers, query_counts):
+    school_id, student_id, instructor_id = await seed_school(db)
+    headers = auth_headers("student@example.com", "student", student_id, school_id, "approved")
+    for day in range(1, 6):
+        await client.post("/api/v1/booking/lesson", headers=headers, json={
+            "instructor_id": str(instructor_id),
+            "scheduled_date": (datetime.utcnow() + timedelta(days=day)).isoformat()
+        })
+
+    response = await client.get("/api/v1/booking/my-requests", headers=headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert len(query_counts) == 6
+
+@pytest.mark.asyncio
+async def test_notification_paths_within_budget(db, client, auth_headers, query_counts):
+    await seed_notifications(db, "student@example.com", 30)
+    headers = auth_headers("student@example.com", "student", ObjectId())
+
+    listing = await client.get("/api/v1/notifications/", headers=headers, params={"limit": 10})
+    unread = await client.get("/api/v1/notifications/unread-count", headers=headers)
+    marked = await client.put("/api/v1/notifications/read", headers=headers)
+
+    assert listing.status_code == 200 and len(listing.json()) == 10
+    assert unread.json() == {"unread_count": 30}
+    assert marked.json()["marked"] == 30
+    assert [route for _, route, _ in query_counts] == [
+        "/api/v1/notifications/",
+        "/api/v1/notifications/unread-count",
+        "/api/v1/notifications/read"
+    ]
+
+@pytest.mark.asyncio
+async def test_strict_mode_fails_request_before_responding(db, auth_headers, monkeypatch):
+    await seed_notifications(db, "student@example.com", 3)
+    monkeypatch.setattr(settings, "query_budget_strict", True)
+    monkeypatch.setattr(settings, "query_budgets", {"GET /api/v1/notifications/unread-count": 0})
+    authorization = auth_headers("student@example.com", "student", ObjectId())["Authorization"]
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/notifications/unread-count",
+        "raw_path": b"/api/v1/notifications/unread-count",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"test"), (b"authorization", authorization.encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80)
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    with pytest.raises(QueryBudgetExceeded):
+        await app(scope, receive, send)
+
+    # The handler's 200 was held back; only the error response went out
+    starts = [message for message in sent if message["type"] == "http.response.start"]
+    assert [start["status"] for start in starts] == [500]
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Write volume of marking a chat read: per-message flags vs. read watermarks.
+
+For conversations of increasing length, opens the chat twice (once with the
+whole history unread, once after a single new message) and reports how many
+documents each approach matches and rewrites and how long the write takes.
+
+    python -m tools.bench.chat_reads                      # starts a local mongod
+    python -m tools.bench.chat_reads --mongodb-url URL    # uses an existing server
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from app.db.indexes import ensure_indexes
+from app.db.migrations.rebuild_conversations import rebuild_conversations
+from app.db.mongo import get_database
+from tools.scratch import ScratchDatabaseUnavailable, scratch_database
+from app.services.chat_service import ChatService, conversation_key
+
+async def _seed_conversation(me: str, other: str, length: int):
+    db = get_database()
+    start = datetime.utcnow() - timedelta(seconds=length)
+    await db.messages.insert_many([
+        {
+            "conversation_key": conversation_key(me, other),
+            "sender_email": other,
+            "receiver_email": me,
+            "message": f"message {i}",
+            "message_type": "text",
+            "read": False,  # the legacy flag, so both approaches start from the same data
+            "created_at": start + timedelta(seconds=i)
+        }
+        for i in range(length)
+    ])
+
+async def _timed(write):
+    started = time.perf_counter()
+    result = await write()
+    return result, (time.perf_counter() - started) * 1000
+
+async def benchmark(lengths: List[int]) -> List[dict]:
+    db = get_database()
+    await ensure_indexes()
+    # The index the per-message update_many relied on
+    await db.messages.create_index([("sender_email", 1), ("receiver_email", 1)])
+
+    for length in lengths:
+        await _seed_conversation(f"reader{length}@example.com", f"writer{length}@example.com", length)
+    await rebuild_conversations()
+
+    results = []
+    for length in lengths:
+        me, other = f"reader{length}@example.com", f"writer{length}@example.com"
+
+        async def legacy_open():
+            result = await db.messages.update_many(
+                {"sender_email": other, "receiver_email": me},
+                {"$set": {"read": True}}
+            )
+            return f"{result.matched_count}/{result.modified_count}"
+
+        async def watermark_open():
+            return f"1/{await ChatService.mark_conversation_read(me, other, newest)}"
+
+        # The newest message the reader was served, which the watermark moves to
+        newest = (await ChatService.get_history(me, other, limit=1))[-1]
+        row = {"messages": length}
+        row["legacy_first"], row["legacy_first_ms"] = await _timed(legacy_open)
+        row["watermark_first"], row["watermark_first_ms"] = await _timed(watermark_open)
+
+        newest = await ChatService.create_message(other, me, "one more")
+        row["legacy_reopen"], row["legacy_reopen_ms"] = await _timed(legacy_open)
+        row["watermark_reopen"], row["watermark_reopen_ms"] = await _timed(watermark_open)
+        results.append(row)
+    return results
+
+def print_results(results: List[dict]):
+    print(f"{'messages':>9} | {'update_many matched/written (ms)':>38} | {'watermark matched/written (ms)':>38}")
+    print(f"{'':>9} | {'first open':>18} {'reopen':>19} | {'first open':>18} {'reopen':>19}")
+    for row in results:
+        print(
+            f"{row['messages']:>9} | "
+            f"{row['legacy_first']:>11} ({row['legacy_first_ms']:5.1f}) "
+            f"{row['legacy_reopen']:>11} ({row['legacy_reopen_ms']:5.1f}) | "
+            f"{row['watermark_first']:>11} ({row['watermark_first_ms']:5.1f}) "
+            f"{row['watermark_reopen']:>11} ({row['watermark_reopen_ms']:5.1f})"
+        )
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-url", help="use this server instead of starting a local mongod")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    args = parser.parse_args(argv)
+
+    try:
+        async with scratch_database(args.mongodb_url, prefix="chat_read_benchmark"):
+            print_results(await benchmark(args.lengths))
+    except ScratchDatabaseUnavailable as e:
+        print(e)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""Chat storage layouts compared: one document per message vs. message buckets.
+
+Seeds ``--conversations`` conversations of ``--length`` messages, packs them
+into buckets with the migration, then reports for each layout the index and
+data size, the latency of history pages (latest page and paging back from
+random anchors) and insert throughput through ``ChatService.insert_messages``.
+
+    python -m tools.bench.chat_storage                      # starts a local mongod
+    python -m tools.bench.chat_storage --mongodb-url URL    # uses an existing server
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from app.core.config import settings
+from app.db.indexes import ensure_indexes
+from app.db.migrations.bucket_messages import bucket_messages
+from app.db.mongo import get_database
+from tools.scratch import ScratchDatabaseUnavailable, scratch_database
+from app.services.chat_service import ChatService, conversation_key, new_message
+
+LAYOUTS = {"messages": "messages", "buckets": "message_buckets"}
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+def _participants(index: int):
+    return f"student{index}@example.com", f"instructor{index}@example.com"
+
+async def _seed(conversations: int, length: int):
+    db = get_database()
+    start = datetime.utcnow() - timedelta(minutes=length)
+    for index in range(conversations):
+        student, instructor = _participants(index)
+        batch = []
+        for i in range(length):
+            sender, receiver = (student, instructor) if i % 2 else (instructor, student)
+            message = new_message(sender, receiver, f"message {i} " + "x" * 40)
+            message["created_at"] = start + timedelta(minutes=i)
+            batch.append(message)
+        await db.messages.insert_many(batch)
+    await bucket_messages()
+
+async def _sizes() -> dict:
+    db = get_database()
+    sizes = {}
+    for layout, collection in LAYOUTS.items():
+        stats = await db.command("collStats", collection)
+        sizes[layout] = {
+            "documents": stats["count"],
+            "data_kb": stats["size"] / 1024,
+            "index_kb": stats["totalIndexSize"] / 1024
+        }
+    return sizes
+
+async def _history_latency(conversations: int, pages: int, limit: int) -> List[float]:
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(pages):
+        student, instructor = _participants(rng.randrange(conversations))
+        started = time.perf_counter()
+        page = await ChatService.get_history(student, instructor, limit=limit)
+        # Page back twice from the oldest message held, as scrolling up does
+        for _ in range(2):
+            if not page:
+                break
+            anchor = await ChatService.get_anchor(conversation_key(student, instructor), page[0]["_id"])
+            page = await ChatService.get_history(student, instructor, before=anchor, limit=limit)
+        latencies.append((time.perf_counter() - started) / 3)
+    return latencies
+
+async def _insert_throughput(layout: str, messages: int, batch_size: int, senders: int) -> float:
+    rng = random.Random(11)
+    batch = []
+    started = time.perf_counter()
+    for i in range(messages):
+        student, instructor = _participants(rng.randrange(senders))
+        batch.append(new_message(student, f"{layout}-{instructor}", f"live {i}"))
+        if len(batch) >= batch_size:
+            await ChatService.insert_messages(batch)
+            batch = []
+    if batch:
+        await ChatService.insert_messages(batch)
+    return messages / (time.perf_counter() - started)
+
+async def benchmark(conversations: int, length: int, pages: int, limit: int, inserts: int, batch_size: int) -> dict:
+    await ensure_indexes()
+    await _seed(conversations, length)
+
+    results = {"sizes": await _sizes()}
+    for layout in LAYOUTS:
+        settings.chat_storage_mode = layout
+        results[layout] = {
+            "history": await _history_latency(conversations, pages, limit),
+            "inserts_per_s": await _insert_throughput(layout, inserts, batch_size, conversations)
+        }
+    return results
+
+def print_results(results: dict):
+    print(f"{'layout':>9} | {'documents':>9} {'data KB':>9} {'index KB':>9} | {'page p50/p95 (ms)':>18} | {'inserts/s':>9}")
+    for layout in LAYOUTS:
+        size = results["sizes"][layout]
+        history = results[layout]["history"]
+        print(
+            f"{layout:>9} | {size['documents']:>9} {size['data_kb']:>9.0f} {size['index_kb']:>9.0f} | "
+            f"{_percentile(history, 50) * 1000:>8.2f}/{_percentile(history, 95) * 1000:<9.2f} | "
+            f"{results[layout]['inserts_per_s']:>9.0f}"
+        )
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-url", help="use this server instead of starting a local mongod")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--length", type=int, default=2000)
+    parser.add_argument("--pages", type=int, default=200, help="history walks timed per layout")
+    parser.add_argument("--limit", type=int, default=50, help="messages per history page")
+    parser.add_argument("--inserts", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=settings.chat_write_batch_size)
+    args = parser.parse_args(argv)
+
+    try:
+        async with scratch_database(args.mongodb_url, prefix="chat_storage_benchmark"):
+            print_results(await benchmark(
+                args.conversations, args.length, args.pages, args.limit, args.inserts, args.batch_size
+            ))
+    except ScratchDatabaseUnavailable as e:
+        print(e)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""Fan-out benchmark for ConnectionManager with thousands of simulated clients.
+
+Connects ``--clients`` fake WebSockets (two devices per user), a fraction of
+which write slowly, then sends ``--rounds`` messages to every user. Reports how
+long ``send_personal_message`` blocks the caller, delivery latency on the
+healthy clients, and what the overflow policy did to the slow ones. The old
+inline ``await send_text`` is then replayed for comparison on a sample of the
+users (same slow fraction) and rounds, since every slow write blocks it; its
+total is also projected to the full load.
+
+    python -m tools.bench.connections --clients 5000 --slow-fraction 0.02
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List
+from app.core.config import settings
+from app.core.connections import ConnectionManager
+from app.core.metrics import ws_messages_dropped
+
+class SimulatedWebSocket:
+    """Stands in for a client socket; records when each frame was written"""
+
+    def __init__(self, write_delay: float):
+        self.write_delay = write_delay
+        self.latencies: List[float] = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.write_delay:
+            await asyncio.sleep(self.write_delay)
+        else:
+            await asyncio.sleep(0)
+        if message.startswith("t="):
+            self.latencies.append(time.perf_counter() - float(message[2:]))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+async def run_queued(users: int, slow_users: int, rounds: int, slow_delay: float) -> dict:
+    manager = ConnectionManager()
+    sockets = {}
+    for user in range(users):
+        delay = slow_delay if user < slow_users else 0.0
+        sockets[user] = [SimulatedWebSocket(delay), SimulatedWebSocket(delay)]
+        for websocket in sockets[user]:
+            await manager.connect(websocket, f"user{user}@example.com")
+
+    dropped_before = ws_messages_dropped.value(policy=settings.ws_overflow_policy)
+    send_times = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for user in range(users):
+            sent = time.perf_counter()
+            await manager.send_personal_message(f"t={sent}", f"user{user}@example.com")
+            send_times.append(time.perf_counter() - sent)
+            # Each send stands for a separate request handler, so let the loop run in between
+            await asyncio.sleep(0)
+
+    # Wait for the healthy clients to drain
+    healthy = [websocket for user in range(slow_users, users) for websocket in sockets[user]]
+    while any(not websocket.closed and len(websocket.latencies) < rounds for websocket in healthy):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for websocket in healthy for latency in websocket.latencies]
+    slow = [websocket for user in range(slow_users) for websocket in sockets[user]]
+    result = {
+        "connections": users * 2,
+        "send_p50_us": _percentile(send_times, 50) * 1e6,
+        "send_p99_us": _percentile(send_times, 99) * 1e6,
+        "deliver_p50_ms": _percentile(latencies, 50) * 1000,
+        "deliver_p99_ms": _percentile(latencies, 99) * 1000,
+        "elapsed_s": elapsed,
+        "dropped": ws_messages_dropped.value(policy=settings.ws_overflow_policy) - dropped_before,
+        "slow_closed": sum(websocket.closed for websocket in slow),
+        "healthy_closed": sum(websocket.closed for websocket in healthy)
+    }
+    await manager.shutdown()
+    return result
+
+async def run_inline(users: int, slow_users: int, rounds: int, slow_delay: float) -> dict:
+    """The previous behaviour: the sender awaits each socket write itself"""
+    sockets = {
+        user: [SimulatedWebSocket(slow_delay if user < slow_users else 0.0) for _ in range(2)]
+        for user in range(users)
+    }
+    send_times = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for user in range(users):
+            sent = time.perf_counter()
+            for websocket in sockets[user]:
+                await websocket.send_text(f"t={sent}")
+            send_times.append(time.perf_counter() - sent)
+            await asyncio.sleep(0)
+    latencies = [latency for user in range(slow_users, users) for websocket in sockets[user] for latency in websocket.latencies]
+    return {
+        "connections": users * 2,
+        "send_p50_us": _percentile(send_times, 50) * 1e6,
+        "send_p99_us": _percentile(send_times, 99) * 1e6,
+        "deliver_p50_ms": _percentile(latencies, 50) * 1000,
+        "deliver_p99_ms": _percentile(latencies, 99) * 1000,
+        "elapsed_s": time.perf_counter() - started
+    }
+
+def _sample_users(users: int, slow_users: int, sample: int):
+    """A smaller population with the same share of slow users (at least one if any)"""
+    sample = min(users, sample)
+    slow = round(slow_users * sample / users)
+    if slow_users and not slow:
+        slow = 1
+    return sample, slow
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:>7}: {result['connections']} connections, "
+        f"send p50 {result['send_p50_us']:.1f}us p99 {result['send_p99_us']:.1f}us, "
+        f"delivery p50 {result['deliver_p50_ms']:.1f}ms p99 {result['deliver_p99_ms']:.1f}ms, "
+        f"total {result['elapsed_s']:.2f}s"
+        + (
+            f", dropped {result['dropped']:.0f}, closed {result['slow_closed']} slow / {result['healthy_closed']} healthy"
+            if "dropped" in result else ""
+        )
+        + (f", projected {result['projected_s']:.1f}s at full load" if "projected_s" in result else "")
+    )
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--slow-fraction", type=float, default=0.02)
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="seconds per frame for slow clients")
+    parser.add_argument("--queue-size", type=int, default=8, help="per-connection queue; below --rounds so slow clients overflow")
+    parser.add_argument("--policy", default=settings.ws_overflow_policy)
+    parser.add_argument("--skip-inline", action="store_true")
+    parser.add_argument("--inline-users", type=int, default=100, help="users in the sampled inline replay")
+    parser.add_argument("--inline-rounds", type=int, default=2, help="rounds in the sampled inline replay")
+    args = parser.parse_args(argv)
+
+    settings.ws_send_queue_size = args.queue_size
+    settings.ws_overflow_policy = args.policy
+    users = max(args.clients // 2, 1)
+    slow_users = int(users * args.slow_fraction)
+
+    if args.queue_size >= args.rounds:
+        print(f"⚠️ --queue-size {args.queue_size} holds all {args.rounds} rounds; slow clients will never overflow")
+
+    print_result("queued", await run_queued(users, slow_users, args.rounds, args.slow_delay))
+    if not args.skip_inline:
+        sample_users, sample_slow = _sample_users(users, slow_users, args.inline_users)
+        sample_rounds = min(args.rounds, args.inline_rounds)
+        result = await run_inline(sample_users, sample_slow, sample_rounds, args.slow_delay)
+        # Every send is awaited in turn, so the total grows with users and rounds
+        result["projected_s"] = result["elapsed_s"] * (users * args.rounds) / (sample_users * sample_rounds)
+        print_result("inline", result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
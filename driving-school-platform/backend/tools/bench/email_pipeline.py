@@ -0,0 +1,83 @@
+"""Throughput of the email pipeline against the SMTP stand-in.
+
+Queues ``--emails`` emails through ``EmailSender`` to a local stand-in server
+that adds ``--latency-ms`` per round trip, and reports emails per second, SMTP
+messages sent (fewer than emails when digests kick in) and connections
+opened, for:
+
+* a new connection per email, one command per round trip (like a plain
+  smtplib send per email);
+* the connection pool without pipelining;
+* the connection pool with pipelining.
+
+    python -m tools.bench.email_pipeline --emails 2000 --latency-ms 10
+    python -m tools.bench.email_pipeline --recipients 100     # 20 emails per recipient get digested
+"""
+import argparse
+import asyncio
+import sys
+import time
+from app.core.config import settings
+from app.utils.email_sender import EmailSender
+from tools.smtp_stand_in import StandInSMTPServer
+
+async def run(label: str, emails: int, recipients: int, latency: float, pipelining: bool, overrides: dict) -> bool:
+    previous = {name: getattr(settings, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    server = StandInSMTPServer(latency=latency, pipelining=pipelining)
+    port = await server.start()
+    sender = EmailSender("127.0.0.1", port, backend="smtp")
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            sender.send_email([f"user{i % recipients}@example.com"], f"Lesson update {i}", f"Lesson {i} was scheduled.")
+            for i in range(emails)
+        ))
+        elapsed = time.perf_counter() - started
+        await sender.stop()
+    finally:
+        await server.stop()
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+    delivered = sum(results)
+    print(
+        f"{label:<28} {delivered:>6}/{emails} in {elapsed:6.2f}s "
+        f"{delivered / elapsed:8.0f} emails/s  {len(server.messages):>6} messages  "
+        f"{sender.connections_opened:>5} connections"
+    )
+    return delivered == emails
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--recipients", type=int, default=0, help="distinct recipients (default: one per email)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated round trip to the SMTP server")
+    parser.add_argument("--pool-size", type=int, default=settings.email_pool_size)
+    parser.add_argument("--pipeline-depth", type=int, default=settings.email_pipeline_depth)
+    parser.add_argument("--digest-window-ms", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    recipients = args.recipients or args.emails
+    latency = args.latency_ms / 1000
+    common = {"email_digest_window_ms": args.digest_window_ms, "smtp_starttls": False}
+    variants = [
+        ("connection per email", False, {
+            **common, "email_pool_size": 1, "email_pipeline_depth": 1, "email_max_messages_per_connection": 1
+        }),
+        (f"pool of {args.pool_size}", False, {
+            **common, "email_pool_size": args.pool_size, "email_pipeline_depth": 1
+        }),
+        (f"pool of {args.pool_size}, pipelined x{args.pipeline_depth}", True, {
+            **common, "email_pool_size": args.pool_size, "email_pipeline_depth": args.pipeline_depth
+        }),
+    ]
+
+    ok = True
+    for label, pipelining, overrides in variants:
+        ok = await run(label, args.emails, recipients, latency, pipelining, overrides) and ok
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
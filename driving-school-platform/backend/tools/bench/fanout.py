@@ -0,0 +1,129 @@
+"""Cross-worker delivery latency of the Mongo fan-out bus.
+
+Starts ``--workers`` processes, each tailing the bus the way a uvicorn worker
+does and owning every ``--workers``-th user (standing in for the sockets
+connected to it). The parent publishes ``--messages`` frames at ``--rate`` per
+second to users spread over all workers and reports publish-to-delivery
+latency per worker.
+
+    python -m tools.bench.fanout                      # starts a local mongod
+    python -m tools.bench.fanout --mongodb-url URL    # uses an existing server
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+from typing import List
+from app.core.config import settings
+from app.core.fanout import MongoFanoutBus
+from app.db.mongo import connect_to_mongo, close_mongo_connection
+from tools.scratch import ScratchDatabaseUnavailable, scratch_database
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+async def _worker(index: int, workers: int, mongodb_url: str, database: str, ready, stop, results):
+    settings.mongodb_url = mongodb_url
+    settings.database_name = database
+    settings.mongo_min_pool_size = 1
+    await connect_to_mongo()
+
+    latencies = []
+
+    async def deliver(message: str, user_email: str, channel: str) -> int:
+        user = int(user_email.split("@")[0][len("user"):])
+        if user % workers != index:
+            return 0  # nobody by that email is connected to this worker
+        latencies.append(time.time() - float(message))
+        return 1
+
+    bus = MongoFanoutBus(deliver)
+    await bus.start()
+    ready.set()
+    while not stop.is_set():
+        await asyncio.sleep(0.05)
+    await bus.stop()
+    await close_mongo_connection()
+    results.put((index, latencies))
+
+def _run_worker(*args):
+    asyncio.run(_worker(*args))
+
+async def benchmark(workers: int, messages: int, rate: float, users: int) -> int:
+    context = multiprocessing.get_context("spawn")
+    ready = [context.Event() for _ in range(workers)]
+    stop = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_run_worker,
+            args=(index, workers, settings.mongodb_url, settings.database_name, ready[index], stop, results)
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    async def no_local_sockets(message: str, user_email: str, channel: str) -> int:
+        return 0
+
+    publisher = MongoFanoutBus(no_local_sockets)
+    await publisher.ensure_collection()
+    while not all(event.is_set() for event in ready):
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(1)  # let every tail cursor reach the end of the collection
+
+    interval = 1 / rate
+    started = time.perf_counter()
+    for i in range(messages):
+        await publisher.publish(f"user{i % users}@example.com", repr(time.time()))
+        # Publish on a fixed schedule so a slow insert doesn't stretch the run
+        delay = started + (i + 1) * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    await asyncio.sleep(2)
+    stop.set()
+    collected = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join(timeout=10)
+
+    everything = []
+    for index, latencies in sorted(collected):
+        everything.extend(latencies)
+        print(
+            f"worker {index}: {len(latencies)} delivered, "
+            f"p50 {_percentile(latencies, 50) * 1000:.1f}ms "
+            f"p95 {_percentile(latencies, 95) * 1000:.1f}ms "
+            f"p99 {_percentile(latencies, 99) * 1000:.1f}ms"
+        )
+    print(
+        f"all {workers} workers: {len(everything)}/{messages} delivered, "
+        f"p50 {_percentile(everything, 50) * 1000:.1f}ms "
+        f"p95 {_percentile(everything, 95) * 1000:.1f}ms "
+        f"p99 {_percentile(everything, 99) * 1000:.1f}ms"
+    )
+    return 0 if len(everything) == messages else 1
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-url", help="use this server instead of starting a local mongod")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=1000.0, help="messages published per second")
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    try:
+        async with scratch_database(args.mongodb_url, prefix="fanout_benchmark"):
+            return await benchmark(args.workers, args.messages, args.rate, args.users)
+    except ScratchDatabaseUnavailable as e:
+        print(e)
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
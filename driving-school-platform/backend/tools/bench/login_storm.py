@@ -0,0 +1,128 @@
+"""Latency of an unrelated endpoint while logins are being verified.
+
+Runs the app in-process, so it shares one event loop with the load, and
+registers a user through the API. Then, for ``--seconds`` each, it probes
+``GET /health`` every ``--probe-interval-ms`` and reports its p50/p99/max
+(from when each probe was due, so a blocked loop shows up) and the login
+rate in three cases:
+
+* no logins (the baseline);
+* ``--concurrency`` clients logging in, with pbkdf2 run on the event loop
+  (what login did before hashing moved to the process pool);
+* the same clients with pbkdf2 in the process pool.
+
+    python -m tools.bench.login_storm                      # starts a local mongod
+    python -m tools.bench.login_storm --mongodb-url URL    # uses an existing server
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import List
+from httpx import ASGITransport, AsyncClient
+from app.api.v1.routes import auth
+from app.core.executor import shutdown_cpu_executor
+from app.core.security import get_password_hash_async, verify_password
+from app.db.indexes import ensure_indexes
+from app.main import app
+from tools.scratch import ScratchDatabaseUnavailable, scratch_database
+
+EMAIL = "storm@example.com"
+PASSWORD = "correct horse battery staple"
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+async def _verify_on_loop(plain_password: str, hashed_password: str) -> bool:
+    return verify_password(plain_password, hashed_password)
+
+async def _probe(client: AsyncClient, stop: asyncio.Event, interval: float, latencies: List[float]):
+    # Timed from when each probe was due, so time spent waiting for a blocked loop counts
+    due = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        response = await client.get("/health")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - due)
+        due += interval
+
+async def _log_in(client: AsyncClient, stop: asyncio.Event, logins: List[int]):
+    while not stop.is_set():
+        response = await client.post("/api/v1/auth/login", data={"username": EMAIL, "password": PASSWORD})
+        response.raise_for_status()
+        logins[0] += 1
+
+async def run(client: AsyncClient, label: str, concurrency: int, seconds: float, interval: float) -> dict:
+    stop = asyncio.Event()
+    latencies: List[float] = []
+    logins = [0]
+    tasks = [asyncio.create_task(_probe(client, stop, interval, latencies))]
+    tasks += [asyncio.create_task(_log_in(client, stop, logins)) for _ in range(concurrency)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "label": label,
+        "probes": len(latencies),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0) * 1000,
+        "logins_per_second": logins[0] / seconds
+    }
+
+async def benchmark(concurrency: int, seconds: float, interval: float) -> List[dict]:
+    await ensure_indexes()
+    # Start the pool's workers up front so the last case does not pay for spawning them
+    await asyncio.gather(*(get_password_hash_async(PASSWORD) for _ in range(concurrency)))
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.post("/api/v1/auth/register", json={
+            "email": EMAIL,
+            "password": PASSWORD,
+            "first_name": "Login",
+            "last_name": "Storm",
+            "phone": "555-0100",
+            "user_type": "student"
+        })
+        response.raise_for_status()
+
+        results = [await run(client, "no logins", 0, seconds, interval)]
+        offloaded = auth.verify_password_async
+        auth.verify_password_async = _verify_on_loop
+        try:
+            results.append(await run(client, f"{concurrency} logging in, hash on loop", concurrency, seconds, interval))
+        finally:
+            auth.verify_password_async = offloaded
+        results.append(await run(client, f"{concurrency} logging in, process pool", concurrency, seconds, interval))
+    return results
+
+def print_results(results: List[dict]):
+    print(f"{'/health while':<36} {'probes':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'logins/s':>9}")
+    for row in results:
+        print(
+            f"{row['label']:<36} {row['probes']:>7} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['max_ms']:>8.2f} {row['logins_per_second']:>9.1f}"
+        )
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-url", help="use this server instead of starting a local mongod")
+    parser.add_argument("--concurrency", type=int, default=20, help="clients logging in at once")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each case")
+    parser.add_argument("--probe-interval-ms", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    try:
+        async with scratch_database(args.mongodb_url, prefix="login_storm_benchmark"):
+            print_results(await benchmark(args.concurrency, args.seconds, args.probe_interval_ms / 1000))
+    except ScratchDatabaseUnavailable as e:
+        print(e)
+        return 2
+    finally:
+        shutdown_cpu_executor()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""Time to render a list of Mongo documents as a JSON response body.
+
+Builds ``--documents`` lesson-shaped documents (ObjectIds, datetimes, a
+Decimal128 price, a nested student) and reports the best of ``--repeat`` runs
+for:
+
+* FastAPI's default path: ``jsonable_encoder`` then ``json.dumps`` (what
+  JSONResponse does), with encoders for the BSON types;
+* ``json.dumps`` with a BSON-aware ``default`` and no ``jsonable_encoder``;
+* ``app.core.responses.dumps`` (orjson), what BSONJSONResponse renders with.
+
+All three must produce the same JSON, which is checked before timing.
+
+    python -m tools.bench.serialization
+    python -m tools.bench.serialization --documents 1000 --repeat 20
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, List
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.encoders import jsonable_encoder
+from app.core.responses import dumps
+
+BSON_ENCODERS = {ObjectId: str, Decimal128: lambda value: float(value.to_decimal())}
+
+def lesson_documents(count: int) -> List[dict]:
+    rng = random.Random(42)
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "_id": ObjectId(),
+            "student_id": ObjectId(),
+            "instructor_id": ObjectId(),
+            "school_id": ObjectId(),
+            "lesson_type": rng.choice(["driving", "theory", "motorway"]),
+            "vehicle_type": rng.choice(["manual", "automatic"]),
+            "scheduled_date": now + timedelta(hours=rng.randint(-2000, 2000)),
+            "duration_minutes": rng.choice([45, 60, 90, 120]),
+            "status": rng.choice(["scheduled", "confirmed", "completed", "cancelled"]),
+            "price": Decimal128(Decimal(rng.randint(3000, 9000)) / 100),
+            "student": {"id": ObjectId(), "name": f"Student {i}", "phone": f"555-{i:04d}"},
+            "created_at": now - timedelta(minutes=rng.randint(0, 100000)),
+            "updated_at": now
+        }
+        for i in range(count)
+    ]
+
+def _json_default(obj):
+    for kind, encode in BSON_ENCODERS.items():
+        if isinstance(obj, kind):
+            return encode(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj).__name__} is not JSON serializable")
+
+def fastapi_default(documents: List[dict]) -> bytes:
+    return json.dumps(jsonable_encoder(documents, custom_encoder=BSON_ENCODERS), separators=(",", ":")).encode()
+
+def json_with_default(documents: List[dict]) -> bytes:
+    return json.dumps(documents, default=_json_default, separators=(",", ":")).encode()
+
+def _best_ms(render: Callable[[List[dict]], bytes], documents: List[dict], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(documents)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    documents = lesson_documents(args.documents)
+    renderers = [
+        ("jsonable_encoder + json.dumps", fastapi_default),
+        ("json.dumps(default=...)", json_with_default),
+        ("orjson (BSONJSONResponse)", dumps),
+    ]
+
+    expected = json.loads(renderers[0][1](documents))
+    mismatched = [label for label, render in renderers[1:] if json.loads(render(documents)) != expected]
+    if mismatched:
+        print(f"Output differs from jsonable_encoder for: {', '.join(mismatched)}")
+        return 1
+
+    print(f"{args.documents} documents, best of {args.repeat}")
+    print(f"{'':<32} {'ms':>9} {'docs/ms':>8} {'bytes':>10}")
+    for label, render in renderers:
+        elapsed = _best_ms(render, documents, args.repeat)
+        print(f"{label:<32} {elapsed:>9.1f} {args.documents / elapsed:>8.0f} {len(render(documents)):>10}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Cost of verify_token with and without the verified-token cache.
+
+Issues ``--tokens`` distinct access tokens and times, per call:
+
+* a full JWT decode and signature check (what every request paid before the cache);
+* verify_token on a cold cache (decode plus the cache insert);
+* verify_token on a warm cache, ``--rounds`` passes over the same tokens
+  (the steady state for clients that reuse their token).
+
+    python -m tools.bench.token_cache
+    python -m tools.bench.token_cache --tokens 20000 --cache-size 10000   # more tokens than fit
+"""
+import argparse
+import sys
+import time
+from typing import Callable, List
+from jose import jwt
+from app.core.config import settings
+from app.core.security import create_access_token, token_cache, verify_token
+
+def _per_call_us(verify: Callable[[str], object], tokens: List[str], rounds: int = 1) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for token in tokens:
+            verify(token)
+    return (time.perf_counter() - started) / (len(tokens) * rounds) * 1e6
+
+def _decode(token: str):
+    return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the tokens once the cache is warm")
+    parser.add_argument("--cache-size", type=int, default=settings.token_cache_size)
+    args = parser.parse_args(argv)
+
+    tokens = [
+        create_access_token({"sub": f"user{i}@example.com", "user_type": "student", "uid": f"{i:024x}"})
+        for i in range(args.tokens)
+    ]
+    token_cache.maxsize = args.cache_size
+    token_cache.clear()
+
+    results = [("jwt.decode (no cache)", _per_call_us(_decode, tokens))]
+    results.append(("verify_token, cold cache", _per_call_us(verify_token, tokens)))
+    results.append((f"verify_token, warm cache x{args.rounds}", _per_call_us(verify_token, tokens, args.rounds)))
+
+    print(f"{args.tokens} tokens, cache size {args.cache_size}")
+    print(f"{'':<30} {'us/call':>9} {'calls/s':>10}")
+    for label, per_call in results:
+        print(f"{label:<30} {per_call:>9.2f} {1e6 / per_call:>10.0f}")
+
+    stats = token_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    print(f"cache: {stats['size']} entries, {stats['hits']} hits / {lookups} lookups ({stats['hits'] / max(lookups, 1):.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
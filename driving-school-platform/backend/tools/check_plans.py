@@ -0,0 +1,28 @@
+"""Run the query-plan regression check (``app.db.query_plans``) on a scratch database.
+
+    python -m tools.check_plans                      # starts a local mongod
+    python -m tools.check_plans --mongodb-url URL    # uses an existing server
+"""
+import argparse
+import asyncio
+import sys
+from app.db.query_plans import check_query_plans
+from tools.scratch import ScratchDatabaseUnavailable, scratch_database
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-url", help="use this server instead of starting a local mongod")
+    parser.add_argument("--max-examined-ratio", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    try:
+        async with scratch_database(args.mongodb_url, prefix="query_plans"):
+            ok = await check_query_plans(args.max_examined_ratio, args.users)
+    except ScratchDatabaseUnavailable as e:
+        print(e)
+        return 2
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Throwaway databases for the query-plan check and the benchmarks.
+
+``scratch_database`` connects the app's Mongo client to a uniquely named
+database, on the given server or on a local ``mongod`` it starts, and drops
+it again on exit.
+"""
+import asyncio
+import shutil
+import socket
+import subprocess
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional
+from bson import ObjectId
+from app.core.config import settings
+from app.db.mongo import connect_to_mongo, close_mongo_connection, get_database
+
+class ScratchDatabaseUnavailable(Exception):
+    pass
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@asynccontextmanager
+async def scratch_database(mongodb_url: Optional[str] = None, prefix: str = "scratch"):
+    mongod = None
+    dbpath = None
+    if mongodb_url:
+        settings.mongodb_url = mongodb_url
+    else:
+        if not shutil.which("mongod"):
+            raise ScratchDatabaseUnavailable("mongod not found on PATH; pass --mongodb-url")
+        dbpath = tempfile.mkdtemp(prefix=f"{prefix}-")
+        port = _free_port()
+        mongod = subprocess.Popen(
+            ["mongod", "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"],
+            stdout=subprocess.DEVNULL
+        )
+        settings.mongodb_url = f"mongodb://127.0.0.1:{port}"
+    settings.database_name = f"{prefix}_{ObjectId()}"
+
+    try:
+        for _ in range(50):
+            try:
+                await connect_to_mongo()
+                break
+            except Exception:
+                await asyncio.sleep(0.2)
+        else:
+            raise ScratchDatabaseUnavailable(f"could not connect to {settings.mongodb_url}")
+
+        try:
+            yield get_database()
+        finally:
+            await get_database().client.drop_database(settings.database_name)
+            await close_mongo_connection()
+    finally:
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+        if dbpath is not None:
+            shutil.rmtree(dbpath, ignore_errors=True)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""In-memory SMTP server to run the email pipeline against locally.
+
+Speaks enough ESMTP for ``EmailSender`` (EHLO with PIPELINING, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT), keeps every accepted message and can simulate a
+network round trip (``latency``: every reply reaches the client that much
+later, without holding up what the client sends meanwhile), temporary
+refusals (``fail_rate`` of RCPTs get a 451, and with ``greylist`` each
+recipient's first RCPTs do) and unknown mailboxes (RCPTs to ``reject`` get a
+550). Refused RCPTs are recorded in ``refusals``.
+
+    python -m tools.smtp_stand_in --port 2525 --latency-ms 20
+    EMAIL_BACKEND=smtp SMTP_PORT=2525 SMTP_STARTTLS=false uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import random
+import sys
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+class StandInSMTPServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        fail_rate: float = 0.0,
+        pipelining: bool = True,
+        verbose: bool = False,
+        greylist: int = 0,
+        reject: Iterable[str] = ()
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.pipelining = pipelining
+        self.verbose = verbose
+        self.greylist = greylist
+        self.reject = set(reject)
+        self.messages: List[Tuple[str, List[str], bytes]] = []
+        self.refusals: List[Tuple[str, int]] = []
+        self.connections = 0
+        self._greylisted: Dict[str, int] = {}
+        self._random = random.Random(0)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    async def start(self) -> int:
+        """Listen; returns the port (an ephemeral one when ``port`` is 0)"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # Clients that said QUIT are gone by now; drop the rest
+        if self._handlers:
+            await asyncio.wait(self._handlers, timeout=self.latency + 1)
+            for task in self._handlers:
+                task.cancel()
+
+    def _respond(self, writer: asyncio.StreamWriter, replies: List[str], close: bool):
+        if writer.is_closing():
+            return
+        writer.write("".join(reply + "\r\n" for reply in replies).encode())
+        if close:
+            writer.close()
+
+    def _recipient_reply(self, recipient: str) -> str:
+        if recipient in self.reject:
+            code, reply = 550, "550 No such user here"
+        elif self._greylisted.get(recipient, 0) < self.greylist:
+            self._greylisted[recipient] = self._greylisted.get(recipient, 0) + 1
+            code, reply = 451, "451 Greylisted, try again later"
+        elif self._random.random() < self.fail_rate:
+            code, reply = 451, "451 Try again later"
+        else:
+            return "250 OK"
+        self.refusals.append((recipient, code))
+        return reply
+
+    def _accept(self, sender: str, recipients: List[str], lines: List[bytes]):
+        data = b"".join(line[1:] if line.startswith(b".") else line for line in lines)
+        self.messages.append((sender, recipients, data))
+        if self.verbose:
+            print(f"From {sender} to {', '.join(recipients)}, {len(data)} bytes")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        loop = asyncio.get_running_loop()
+        writer.write(b"220 stand-in ESMTP\r\n")
+        sender: Optional[str] = None
+        recipients: List[str] = []
+        data: Optional[List[bytes]] = None
+        buffer = b""
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    # After any replies still on their way
+                    loop.call_later(self.latency, writer.close)
+                    return
+                buffer += chunk
+                replies = []
+                closing = False
+                while b"\r\n" in buffer and not closing:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    if data is not None:
+                        if line == b".":
+                            self._accept(sender, recipients, data)
+                            sender, recipients, data = None, [], None
+                            replies.append("250 OK queued")
+                        else:
+                            data.append(line + b"\r\n")
+                        continue
+
+                    command, _, argument = line.decode("utf-8", "replace").partition(" ")
+                    command = command.upper()
+                    if command in ("EHLO", "HELO"):
+                        sender, recipients = None, []
+                        extensions = ["PIPELINING"] if self.pipelining and command == "EHLO" else []
+                        lines = ["stand-in"] + extensions + ["8BITMIME"]
+                        replies.extend(f"250-{text}" for text in lines[:-1])
+                        replies.append(f"250 {lines[-1]}")
+                    elif command == "MAIL":
+                        if sender is not None:
+                            replies.append("503 Nested MAIL command")
+                        else:
+                            sender = argument.partition(":")[2].strip("<>")
+                            replies.append("250 OK")
+                    elif command == "RCPT":
+                        if sender is None:
+                            replies.append("503 Need MAIL before RCPT")
+                        else:
+                            recipient = argument.partition(":")[2].strip("<>")
+                            reply = self._recipient_reply(recipient)
+                            if reply.startswith("250"):
+                                recipients.append(recipient)
+                            replies.append(reply)
+                    elif command == "DATA":
+                        if not recipients:
+                            replies.append("554 No valid recipients")
+                        else:
+                            data = []
+                            replies.append("354 End data with <CR><LF>.<CR><LF>")
+                    elif command == "RSET":
+                        sender, recipients = None, []
+                        replies.append("250 OK")
+                    elif command == "NOOP":
+                        replies.append("250 OK")
+                    elif command == "QUIT":
+                        replies.append("221 Bye")
+                        closing = True
+                    else:
+                        replies.append("502 Command not implemented")
+
+                if replies:
+                    loop.call_later(self.latency, self._respond, writer, replies, closing)
+                if closing:
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            writer.close()
+        finally:
+            self._handlers.discard(task)
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay of every reply")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of RCPTs answered with 451")
+    parser.add_argument("--greylist", type=int, default=0, help="451s each recipient gets before it is accepted")
+    parser.add_argument("--reject", action="append", default=[], help="recipient refused with a 550 (repeatable)")
+    parser.add_argument("--no-pipelining", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = StandInSMTPServer(
+        args.host,
+        args.port,
+        args.latency_ms / 1000,
+        args.fail_rate,
+        not args.no_pipelining,
+        verbose=True,
+        greylist=args.greylist,
+        reject=args.reject
+    )
+    await server.start()
+    print(f"SMTP stand-in listening on {args.host}:{server.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
@@ -4,10 +4,12 @@ db.createCollection('students');
 db.createCollection('instructors');
 db.createCollection('lessons');
 db.createCollection('schedules');
+db.createCollection('identities');
 
 // Create indexes
 db.students.createIndex({ "email": 1 }, { unique: true });
 db.instructors.createIndex({ "email": 1 }, { unique: true });
+db.identities.createIndex({ "email": 1 }, { unique: true });
 db.lessons.createIndex({ "student_id": 1 });
 db.lessons.createIndex({ "instructor_id": 1 });
 db.lessons.createIndex({ "scheduled_date": 1 });
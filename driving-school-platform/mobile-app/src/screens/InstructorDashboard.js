@@ -3,6 +3,7 @@ import { View, Text, StyleSheet, TouchableOpacity, ScrollView, FlatList, Alert }
 import { SafeAreaView } from 'react-native-safe-area-context';
 import { useAuth } from '../context/AuthContext';
 import api from '../services/api';
+import { eventsService } from '../services/events';
 
 const InstructorDashboard = ({ navigation }) => {
   const [profile, setProfile] = useState(null);
@@ -12,6 +13,12 @@ const InstructorDashboard = ({ navigation }) => {
   useEffect(() => {
     loadProfile();
     loadPendingLessons();
+
+    return eventsService.subscribe((frame) => {
+      if (frame.type === 'reset' || frame.event === 'lesson' || frame.event === 'booking') {
+        loadPendingLessons();
+      }
+    });
   }, []);
 
   const loadProfile = async () => {
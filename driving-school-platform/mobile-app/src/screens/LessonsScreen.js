@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { View, Text, StyleSheet, FlatList, ActivityIndicator } from 'react-native';
-import api from '../services/api';
+import { getAllPages } from '../services/api';
 
 const LessonsScreen = () => {
   const [lessons, setLessons] = useState([]);
@@ -12,7 +12,7 @@ const LessonsScreen = () => {
 
   const loadLessons = async () => {
     try {
-      const response = await api.get('/lessons/my-lessons');
+      const response = await getAllPages('/lessons/my-lessons');
       setLessons(response.data);
     } catch (error) {
       console.error('Failed to load lessons:', error);
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { View, Text, StyleSheet, FlatList, TouchableOpacity, RefreshControl } from 'react-native';
-import api from '../services/api';
+import api, { getAllPages } from '../services/api';
+import { eventsService } from '../services/events';
 
 const NotificationsScreen = () => {
   const [notifications, setNotifications] = useState([]);
@@ -8,11 +9,21 @@ const NotificationsScreen = () => {
 
   useEffect(() => {
     loadNotifications();
+
+    return eventsService.subscribe((frame) => {
+      if (frame.type === 'reset') {
+        loadNotifications();
+      } else if (frame.event === 'notification') {
+        setNotifications((current) =>
+          current.some((item) => item.id === frame.data.id) ? current : [frame.data, ...current]
+        );
+      }
+    });
   }, []);
 
   const loadNotifications = async () => {
     try {
-      const response = await api.get('/notifications/');
+      const response = await getAllPages('/notifications/');
       setNotifications(response.data);
     } catch (error) {
       console.error('Failed to load notifications:', error);
@@ -22,12 +33,24 @@ const NotificationsScreen = () => {
   const markAsRead = async (notificationId) => {
     try {
       await api.put(`/notifications/${notificationId}/read`);
-      loadNotifications();
+      setNotifications((current) =>
+        current.map((item) => (item.id === notificationId ? { ...item, read: true } : item))
+      );
     } catch (error) {
       console.error('Failed to mark as read:', error);
     }
   };
 
+  const markAllAsRead = async () => {
+    try {
+      // Only up to the newest one shown, so anything that arrived since stays unread
+      await api.put('/notifications/read', null, { params: { up_to: notifications[0].id } });
+      setNotifications((current) => current.map((item) => ({ ...item, read: true })));
+    } catch (error) {
+      console.error('Failed to mark all as read:', error);
+    }
+  };
+
   const onRefresh = async () => {
     setRefreshing(true);
     await loadNotifications();
@@ -52,6 +75,11 @@ const NotificationsScreen = () => {
 
   return (
     <View style={styles.container}>
+      {notifications.some((item) => !item.read) && (
+        <TouchableOpacity style={styles.markAllButton} onPress={markAllAsRead}>
+          <Text style={styles.markAllText}>Mark all as read</Text>
+        </TouchableOpacity>
+      )}
       <FlatList
         data={notifications}
         renderItem={renderNotification}
@@ -71,7 +99,14 @@ const styles = StyleSheet.create({
     padding: 20,
     backgroundColor: '#f5f5f5',
   },
-
+  markAllButton: {
+    alignSelf: 'flex-end',
+    marginBottom: 10,
+  },
+  markAllText: {
+    fontSize: 14,
+    color: '#007AFF',
+  },
   notificationCard: {
     backgroundColor: 'white',
     padding: 15,
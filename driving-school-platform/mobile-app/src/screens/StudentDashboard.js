@@ -3,6 +3,7 @@ import { View, Text, StyleSheet, TouchableOpacity, ScrollView, Image, Dimensions
 import { SafeAreaView } from 'react-native-safe-area-context';
 import { useAuth } from '../context/AuthContext';
 import { studentAPI } from '../services/api';
+import { eventsService } from '../services/events';
 
 const { width } = Dimensions.get('window');
 
@@ -21,13 +22,22 @@ const StudentDashboard = ({ navigation }) => {
   useEffect(() => {
     loadProfile();
     loadUpcomingLesson();
+
+    const unsubscribe = eventsService.subscribe((frame) => {
+      if (frame.type === 'reset' || frame.event === 'lesson') {
+        loadUpcomingLesson();
+      }
+    });
     
     // Auto-slide banners
     const interval = setInterval(() => {
       setCurrentBanner((prev) => (prev + 1) % banners.length);
     }, 4000);
     
-    return () => clearInterval(interval);
+    return () => {
+      clearInterval(interval);
+      unsubscribe();
+    };
   }, []);
 
   const loadProfile = async () => {
@@ -42,9 +52,7 @@ const StudentDashboard = ({ navigation }) => {
   const loadUpcomingLesson = async () => {
     try {
       const response = await studentAPI.getUpcomingLessons();
-      if (response.data && response.data.length > 0) {
-        setUpcomingLesson(response.data[0]);
-      }
+      setUpcomingLesson(response.data && response.data.length > 0 ? response.data[0] : null);
     } catch (error) {
       console.error('Failed to load upcoming lesson:', error);
       // Set null to hide the upcoming lesson card if API fails
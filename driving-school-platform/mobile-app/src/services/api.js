@@ -1,7 +1,7 @@
 import axios from 'axios';
 import AsyncStorage from '@react-native-async-storage/async-storage';
 
-const API_BASE_URL = 'http://54.157.242.59:8000/api/v1';
+export const API_BASE_URL = 'http://54.157.242.59:8000/api/v1';
 console.log('API Base URL:', API_BASE_URL);
 
 const api = axios.create({
@@ -17,6 +17,25 @@ api.interceptors.request.use(async (config) => {
   return config;
 });
 
+// Largest page the list endpoints serve
+const PAGE_SIZE = 200;
+
+// List endpoints return one page at a time; follow X-Next-Cursor to the last one
+export const getAllPages = async (url, config = {}) => {
+  const items = [];
+  let cursor = null;
+  let response;
+  do {
+    response = await api.get(url, {
+      ...config,
+      params: { ...config.params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+    });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return { ...response, data: items };
+};
+
 export const authAPI = {
   login: (email, password) => {
     const formData = new FormData();
@@ -38,12 +57,12 @@ export const studentAPI = {
   updateProfile: (data) => api.put('/students/me', data).catch(() => ({data: {}})),
   getUpcomingLessons: () => api.get('/lessons/upcoming').catch(() => ({data: []})),
   getProgress: () => api.get('/progress/me').catch(() => ({data: {}})),
-  getInstructors: () => api.get('/instructors', { headers: { Authorization: '' } }).catch(() => ({data: []})),
+  getInstructors: () => getAllPages('/instructors', { headers: { Authorization: '' } }).catch(() => ({data: []})),
   getAvailableSchools: () => api.get('/schools/available', { headers: { Authorization: '' } }),
   getMySchool: () => api.get('/schools/my-school').catch(() => ({data: {school: null, status: 'no_school'}})),
   requestSchoolJoin: (data) => api.post('/schools/join-request', data),
   bookLesson: (data) => api.post('/booking/lesson', data).catch(() => ({data: {message: 'Booking failed'}})),
-  getMyBookings: () => api.get('/booking/my-requests').catch(() => ({data: []})),
+  getMyBookings: () => getAllPages('/booking/my-requests').catch(() => ({data: []})),
 };
 
 export const instructorAPI = {
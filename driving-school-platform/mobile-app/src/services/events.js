@@ -0,0 +1,120 @@
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import { API_BASE_URL } from './api';
+
+// One shared connection to /events/ws; screens subscribe instead of re-fetching on focus.
+// Each frame is {type: 'event', id, event: 'notification' | 'lesson' | 'booking', data},
+// or {type: 'reset'} when events were missed and lists should be reloaded.
+const EVENTS_URL = `${API_BASE_URL.replace(/^http/, 'ws')}/events/ws`;
+const MAX_RETRY_MS = 30000;
+
+const listeners = new Set();
+let socket = null;
+let connecting = null;
+let lastEventId = null;
+let retryMs = 1000;
+let retryTimer = null;
+
+const emit = (frame) => {
+  listeners.forEach((listener) => {
+    try {
+      listener(frame);
+    } catch (error) {
+      console.error('Event listener failed:', error);
+    }
+  });
+};
+
+const scheduleReconnect = () => {
+  if (retryTimer || listeners.size === 0) {
+    return;
+  }
+  retryTimer = setTimeout(() => {
+    retryTimer = null;
+    connect();
+  }, retryMs);
+  retryMs = Math.min(retryMs * 2, MAX_RETRY_MS);
+};
+
+const open = async () => {
+  const token = await AsyncStorage.getItem('access_token');
+  // Everyone may have unsubscribed while the token was read
+  if (!token || socket || listeners.size === 0) {
+    return;
+  }
+
+  const params = [`token=${encodeURIComponent(token)}`];
+  if (lastEventId) {
+    params.push(`last_event_id=${lastEventId}`);
+  }
+  const ws = new WebSocket(`${EVENTS_URL}?${params.join('&')}`);
+  socket = ws;
+
+  ws.onopen = () => {
+    retryMs = 1000;
+  };
+
+  ws.onmessage = ({ data }) => {
+    let frame;
+    try {
+      frame = JSON.parse(data);
+    } catch (error) {
+      return;
+    }
+    if (frame.type === 'ping') {
+      ws.send(JSON.stringify({ type: 'pong' }));
+      return;
+    }
+    if (frame.type === 'event') {
+      lastEventId = frame.id;
+    }
+    emit(frame);
+  };
+
+  ws.onclose = () => {
+    if (socket === ws) {
+      socket = null;
+      scheduleReconnect();
+    }
+  };
+};
+
+// Subscribers arriving while the token is read share that attempt instead of opening another socket
+const connect = () => {
+  if (socket || connecting || listeners.size === 0) {
+    return connecting;
+  }
+  connecting = open().finally(() => {
+    connecting = null;
+  });
+  return connecting;
+};
+
+const disconnect = () => {
+  clearTimeout(retryTimer);
+  retryTimer = null;
+  if (socket) {
+    const ws = socket;
+    socket = null;
+    ws.close();
+  }
+};
+
+export const eventsService = {
+  // Returns an unsubscribe function; the socket stays open while anyone is listening
+  subscribe(listener) {
+    listeners.add(listener);
+    connect();
+    return () => {
+      listeners.delete(listener);
+      if (listeners.size === 0) {
+        disconnect();
+      }
+    };
+  },
+
+  // Forget the resume position, e.g. on logout
+  reset() {
+    lastEventId = null;
+    disconnect();
+  },
+};
@@ -10,12 +10,15 @@ from app.db.mongo import connect_to_mongo, close_mongo_connection
 from app.db.seeds.seed_students import seed_students
 from app.db.seeds.seed_instructors import seed_instructors
 from app.db.seeds.seed_schools import seed_schools
+from app.db.migrations.backfill_identities import backfill_identities
 
 async def main():
     await connect_to_mongo()
     await seed_students()
     await seed_instructors()
     await seed_schools()
+    # Also covers users seeded before the seeders wrote identities
+    await backfill_identities()
     await close_mongo_connection()
     print('Database seeded successfully!')
 